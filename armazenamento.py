@@ -0,0 +1,220 @@
+import sqlite3
+import pandas as pd
+
+from categorizador import (
+    COLUNA_DATA, COLUNA_TITULO, COLUNA_VALOR, COLUNA_CATEGORIA, COLUNA_ID,
+    COLUNA_PARCELA_ATUAL, COLUNA_TOTAL_PARCELAS, COLUNA_FATURA_ORIGEM,
+    COLUNA_CATEGORIA_NUBANK_ORIGINAL,
+    aplicar_schema_faturas
+)
+from painel import CICLO_NAO_DEFINIDO, PADRAO_CICLO_NOME_ARQUIVO
+
+CAMINHO_BANCO_TRANSACOES_DEFAULT = "Transacoes.sqlite"
+TABELA_TRANSACOES = "transacoes"
+COLUNA_CHAVE_TRANSACAO = 'chave_transacao'
+COLUNA_CICLO_FATURA = 'ciclo_fatura'
+FORMATO_DATA_BANCO = '%Y-%m-%d %H:%M:%S'
+TAMANHO_LOTE_GRAVACAO = 5000
+
+COLUNAS_BANCO_TRANSACOES = {
+    COLUNA_CHAVE_TRANSACAO: 'TEXT PRIMARY KEY',
+    COLUNA_ID: 'TEXT',
+    COLUNA_DATA: 'TEXT NOT NULL',
+    COLUNA_TITULO: 'TEXT',
+    COLUNA_VALOR: 'REAL',
+    COLUNA_CATEGORIA: 'TEXT',
+    COLUNA_CATEGORIA_NUBANK_ORIGINAL: 'TEXT',
+    COLUNA_PARCELA_ATUAL: 'INTEGER',
+    COLUNA_TOTAL_PARCELAS: 'INTEGER',
+    COLUNA_FATURA_ORIGEM: 'TEXT',
+    COLUNA_CICLO_FATURA: 'TEXT',
+}
+INDICES_BANCO_TRANSACOES = {
+    'idx_transacoes_data': COLUNA_DATA,
+    'idx_transacoes_categoria': COLUNA_CATEGORIA,
+    'idx_transacoes_ciclo': COLUNA_CICLO_FATURA,
+}
+DIMENSOES_AGREGACAO_SQL = {
+    'ciclo_fatura': COLUNA_CICLO_FATURA,
+    'categoria': COLUNA_CATEGORIA,
+    'titulo': COLUNA_TITULO,
+    'dia': f"date({COLUNA_DATA})",
+    'mes_ano': f"substr({COLUNA_DATA}, 1, 7)",
+    'ano': f"CAST(strftime('%Y', {COLUNA_DATA}) AS INTEGER)",
+    'mes': f"CAST(strftime('%m', {COLUNA_DATA}) AS INTEGER)",
+    'dia_do_mes': f"CAST(strftime('%d', {COLUNA_DATA}) AS INTEGER)",
+    'dia_da_semana': (
+        f"CASE strftime('%w', {COLUNA_DATA}) WHEN '0' THEN 'Sunday' WHEN '1' THEN 'Monday' "
+        "WHEN '2' THEN 'Tuesday' WHEN '3' THEN 'Wednesday' WHEN '4' THEN 'Thursday' "
+        "WHEN '5' THEN 'Friday' ELSE 'Saturday' END"
+    ),
+}
+
+def abrir_banco_transacoes(caminho_banco=CAMINHO_BANCO_TRANSACOES_DEFAULT):
+    conexao = sqlite3.connect(caminho_banco)
+    conexao.execute("PRAGMA journal_mode=WAL")
+    colunas_sql = ", ".join(f"{coluna} {tipo}" for coluna, tipo in COLUNAS_BANCO_TRANSACOES.items())
+    conexao.execute(f"CREATE TABLE IF NOT EXISTS {TABELA_TRANSACOES} ({colunas_sql})")
+    for nome_indice, coluna in INDICES_BANCO_TRANSACOES.items():
+        conexao.execute(f"CREATE INDEX IF NOT EXISTS {nome_indice} ON {TABELA_TRANSACOES} ({coluna})")
+    conexao.commit()
+    return conexao
+
+def gerar_chaves_transacoes(df_transacoes):
+    datas = pd.to_datetime(df_transacoes[COLUNA_DATA], errors='coerce').dt.strftime(FORMATO_DATA_BANCO).fillna('')
+    chaves_compostas = (
+        df_transacoes[COLUNA_TITULO].astype(str) + '|' + datas + '|' +
+        df_transacoes[COLUNA_VALOR].astype(str) + '|' +
+        (df_transacoes[COLUNA_FATURA_ORIGEM].astype(str) if COLUNA_FATURA_ORIGEM in df_transacoes.columns else '')
+    ).astype(object)
+    if COLUNA_ID not in df_transacoes.columns:
+        return chaves_compostas
+    ids = df_transacoes[COLUNA_ID].astype(object)
+    return ('id:' + ids.astype(str)).where(ids.notna(), chaves_compostas)
+
+def gerar_hashes_transacoes(df_transacoes):
+    return pd.util.hash_pandas_object(gerar_chaves_transacoes(df_transacoes), index=False).to_numpy()
+
+def _preparar_linhas_banco(df_transacoes):
+    df_banco = pd.DataFrame(index=df_transacoes.index)
+    df_banco[COLUNA_CHAVE_TRANSACAO] = gerar_chaves_transacoes(df_transacoes)
+    for coluna in COLUNAS_BANCO_TRANSACOES:
+        if coluna in df_transacoes.columns:
+            df_banco[coluna] = df_transacoes[coluna]
+    df_banco[COLUNA_DATA] = pd.to_datetime(df_banco[COLUNA_DATA], errors='coerce').dt.strftime(FORMATO_DATA_BANCO)
+    if COLUNA_FATURA_ORIGEM in df_banco.columns:
+        df_banco[COLUNA_CICLO_FATURA] = (
+            df_banco[COLUNA_FATURA_ORIGEM].astype(object).astype(str)
+            .str.extract(PADRAO_CICLO_NOME_ARQUIVO, expand=False)
+            .fillna(CICLO_NAO_DEFINIDO)
+        )
+    df_banco = df_banco.dropna(subset=[COLUNA_DATA]).astype(object)
+    return df_banco.where(df_banco.notna(), None)
+
+def gravar_transacoes(conexao, df_transacoes):
+    if df_transacoes.empty:
+        return 0
+    df_banco = _preparar_linhas_banco(df_transacoes)
+    colunas = list(df_banco.columns)
+    atualizacoes = ", ".join(f"{coluna} = excluded.{coluna}" for coluna in colunas if coluna != COLUNA_CHAVE_TRANSACAO)
+    comando = (
+        f"INSERT INTO {TABELA_TRANSACOES} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))}) "
+        f"ON CONFLICT({COLUNA_CHAVE_TRANSACAO}) DO UPDATE SET {atualizacoes}"
+    )
+    linhas = df_banco.itertuples(index=False, name=None)
+    with conexao:
+        while True:
+            lote = [linha for _, linha in zip(range(TAMANHO_LOTE_GRAVACAO), linhas)]
+            if not lote:
+                break
+            conexao.executemany(comando, lote)
+    return len(df_banco)
+
+def atualizar_categoria_transacoes(conexao, chaves_transacoes, nova_categoria):
+    with conexao:
+        conexao.executemany(
+            f"UPDATE {TABELA_TRANSACOES} SET {COLUNA_CATEGORIA} = ? WHERE {COLUNA_CHAVE_TRANSACAO} = ?",
+            [(nova_categoria, chave) for chave in chaves_transacoes]
+        )
+
+def remover_transacoes_por_fatura(conexao, nomes_faturas):
+    nomes_faturas = list(nomes_faturas)
+    if not nomes_faturas:
+        return 0
+    with conexao:
+        cursor = conexao.execute(
+            f"DELETE FROM {TABELA_TRANSACOES} WHERE {COLUNA_FATURA_ORIGEM} IN ({', '.join('?' * len(nomes_faturas))})",
+            nomes_faturas
+        )
+    return cursor.rowcount
+
+def _filtros_sql(ciclos=None, categorias=None, categorias_excluidas=(), data_inicial=None, data_final=None, apenas_valores_positivos=False):
+    condicoes = []
+    parametros = []
+    if ciclos is not None:
+        condicoes.append(f"{COLUNA_CICLO_FATURA} IN ({', '.join('?' * len(ciclos))})" if ciclos else "0")
+        parametros.extend(ciclos)
+    if categorias is not None:
+        condicoes.append(f"{COLUNA_CATEGORIA} IN ({', '.join('?' * len(categorias))})" if categorias else "0")
+        parametros.extend(categorias)
+    if categorias_excluidas:
+        condicoes.append(f"({COLUNA_CATEGORIA} IS NULL OR {COLUNA_CATEGORIA} NOT IN ({', '.join('?' * len(categorias_excluidas))}))")
+        parametros.extend(categorias_excluidas)
+    if data_inicial is not None:
+        condicoes.append(f"{COLUNA_DATA} >= ?")
+        parametros.append(pd.Timestamp(data_inicial).strftime(FORMATO_DATA_BANCO))
+    if data_final is not None:
+        condicoes.append(f"{COLUNA_DATA} <= ?")
+        parametros.append(pd.Timestamp(data_final).strftime(FORMATO_DATA_BANCO))
+    if apenas_valores_positivos:
+        condicoes.append(f"{COLUNA_VALOR} > 0")
+    clausula_where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    return clausula_where, parametros
+
+def listar_ciclos_transacoes(conexao):
+    cursor = conexao.execute(f"SELECT DISTINCT {COLUNA_CICLO_FATURA} FROM {TABELA_TRANSACOES} ORDER BY {COLUNA_CICLO_FATURA} DESC")
+    return [linha[0] for linha in cursor.fetchall()]
+
+def carregar_transacoes(conexao, ciclos=None, data_inicial=None, data_final=None):
+    clausula_where, parametros = _filtros_sql(ciclos=ciclos, data_inicial=data_inicial, data_final=data_final)
+    colunas = [coluna for coluna in COLUNAS_BANCO_TRANSACOES if coluna not in (COLUNA_CHAVE_TRANSACAO, COLUNA_CICLO_FATURA)]
+    df_transacoes = pd.read_sql_query(
+        f"SELECT {', '.join(colunas)} FROM {TABELA_TRANSACOES}{clausula_where} ORDER BY {COLUNA_DATA}, {COLUNA_CHAVE_TRANSACAO}",
+        conexao, params=parametros
+    )
+    df_transacoes[COLUNA_DATA] = pd.to_datetime(df_transacoes[COLUNA_DATA], format=FORMATO_DATA_BANCO, errors='coerce')
+    colunas_opcionais_vazias = [
+        coluna for coluna in (COLUNA_ID, COLUNA_CATEGORIA_NUBANK_ORIGINAL)
+        if df_transacoes[coluna].isna().all()
+    ]
+    df_transacoes = df_transacoes.drop(columns=colunas_opcionais_vazias)
+    return aplicar_schema_faturas(df_transacoes)
+
+def agregar_transacoes(conexao, dimensoes, ciclos=None, categorias=None, categorias_excluidas=(),
+                       data_inicial=None, data_final=None, apenas_valores_positivos=True):
+    expressoes = [f"{DIMENSOES_AGREGACAO_SQL[dimensao]} AS {dimensao}" for dimensao in dimensoes]
+    clausula_where, parametros = _filtros_sql(
+        ciclos=ciclos, categorias=categorias, categorias_excluidas=categorias_excluidas,
+        data_inicial=data_inicial, data_final=data_final, apenas_valores_positivos=apenas_valores_positivos
+    )
+    clausula_group_by = f" GROUP BY {', '.join(dimensoes)} ORDER BY {', '.join(dimensoes)}" if dimensoes else ""
+    comando = (
+        f"SELECT {', '.join(expressoes + [f'SUM({COLUNA_VALOR}) AS {COLUNA_VALOR}', 'COUNT(*) AS quantidade'])} "
+        f"FROM {TABELA_TRANSACOES}{clausula_where}{clausula_group_by}"
+    )
+    return pd.read_sql_query(comando, conexao, params=parametros)
+
+def carregar_detalhes_transacoes(conexao, categorias, ciclos=None):
+    clausula_where, parametros = _filtros_sql(ciclos=ciclos, categorias=categorias, apenas_valores_positivos=True)
+    colunas = [
+        COLUNA_DATA, f"{DIMENSOES_AGREGACAO_SQL['mes_ano']} AS mes_ano", COLUNA_TITULO,
+        COLUNA_CATEGORIA, COLUNA_VALOR, COLUNA_CICLO_FATURA
+    ]
+    df_detalhes = pd.read_sql_query(
+        f"SELECT {', '.join(colunas)} FROM {TABELA_TRANSACOES}{clausula_where} ORDER BY {COLUNA_DATA}, {COLUNA_CHAVE_TRANSACAO}",
+        conexao, params=parametros
+    )
+    df_detalhes[COLUNA_DATA] = pd.to_datetime(df_detalhes[COLUNA_DATA], format=FORMATO_DATA_BANCO, errors='coerce')
+    return df_detalhes
+
+def agregar_cubos_dashboard(conexao, categorias_fixas, categorias_encargos, ciclos=None, categorias=None):
+    colunas_renomeadas = {'categoria': COLUNA_CATEGORIA, 'titulo': COLUNA_TITULO}
+    consumo_dia = agregar_transacoes(
+        conexao, ['ciclo_fatura', 'categoria', 'dia', 'mes_ano', 'dia_da_semana', 'dia_do_mes'],
+        ciclos=ciclos, categorias=categorias, categorias_excluidas=categorias_fixas
+    ).rename(columns=colunas_renomeadas)
+    consumo_dia['dia'] = pd.to_datetime(consumo_dia['dia'])
+    consumo_titulo = agregar_transacoes(
+        conexao, ['ciclo_fatura', 'categoria', 'titulo'],
+        ciclos=ciclos, categorias=categorias, categorias_excluidas=categorias_fixas
+    ).rename(columns=colunas_renomeadas)
+    encargos = carregar_detalhes_transacoes(conexao, list(categorias_encargos), ciclos=ciclos)
+    cubos = {
+        'consumo_dia': consumo_dia,
+        'consumo_titulo': consumo_titulo,
+        'encargos': encargos[[COLUNA_DATA, 'mes_ano', COLUNA_TITULO, COLUNA_CATEGORIA, COLUNA_VALOR, COLUNA_CICLO_FATURA]],
+    }
+    return {
+        nome_cubo: cubo.assign(**{COLUNA_CICLO_FATURA: cubo[COLUNA_CICLO_FATURA].fillna(CICLO_NAO_DEFINIDO)})
+        for nome_cubo, cubo in cubos.items()
+    }
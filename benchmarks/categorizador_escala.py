@@ -0,0 +1,141 @@
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from categorizador import (
+    processar_faturas,
+    ler_faturas,
+    categorizar_faturas,
+    construir_indice_estabelecimentos,
+    carregar_categorias_base_do_json,
+    obter_automato_palavras_chave,
+    normalizar_categorias_base,
+    normalizar_texto,
+    normalizar_texto_serie,
+    _categorizar_transacao_core,
+    aplicar_schema_faturas,
+    COLUNA_TITULO,
+    COLUNA_EDIT_ID,
+    SIMILARITY_THRESHOLD,
+    MODOS_CATEGORIZACAO_LINHA_DE_COMANDO,
+)
+from painel import preparar_dataframe_dashboard, construir_cubos_dashboard
+from benchmarks.geradores import ArquivoEmMemoria, gerar_faturas_nubank, escrever_base_cnpj
+
+
+class Medidor:
+    def __init__(self, medir_memoria=True):
+        self.medir_memoria = medir_memoria
+        self.resultados = []
+
+    def medir(self, tamanho, etapa, quantidade_itens, funcao, *args, **kwargs):
+        if self.medir_memoria:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        with open(os.devnull, 'w') as saida_descartada, contextlib.redirect_stdout(saida_descartada):
+            retorno = funcao(*args, **kwargs)
+        segundos = time.perf_counter() - inicio
+        pico_memoria_mb = None
+        if self.medir_memoria:
+            pico_memoria_mb = tracemalloc.get_traced_memory()[1] / (1 << 20)
+            tracemalloc.stop()
+        resultado = {
+            'tamanho': tamanho,
+            'etapa': etapa,
+            'itens': quantidade_itens,
+            'segundos': segundos,
+            'itens_por_segundo': quantidade_itens / segundos if segundos else None,
+            'pico_memoria_mb': pico_memoria_mb,
+        }
+        self.resultados.append(resultado)
+        memoria = f"{pico_memoria_mb:>10,.1f} MB" if pico_memoria_mb is not None else f"{'-':>13}"
+        print(f"  {etapa:<44}{quantidade_itens:>10,}{segundos:>10.3f}s{resultado['itens_por_segundo'] or 0:>14,.0f}/s{memoria}")
+        return retorno
+
+
+def _categorizar_titulos_um_a_um(titulos_normalizados, usar_fuzzy, indice_estabelecimentos):
+    palavras_chave_norm, mapa_categorias_norm = normalizar_categorias_base(carregar_categorias_base_do_json())
+    automato = obter_automato_palavras_chave(palavras_chave_norm)
+    nomes_estabelecimentos = indice_estabelecimentos['nomes_normalizados'] if usar_fuzzy else []
+    mapa_atividades = indice_estabelecimentos['mapa_nome_atividade'] if usar_fuzzy else {}
+    indice_fuzzy = indice_estabelecimentos['indice_fuzzy'] if usar_fuzzy else None
+    return [
+        _categorizar_transacao_core(
+            titulo, palavras_chave_norm, mapa_categorias_norm, usar_fuzzy, nomes_estabelecimentos,
+            mapa_atividades, SIMILARITY_THRESHOLD, automato, indice_fuzzy
+        )
+        for titulo in titulos_normalizados
+    ]
+
+
+def executar(tamanho, modos, medidor, diretorio_temporario, linhas_por_fatura):
+    print(f"Linhas: {tamanho:,}")
+    print(f"  {'etapa':<44}{'itens':>10}{'tempo':>11}{'vazão':>16}{'pico mem.':>13}")
+    faturas = gerar_faturas_nubank(tamanho, linhas_por_fatura=linhas_por_fatura)
+    caminho_base_cnpj = os.path.join(diretorio_temporario, f"CNPJ_Estabelecimentos_{tamanho}.csv")
+    if 'especifica' in modos:
+        escrever_base_cnpj(caminho_base_cnpj, tamanho)
+
+    def arquivos():
+        return [ArquivoEmMemoria(conteudo, nome) for nome, conteudo in faturas]
+
+    df_lido = medidor.medir(tamanho, 'leitura (ler_faturas)', tamanho, ler_faturas, arquivos())
+    titulos = df_lido[COLUNA_TITULO]
+    medidor.medir(tamanho, 'normalizar_texto (escalar)', len(titulos), lambda: [normalizar_texto(titulo) for titulo in titulos])
+    titulos_normalizados = medidor.medir(tamanho, 'normalizar_texto_serie', len(titulos), normalizar_texto_serie, titulos)
+    titulos_unicos = titulos_normalizados.unique().tolist()
+
+    indice_estabelecimentos = None
+    if 'especifica' in modos:
+        indice_estabelecimentos = medidor.medir(tamanho, 'construir_indice_estabelecimentos', tamanho, construir_indice_estabelecimentos, caminho_base_cnpj)
+
+    df_categorizado = None
+    for modo in modos:
+        usar_especifica = MODOS_CATEGORIZACAO_LINHA_DE_COMANDO[modo]
+        caminho_cnpj_modo = caminho_base_cnpj if usar_especifica else None
+        medidor.medir(
+            tamanho, f"_categorizar_transacao_core ({modo})", len(titulos_unicos),
+            _categorizar_titulos_um_a_um, titulos_unicos, usar_especifica, indice_estabelecimentos
+        )
+        df_categorizado = medidor.medir(
+            tamanho, f"categorizar_faturas ({modo})", tamanho,
+            categorizar_faturas, df_lido.copy(), usar_especifica, caminho_cnpj_modo,
+            indice_estabelecimentos=indice_estabelecimentos
+        )
+        medidor.medir(
+            tamanho, f"processar_faturas ({modo})", tamanho,
+            processar_faturas, arquivos(), usar_especifica, caminho_cnpj_modo,
+            indice_estabelecimentos=indice_estabelecimentos
+        )
+
+    if df_categorizado is not None:
+        df_categorizado = aplicar_schema_faturas(df_categorizado)
+        df_categorizado[COLUNA_EDIT_ID] = df_categorizado.index
+        df_dashboard = medidor.medir(tamanho, 'preparar_dataframe_dashboard', tamanho, preparar_dataframe_dashboard, df_categorizado)
+        medidor.medir(tamanho, 'construir_cubos_dashboard', tamanho, construir_cubos_dashboard, df_dashboard)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mede vazão, pico de memória e tempo por etapa do categorizador com faturas Nubank e bases CNPJ sintéticas.")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[10000, 100000, 1000000], help="Quantidade de transações (e de linhas da base CNPJ) por rodada.")
+    parser.add_argument('--modos', nargs='+', choices=list(MODOS_CATEGORIZACAO_LINHA_DE_COMANDO), default=list(MODOS_CATEGORIZACAO_LINHA_DE_COMANDO))
+    parser.add_argument('--linhas-por-fatura', type=int, default=5000)
+    parser.add_argument('--sem-memoria', action='store_true', help="Desativa o tracemalloc (tempos sem a sobrecarga do rastreamento de memória).")
+    parser.add_argument('--json', help="Grava os resultados neste arquivo JSON para comparação entre versões.")
+    argumentos = parser.parse_args()
+
+    medidor = Medidor(medir_memoria=not argumentos.sem_memoria)
+    with tempfile.TemporaryDirectory() as diretorio_temporario:
+        for tamanho in argumentos.tamanhos:
+            executar(tamanho, argumentos.modos, medidor, diretorio_temporario, argumentos.linhas_por_fatura)
+
+    if argumentos.json:
+        with open(argumentos.json, 'w', encoding='utf-8') as f:
+            json.dump({'pandas': pd.__version__, 'resultados': medidor.resultados}, f, indent=4, ensure_ascii=False)
+        print(f"Resultados gravados em {argumentos.json}")
@@ -0,0 +1,78 @@
+import argparse
+import random
+import time
+
+from fuzzywuzzy import fuzz
+from fuzzywuzzy import process
+
+from categorizador import (
+    construir_indice_fuzzy_estabelecimentos,
+    buscar_estabelecimento_fuzzy,
+    normalizar_texto,
+    SIMILARITY_THRESHOLD,
+)
+from benchmarks.geradores import PALAVRAS_ESTABELECIMENTOS_CNPJ
+
+NOMES_ESTABELECIMENTOS_ESPECIAIS = ['łódź pizza', 'restaurante tōkyō', 'bar d´agua', 'cafe n°1', 'кафе москва']
+CONSULTAS_ESPECIAIS = ['lodz pizza', 'łódź pizzaria', 'restaurante tōkyō', 'restaurante tokyo', 'bar d´agua', 'bar dagua', 'cafe n°1', 'кафе москва']
+
+
+def gerar_nomes_estabelecimentos(quantidade, semente=42):
+    gerador = random.Random(semente)
+    nomes = (
+        normalizar_texto(' '.join(gerador.choice(PALAVRAS_ESTABELECIMENTOS_CNPJ) for _ in range(gerador.randint(1, 5))))
+        for _ in range(quantidade * 3)
+    )
+    nomes_especiais = [normalizar_texto(nome) for nome in NOMES_ESTABELECIMENTOS_ESPECIAIS]
+    return list(dict.fromkeys(nomes))[:max(0, quantidade - len(nomes_especiais))] + nomes_especiais
+
+
+def gerar_consultas(nomes, quantidade, semente=7):
+    gerador = random.Random(semente)
+    consultas = []
+    for _ in range(quantidade):
+        caracteres = list(gerador.choice(nomes))
+        for _ in range(gerador.randint(0, 2)):
+            if caracteres and gerador.random() < 0.5:
+                caracteres.pop(gerador.randrange(len(caracteres)))
+            else:
+                caracteres.insert(gerador.randrange(len(caracteres) + 1), gerador.choice('abcdefghij '))
+        consultas.append(''.join(caracteres))
+    return consultas + CONSULTAS_ESPECIAIS
+
+
+def executar(quantidade_estabelecimentos, quantidade_consultas, comparar_varredura=True):
+    nomes = gerar_nomes_estabelecimentos(quantidade_estabelecimentos)
+    consultas = gerar_consultas(nomes, quantidade_consultas)
+
+    inicio = time.perf_counter()
+    indice = construir_indice_fuzzy_estabelecimentos(nomes)
+    tempo_construcao = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resultados_indice = [buscar_estabelecimento_fuzzy(indice, consulta, SIMILARITY_THRESHOLD) for consulta in consultas]
+    tempo_indice = time.perf_counter() - inicio
+
+    print(f"Estabelecimentos: {len(nomes)} | Consultas: {len(consultas)}")
+    print(f"  Construção do índice: {tempo_construcao:.3f}s")
+    print(f"  Índice:    {tempo_indice:.3f}s ({len(consultas) / tempo_indice:,.0f} consultas/s)")
+
+    if comparar_varredura:
+        inicio = time.perf_counter()
+        resultados_varredura = [
+            process.extractOne(consulta, nomes, scorer=fuzz.WRatio, score_cutoff=SIMILARITY_THRESHOLD)
+            for consulta in consultas
+        ]
+        tempo_varredura = time.perf_counter() - inicio
+        divergencias = sum(1 for a, b in zip(resultados_varredura, resultados_indice) if a != b)
+        print(f"  Varredura: {tempo_varredura:.3f}s ({len(consultas) / tempo_varredura:,.0f} consultas/s)")
+        print(f"  Ganho: {tempo_varredura / tempo_indice:.1f}x | Divergências: {divergencias}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compara o índice fuzzy de estabelecimentos com a varredura linear do extractOne.")
+    parser.add_argument('--estabelecimentos', type=int, default=20000)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--sem-varredura', action='store_true', help="Mede apenas o índice (útil para bases muito grandes).")
+    argumentos = parser.parse_args()
+    executar(argumentos.estabelecimentos, argumentos.consultas, comparar_varredura=not argumentos.sem_varredura)
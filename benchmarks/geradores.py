@@ -0,0 +1,93 @@
+import csv
+import io
+import random
+
+from categorizador import carregar_categorias_base_do_json
+
+ESTABELECIMENTOS_NUBANK = [
+    "Uber *Uber *Trip", "Ifd*Ifood", "Ifd*Aurea Helena Albuq", "Netflix.com", "Apple.Com/Bill", "Spotify",
+    "Mercadolivre*3produtos", "Amazon Marketplace", "Magalu", "Shopee *Loja", "Pag*Joaodasilva",
+    "Pao de Acucar 123", "Supermercado Bom Preco", "Padaria do Ze", "Farmacia Pague Menos", "Drogasil 0456",
+    "Posto Ipiranga", "Mp *J3acopiadora", "Dl*Google Youtube", "Pg *Ton Bar do Ze", "Restaurante Sabor Caseiro",
+    "Lanchonete Central", "Auto Pecas Norte", "Loja Moda Sul", "Cinema Manaira", "Academia Forma Fisica",
+]
+TITULOS_FINANCEIROS_NUBANK = [
+    "Pagamento recebido", "Juros de dívida encerrada", "IOF de atraso", "Multa de atraso", "Saldo em atraso",
+    "Crédito de atraso", "Estorno de \"Loja Exemplo\"",
+]
+PALAVRAS_ESTABELECIMENTOS_CNPJ = [
+    'padaria', 'mercado', 'supermercado', 'farmacia', 'drogaria', 'posto', 'bar', 'lanchonete',
+    'restaurante', 'comercial', 'comercio', 'ltda', 'me', 'eireli', 'joao', 'maria', 'sao', 'jose',
+    'silva', 'santos', 'souza', 'pessoa', 'norte', 'sul', 'bom', 'preco', 'do', 'da', 'de', 'pao',
+    'acucar', 'atacado', 'distribuidora', 'servicos', 'auto', 'pecas', 'moda', 'calcados',
+]
+GRUPOS_ATIVIDADE_CNPJ = [
+    'Alimentação', 'Supermercados', 'Farmácias e Drogarias', 'Transportes', 'Lojas de Roupa e Acessórios',
+    'Veículos e Autopeças', 'Serviços Pessoais e Domésticos', 'Comércio Varejista', 'Saúde', 'Educação',
+]
+
+
+class ArquivoEmMemoria(io.BytesIO):
+    def __init__(self, conteudo, name):
+        super().__init__(conteudo)
+        self.name = name
+
+
+def _gerar_nome_estabelecimento(gerador):
+    return ' '.join(gerador.choice(PALAVRAS_ESTABELECIMENTOS_CNPJ) for _ in range(gerador.randint(1, 5))).upper()
+
+
+def gerar_titulos_nubank(quantidade_estabelecimentos_unicos=2000, semente=11):
+    gerador = random.Random(semente)
+    palavras_chave = [
+        palavra_chave for palavras_chave_categoria in carregar_categorias_base_do_json().values()
+        for palavra_chave in palavras_chave_categoria if isinstance(palavra_chave, str)
+    ]
+    titulos = ESTABELECIMENTOS_NUBANK + palavras_chave[:500]
+    titulos += [_gerar_nome_estabelecimento(gerador).title() for _ in range(quantidade_estabelecimentos_unicos)]
+    return list(dict.fromkeys(titulos))
+
+
+def gerar_fatura_nubank_csv(quantidade_linhas, ciclo, titulos, semente=0, fracao_parcelados=0.15):
+    gerador = random.Random(f"{semente}-{ciclo}")
+    ano, mes = map(int, ciclo.split('-'))
+    pesos = [1 / (posicao + 1) for posicao in range(len(titulos))]
+    buffer_csv = io.StringIO()
+    escritor = csv.writer(buffer_csv)
+    escritor.writerow(['date', 'title', 'amount'])
+    for titulo in gerador.choices(titulos, weights=pesos, k=quantidade_linhas):
+        sorteio = gerador.random()
+        valor = round(gerador.lognormvariate(3.5, 1.0), 2)
+        if sorteio < fracao_parcelados:
+            total_parcelas = gerador.randint(2, 12)
+            titulo = f"{titulo} - Parcela {gerador.randint(1, total_parcelas)}/{total_parcelas}"
+        elif sorteio < fracao_parcelados + 0.02:
+            titulo = gerador.choice(TITULOS_FINANCEIROS_NUBANK)
+            valor = -valor if titulo.startswith(("Pagamento", "Estorno", "Crédito")) else valor
+        escritor.writerow([f"{ano:04d}-{mes:02d}-{gerador.randint(1, 28):02d}", titulo, f"{valor:.2f}"])
+    return buffer_csv.getvalue().encode('utf-8')
+
+
+def gerar_faturas_nubank(total_linhas, linhas_por_fatura=5000, ano_inicial=2015, semente=0):
+    titulos = gerar_titulos_nubank(semente=semente)
+    faturas = []
+    for indice_fatura in range(max(1, -(-total_linhas // linhas_por_fatura))):
+        ano, mes = ano_inicial + indice_fatura // 12, indice_fatura % 12 + 1
+        ciclo = f"{ano:04d}-{mes:02d}"
+        quantidade_linhas = min(linhas_por_fatura, total_linhas - indice_fatura * linhas_por_fatura)
+        faturas.append((f"Nubank_{ciclo}-10.csv", gerar_fatura_nubank_csv(quantidade_linhas, ciclo, titulos, semente)))
+    return faturas
+
+
+def escrever_base_cnpj(caminho_arquivo, quantidade_linhas, semente=5, fracao_estabelecimentos_nubank=0.01):
+    gerador = random.Random(semente)
+    with open(caminho_arquivo, 'w', encoding='utf-8-sig', newline='') as f:
+        escritor = csv.writer(f, delimiter=';')
+        escritor.writerow(['Column1', 'Column2', 'Column3', 'Column4', 'Column5', 'Grupo_Atividade'])
+        for i in range(quantidade_linhas):
+            if gerador.random() < fracao_estabelecimentos_nubank:
+                nome = gerador.choice(ESTABELECIMENTOS_NUBANK).upper()
+            else:
+                nome = _gerar_nome_estabelecimento(gerador)
+            escritor.writerow([f"{i:014d}", 'PB', 'JOAO PESSOA', 'ATIVA', nome, gerador.choice(GRUPOS_ATIVIDADE_CNPJ)])
+    return caminho_arquivo
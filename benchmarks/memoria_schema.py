@@ -0,0 +1,64 @@
+import argparse
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from categorizador import (
+    aplicar_schema_faturas,
+    carregar_categorias_base_do_json,
+    COLUNA_DATA, COLUNA_TITULO, COLUNA_VALOR, COLUNA_CATEGORIA, COLUNA_ID,
+    COLUNA_PARCELA_ATUAL, COLUNA_TOTAL_PARCELAS, COLUNA_FATURA_ORIGEM,
+)
+
+
+def gerar_dataframe_consolidado(anos, transacoes_por_mes, semente=3):
+    gerador = random.Random(semente)
+    categorias = list(carregar_categorias_base_do_json().keys()) or ["Sem Categoria/Pix Credito"]
+    estabelecimentos = [f"Estabelecimento {i:04d}" for i in range(800)]
+    linhas = []
+    for indice_mes in range(anos * 12):
+        ano, mes = 2015 + indice_mes // 12, indice_mes % 12 + 1
+        fatura_origem = f"Nubank_{ano}-{mes:02d}-10.csv"
+        for i in range(transacoes_por_mes):
+            parcelado = gerador.random() < 0.15
+            total_parcelas = gerador.randint(2, 12) if parcelado else None
+            linhas.append({
+                COLUNA_DATA: pd.Timestamp(ano, mes, gerador.randint(1, 28)),
+                COLUNA_TITULO: gerador.choice(estabelecimentos) + (f" - Parcela {gerador.randint(1, total_parcelas)}/{total_parcelas}" if parcelado else ""),
+                COLUNA_VALOR: round(gerador.uniform(1, 500), 2),
+                COLUNA_ID: f"{indice_mes:04d}-{i:05d}-{gerador.getrandbits(64):016x}",
+                COLUNA_PARCELA_ATUAL: float(gerador.randint(1, total_parcelas)) if parcelado else np.nan,
+                COLUNA_TOTAL_PARCELAS: float(total_parcelas) if parcelado else np.nan,
+                COLUNA_FATURA_ORIGEM: fatura_origem,
+                COLUNA_CATEGORIA: gerador.choice(categorias),
+            })
+    return pd.DataFrame(linhas)
+
+
+def medir_copia(df, repeticoes=20):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        df.copy()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mede a memória do DataFrame consolidado antes e depois de aplicar_schema_faturas.")
+    parser.add_argument('--anos', type=int, default=10)
+    parser.add_argument('--transacoes-por-mes', type=int, default=400)
+    argumentos = parser.parse_args()
+
+    df_objeto = gerar_dataframe_consolidado(argumentos.anos, argumentos.transacoes_por_mes)
+    df_tipado = aplicar_schema_faturas(df_objeto)
+
+    memoria_objeto = df_objeto.memory_usage(deep=True)
+    memoria_tipado = df_tipado.memory_usage(deep=True)
+    print(f"Linhas: {len(df_objeto):,} ({argumentos.anos} anos)")
+    print(f"{'coluna':<26}{'object (KB)':>14}{'tipado (KB)':>14}  dtype")
+    for coluna in df_objeto.columns:
+        print(f"{coluna:<26}{memoria_objeto[coluna] / 1024:>14,.0f}{memoria_tipado[coluna] / 1024:>14,.0f}  {df_tipado[coluna].dtype}")
+    total_objeto, total_tipado = memoria_objeto.sum(), memoria_tipado.sum()
+    print(f"{'TOTAL':<26}{total_objeto / 1024:>14,.0f}{total_tipado / 1024:>14,.0f}  ({1 - total_tipado / total_objeto:.0%} menor)")
+    print(f".copy(): object {medir_copia(df_objeto) * 1000:.1f} ms | tipado {medir_copia(df_tipado) * 1000:.1f} ms")
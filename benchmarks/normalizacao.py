@@ -0,0 +1,94 @@
+import argparse
+import math
+import random
+import sys
+import time
+
+import pandas as pd
+
+from categorizador import (
+    normalizar_texto,
+    normalizar_texto_serie,
+    extrair_info_parcela,
+    extrair_info_parcela_serie,
+    COLUNA_PARCELA_ATUAL,
+    COLUNA_TOTAL_PARCELAS,
+)
+
+TITULOS_NUBANK = [
+    "Uber *Uber *Trip", "Ifd*Ifood", "Ifd*Aurea Helena Albuq", "Netflix.com", "Apple.Com/Bill",
+    "Mercadolivre*3produtos - Parcela 3/10", "Amazon Marketplace - Parcela 1/12", "Loja Centro - parcela 01/06",
+    "LOJA  -  PARCELA 2/2", "Magalu Parcela 13/12", "Shopee *Loja 10/10", "Pag*Joaodasilva 2/3",
+    "Compra 12:30 1/2", "Pagamento 12/03/2024 3/4", "Posto 10-05-2023 1/2", "Pedid 1/2", "Pedidoid 1/2",
+    "cod 1/2", "REF 3/5", "Parcelamento de fatura 3/6", "Pagamento recebido", "Juros de dívida encerrada",
+    "IOF de atraso", "Estorno de \"Loja Exemplo\"", "Crédito de atraso", "Açaí do Pará", "  Padaria\tDo   Zé  ",
+    "0/5", "5/3", "1/2/3", "a1/2", "Loja 1/2 extra 3/4", "Loja 123/456", "Loja 1/2x", "",
+    "Mp *J3acopiadora", "Dl*Google Youtube", "Pg *Ton Bar do Zé 2/4", "Saldo em atraso",
+]
+VALORES_ESPECIAIS = [None, float('nan'), pd.NA, 123, 4.5]
+
+
+def gerar_titulos_aleatorios(quantidade, semente=13):
+    gerador = random.Random(semente)
+    pedacos = ["parcela", "Parcela", "-", " ", "  ", "/", "1", "12", "2024", "03", "10:30", "cod", "ref", "id",
+               "loja", "Açaí", "\t", "x", "*", "10-05-2023", "12/03/2024"]
+    return ["".join(gerador.choice(pedacos) for _ in range(gerador.randint(0, 8))) for _ in range(quantidade)]
+
+
+def _iguais(a, b):
+    if a is None or (isinstance(a, float) and math.isnan(a)):
+        return b is None or (isinstance(b, float) and math.isnan(b))
+    return a == b
+
+
+def verificar_paridade(titulos):
+    serie = pd.Series(titulos, dtype=object)
+    normalizados = normalizar_texto_serie(serie)
+    parcelas = extrair_info_parcela_serie(serie)
+    divergencias = []
+    for posicao, titulo in enumerate(titulos):
+        esperado_normalizado = normalizar_texto(titulo)
+        if normalizados.iloc[posicao] != esperado_normalizado:
+            divergencias.append(("normalizar_texto", titulo, esperado_normalizado, normalizados.iloc[posicao]))
+        esperado_atual, esperado_total = extrair_info_parcela(titulo)
+        obtido_atual = parcelas[COLUNA_PARCELA_ATUAL].iloc[posicao]
+        obtido_total = parcelas[COLUNA_TOTAL_PARCELAS].iloc[posicao]
+        if not (_iguais(esperado_atual, obtido_atual) and _iguais(esperado_total, obtido_total)):
+            divergencias.append(("extrair_info_parcela", titulo, (esperado_atual, esperado_total), (obtido_atual, obtido_total)))
+    return divergencias
+
+
+def medir(titulos):
+    serie = pd.Series(titulos, dtype=object)
+    inicio = time.perf_counter()
+    serie.apply(normalizar_texto)
+    serie.apply(extrair_info_parcela)
+    tempo_por_linha = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    normalizar_texto_serie(serie)
+    extrair_info_parcela_serie(serie)
+    tempo_vetorizado = time.perf_counter() - inicio
+    print(f"Linhas: {len(titulos)}")
+    print(f"  apply por linha: {tempo_por_linha:.3f}s ({len(titulos) / tempo_por_linha:,.0f} linhas/s)")
+    print(f"  vetorizado:      {tempo_vetorizado:.3f}s ({len(titulos) / tempo_vetorizado:,.0f} linhas/s)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Verifica a paridade e mede normalizar_texto/extrair_info_parcela escalar vs. vetorizado.")
+    parser.add_argument('--linhas', type=int, default=200000)
+    parser.add_argument('--aleatorios', type=int, default=20000, help="Títulos aleatórios adicionais na verificação de paridade.")
+    parser.add_argument('--fracao-unicos', type=float, default=0.3, help="Fração de títulos únicos na medição (o restante repete estabelecimentos comuns).")
+    argumentos = parser.parse_args()
+
+    divergencias = verificar_paridade(TITULOS_NUBANK + VALORES_ESPECIAIS + gerar_titulos_aleatorios(argumentos.aleatorios))
+    for funcao, titulo, esperado, obtido in divergencias[:20]:
+        print(f"DIVERGÊNCIA {funcao}: {titulo!r} esperado={esperado!r} obtido={obtido!r}")
+    if divergencias:
+        sys.exit(f"{len(divergencias)} divergência(s) entre as versões escalar e vetorizada.")
+    print("Paridade OK.")
+
+    quantidade_unicos = int(argumentos.linhas * argumentos.fracao_unicos)
+    titulos_repetidos = (TITULOS_NUBANK * (argumentos.linhas // len(TITULOS_NUBANK) + 1))[:argumentos.linhas - quantidade_unicos]
+    titulos_bench = titulos_repetidos + gerar_titulos_aleatorios(quantidade_unicos, semente=29)
+    random.Random(5).shuffle(titulos_bench)
+    medir(titulos_bench)
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+DIRETORIO_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ORCAMENTOS_IMPORTACAO_MS = {
+    'armazenamento': 450,
+    'painel': 450,
+    'categorizador': 450,
+    'servidor_categorizacao': 500,
+}
+ORCAMENTO_INICIALIZACAO_APP_MS = 1500
+MODULOS_ADIADOS = ('fuzzywuzzy', 'plotly', 'streamlit', 'PIL')
+MODULOS_ADIADOS_APP = ('fuzzywuzzy', 'plotly.express')
+ARQUIVOS_APP = ('sintagma.py', 'Categorias.json', 'Logo0.png')
+
+CODIGO_IMPORTACAO = """
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+segundos = time.perf_counter() - inicio
+print(json.dumps({{'segundos': segundos, 'carregados': sorted(sys.modules)}}))
+"""
+CODIGO_APP = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({caminho_app!r}, default_timeout=120)
+inicio = time.perf_counter()
+app.run()
+segundos = time.perf_counter() - inicio
+print(json.dumps({{'segundos': segundos, 'carregados': sorted(sys.modules), 'excecoes': [str(e.value) for e in app.exception]}}))
+"""
+
+
+def _executar_python(codigo, diretorio_trabalho, argumentos_extras=()):
+    ambiente = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [DIRETORIO_PROJETO, os.environ.get('PYTHONPATH')])))
+    resultado = subprocess.run(
+        [sys.executable, *argumentos_extras, '-c', codigo],
+        cwd=diretorio_trabalho, env=ambiente, capture_output=True, text=True, check=True
+    )
+    return resultado.stdout, resultado.stderr
+
+
+def _medir_em_processo_novo(codigo, diretorio_trabalho):
+    saida, _ = _executar_python(codigo, diretorio_trabalho)
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def _importacoes_mais_lentas(saida_importtime, quantidade):
+    importacoes = []
+    for linha in saida_importtime.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, tempo_acumulado_us, nome = linha[len('import time:'):].split('|')
+        if (len(nome) - len(nome.lstrip())) // 2 == 1:
+            importacoes.append((int(tempo_acumulado_us) / 1000, nome.strip()))
+    return sorted(importacoes, reverse=True)[:quantidade]
+
+
+def _modulos_adiados_carregados(carregados, modulos_adiados):
+    return sorted(modulo for modulo in modulos_adiados if modulo in carregados)
+
+
+def medir_importacao(modulo, repeticoes, quantidade_detalhes):
+    tempos_ms = []
+    carregados = []
+    for _ in range(repeticoes):
+        medicao = _medir_em_processo_novo(CODIGO_IMPORTACAO.format(modulo=modulo), DIRETORIO_PROJETO)
+        tempos_ms.append(medicao['segundos'] * 1000)
+        carregados = medicao['carregados']
+    _, saida_importtime = _executar_python(f"import {modulo}", DIRETORIO_PROJETO, ('-X', 'importtime'))
+    return {
+        'modulo': modulo,
+        'mediana_ms': statistics.median(tempos_ms),
+        'minimo_ms': min(tempos_ms),
+        'orcamento_ms': ORCAMENTOS_IMPORTACAO_MS.get(modulo),
+        'modulos_adiados_carregados': _modulos_adiados_carregados(carregados, MODULOS_ADIADOS),
+        'importacoes_mais_lentas': _importacoes_mais_lentas(saida_importtime, quantidade_detalhes),
+    }
+
+
+def medir_inicializacao_app(repeticoes):
+    tempos_ms = []
+    with tempfile.TemporaryDirectory() as diretorio_temporario:
+        for nome_arquivo in ARQUIVOS_APP:
+            shutil.copy2(os.path.join(DIRETORIO_PROJETO, nome_arquivo), diretorio_temporario)
+        for _ in range(repeticoes):
+            medicao = _medir_em_processo_novo(
+                CODIGO_APP.format(caminho_app=os.path.join(diretorio_temporario, 'sintagma.py')), diretorio_temporario
+            )
+            if medicao['excecoes']:
+                raise RuntimeError(f"sintagma.py falhou na primeira execução: {medicao['excecoes']}")
+            tempos_ms.append(medicao['segundos'] * 1000)
+    return {
+        'modulo': 'sintagma.py (primeira execução, sem faturas)',
+        'mediana_ms': statistics.median(tempos_ms),
+        'minimo_ms': min(tempos_ms),
+        'orcamento_ms': ORCAMENTO_INICIALIZACAO_APP_MS,
+        'modulos_adiados_carregados': _modulos_adiados_carregados(medicao['carregados'], MODULOS_ADIADOS_APP),
+        'importacoes_mais_lentas': [],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mede o tempo de importação dos módulos do projeto (processo novo a cada repetição) e compara com o orçamento de inicialização.")
+    parser.add_argument('--modulos', nargs='+', choices=list(ORCAMENTOS_IMPORTACAO_MS), default=list(ORCAMENTOS_IMPORTACAO_MS))
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--detalhes', type=int, default=5, help="Quantidade de importações diretas mais lentas exibidas por módulo.")
+    parser.add_argument('--app', action='store_true', help="Mede também a primeira execução do sintagma.py via streamlit AppTest.")
+    parser.add_argument('--json', help="Grava os resultados neste arquivo JSON para comparação entre versões.")
+    argumentos = parser.parse_args()
+
+    resultados = [medir_importacao(modulo, argumentos.repeticoes, argumentos.detalhes) for modulo in argumentos.modulos]
+    if argumentos.app:
+        resultados.append(medir_inicializacao_app(max(1, argumentos.repeticoes // 2)))
+
+    estouros = []
+    print(f"{'módulo':<48}{'mediana':>11}{'mínimo':>11}{'orçamento':>12}")
+    for resultado in resultados:
+        print(f"{resultado['modulo']:<48}{resultado['mediana_ms']:>9.0f}ms{resultado['minimo_ms']:>9.0f}ms{resultado['orcamento_ms']:>10}ms")
+        for tempo_ms, nome in resultado['importacoes_mais_lentas']:
+            print(f"    {nome:<44}{tempo_ms:>9.0f}ms")
+        if resultado['mediana_ms'] > resultado['orcamento_ms']:
+            estouros.append(f"{resultado['modulo']}: {resultado['mediana_ms']:.0f}ms > {resultado['orcamento_ms']}ms")
+        if resultado['modulos_adiados_carregados']:
+            estouros.append(f"{resultado['modulo']}: carrega na inicialização {', '.join(resultado['modulos_adiados_carregados'])}")
+
+    if argumentos.json:
+        with open(argumentos.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version, 'resultados': resultados}, f, indent=4, ensure_ascii=False)
+        print(f"Resultados gravados em {argumentos.json}")
+    if estouros:
+        print("Orçamento de inicialização excedido:\n  " + "\n  ".join(estouros))
+        sys.exit(1)
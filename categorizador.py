@@ -1,12 +1,28 @@
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict, deque
+from contextlib import contextmanager, redirect_stdout
 import pandas as pd
+import numpy as np
+import functools
 import datetime
+import hashlib
+import threading
+import time
 import json
+import sys
 import os
 import re
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
 CAMINHO_CATEGORIAS_BASE_JSON = "Categorias.json"
+SUFIXO_DIARIO_CATEGORIAS = ".diario.jsonl"
+SUFIXO_TRAVA_CATEGORIAS = ".lock"
+TAMANHO_MAXIMO_DIARIO_CATEGORIAS = 64 * 1024
 CAMINHO_PRINCIPAL_PROCESSADO_DEFAULT_PREFIXO = "CNPJ_Estabelecimentos"
 COLUNA_ESTAB_PRINCIPAL_DEFAULT = 'Column5'
 COLUNA_ATIVIDADE_PRINCIPAL_DEFAULT = 'Grupo_Atividade'
@@ -21,36 +37,222 @@ COLUNA_PARCELA_ATUAL = 'parcela_atual'
 COLUNA_TOTAL_PARCELAS = 'total_parcelas'
 COLUNA_FATURA_ORIGEM = 'fatura_origem'
 COLUNA_EDIT_ID = 'edit_id'
+COLUNA_CATEGORIA_NUBANK_ORIGINAL = 'category_nubank_original'
 SIMILARITY_THRESHOLD = 95
+PREFIXO_SEM_CATEGORIA = 'Sem Categoria'
+MAX_THREADS_LEITURA_FATURAS = 8
+TAMANHO_MAXIMO_CACHE_CATEGORIZACAO = 50000
+TAMANHO_MAXIMO_CACHE_FATURAS_LIDAS = 64
+ALFABETO_FUZZY = "abcdefghijklmnopqrstuvwxyz0123456789_ "
+TAMANHO_BLOCO_INDICE_FUZZY = 100000
+SUFIXO_INDICE_ESTABELECIMENTOS = ".indice.pkl"
+VERSAO_INDICE_ESTABELECIMENTOS = 3
+TAMANHO_BLOCO_BYTES_ESTABELECIMENTOS = 32 << 20
+TAMANHO_BLOCO_LINHAS_ESTABELECIMENTOS = 500000
+MODOS_CATEGORIZACAO_LINHA_DE_COMANDO = {'generica': False, 'especifica': True}
+FORMATOS_SAIDA_LINHA_DE_COMANDO = {'.parquet': 'parquet', '.csv': 'csv'}
+BLOCOS_TITULOS_POR_PROCESSO = 4
+PADRAO_PARCELA_NO_TITULO = re.compile(r"(?i)(\s*-\s*)?\bparcela\s+\d+/\d+\b")
+PADRAO_FRACAO_NO_TITULO = re.compile(r"(?<!\d{2}:\d{2}\s)(?<!\d{2}[-/]\d{2}[-/]\d{4}\s)\b\d+/\d+\b", re.IGNORECASE)
+PADRAO_PARCELA_COMPLETA = re.compile(r"(?i)\bparcela\s+(\d+)/(\d+)\b")
+PADRAO_PARCELA_SIMPLES = re.compile(r"(?<![\w\d/])(\d{1,2})/(\d{1,2})\b(?![\w\d/])")
+PADRAO_PARCELA_SIMPLES_COM_PREFIXO = re.compile(r"(?s)^(.*?)(?<![\w\d/])(\d{1,2})/(\d{1,2})\b(?![\w\d/])")
+PADRAO_CONTEXTO_NAO_PARCELA = re.compile(r"\d{2}:\d{2}$|\d{2}-\d{2}-\d{4}$|\b\w+id\b$|\bcod\b$|\bref\b$", re.IGNORECASE)
+
+
+def caminho_diario_categorias(caminho_arquivo=CAMINHO_CATEGORIAS_BASE_JSON):
+    return f"{caminho_arquivo}{SUFIXO_DIARIO_CATEGORIAS}"
+
+@contextmanager
+def _trava_arquivo_categorias(caminho_arquivo):
+    with open(f"{caminho_arquivo}{SUFIXO_TRAVA_CATEGORIAS}", 'a+b') as arquivo_trava:
+        if fcntl is not None:
+            fcntl.flock(arquivo_trava.fileno(), fcntl.LOCK_EX)
+        else:
+            arquivo_trava.seek(0)
+            msvcrt.locking(arquivo_trava.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(arquivo_trava.fileno(), fcntl.LOCK_UN)
+            else:
+                arquivo_trava.seek(0)
+                msvcrt.locking(arquivo_trava.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _ler_snapshot_categorias(caminho_arquivo, estrito=False):
+    if not os.path.exists(caminho_arquivo):
+        return {}
+    try:
+        with open(caminho_arquivo, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            return data
+        if estrito:
+            raise ValueError(f"Conteúdo de {caminho_arquivo} não é um dicionário.")
+        print(f"Erro: Conteúdo de {caminho_arquivo} não é um dicionário. Retornando dicionário vazio.")
+        return {}
+    except json.JSONDecodeError as e:
+        if estrito:
+            raise
+        print(f"Erro ao decodificar JSON em {caminho_arquivo}: {e}. Retornando dicionário vazio.")
+        return {}
+
+OPERACOES_CATEGORIAS_COM_PALAVRA_CHAVE = ('adicionar_palavra_chave', 'remover_palavra_chave')
+OPERACOES_CATEGORIAS = ('criar_categoria', 'remover_categoria') + OPERACOES_CATEGORIAS_COM_PALAVRA_CHAVE
 
+def _operacao_categorias_valida(operacao):
+    if not isinstance(operacao, dict) or operacao.get('op') not in OPERACOES_CATEGORIAS:
+        return False
+    if not isinstance(operacao.get('categoria'), str):
+        return False
+    return operacao['op'] not in OPERACOES_CATEGORIAS_COM_PALAVRA_CHAVE or isinstance(operacao.get('palavra_chave'), str)
+
+def _ler_diario_categorias(caminho_diario):
+    operacoes = []
+    if not os.path.exists(caminho_diario):
+        return operacoes
+    with open(caminho_diario, 'r', encoding='utf-8') as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                operacao = json.loads(linha)
+            except json.JSONDecodeError:
+                print(f"Aviso: entrada inválida ignorada no diário de categorias {caminho_diario}.")
+                continue
+            if not _operacao_categorias_valida(operacao):
+                print(f"Aviso: operação malformada ignorada no diário de categorias {caminho_diario}: {linha}")
+                continue
+            operacoes.append(operacao)
+    return operacoes
+
+def aplicar_operacoes_categorias(dicionario_categorias, operacoes):
+    for operacao in operacoes:
+        tipo_operacao = operacao.get('op')
+        categoria = operacao.get('categoria')
+        if tipo_operacao == 'criar_categoria':
+            if not isinstance(dicionario_categorias.get(categoria), list):
+                dicionario_categorias[categoria] = []
+        elif tipo_operacao == 'remover_categoria':
+            dicionario_categorias.pop(categoria, None)
+        elif tipo_operacao == 'adicionar_palavra_chave':
+            if not isinstance(dicionario_categorias.get(categoria), list):
+                dicionario_categorias[categoria] = []
+            if operacao['palavra_chave'] not in dicionario_categorias[categoria]:
+                dicionario_categorias[categoria].append(operacao['palavra_chave'])
+        elif tipo_operacao == 'remover_palavra_chave':
+            palavras_chave = dicionario_categorias.get(categoria)
+            if isinstance(palavras_chave, list) and operacao['palavra_chave'] in palavras_chave:
+                palavras_chave.remove(operacao['palavra_chave'])
+    return dicionario_categorias
+
+def _carregar_categorias_sem_trava(caminho_arquivo):
+    return aplicar_operacoes_categorias(
+        _ler_snapshot_categorias(caminho_arquivo),
+        _ler_diario_categorias(caminho_diario_categorias(caminho_arquivo))
+    )
 
 def carregar_categorias_base_do_json(caminho_arquivo=CAMINHO_CATEGORIAS_BASE_JSON):
-    if os.path.exists(caminho_arquivo):
+    try:
         try:
-            with open(caminho_arquivo, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, dict):
-                    return data
-                else:
-                    print(f"Erro: Conteúdo de {caminho_arquivo} não é um dicionário. Retornando dicionário vazio.")
-                    return {}
-        except json.JSONDecodeError as e:
-            print(f"Erro ao decodificar JSON em {caminho_arquivo}: {e}. Retornando dicionário vazio.")
-            return {}
-        except Exception as e:
-            print(f"Erro inesperado ao carregar {caminho_arquivo}: {e}. Retornando dicionário vazio.")
-            return {}
-    return {}
+            with _trava_arquivo_categorias(caminho_arquivo):
+                return _carregar_categorias_sem_trava(caminho_arquivo)
+        except OSError:
+            return _carregar_categorias_sem_trava(caminho_arquivo)
+    except Exception as e:
+        print(f"Erro inesperado ao carregar {caminho_arquivo}: {e}. Retornando dicionário vazio.")
+        return {}
+
+def _gravar_snapshot_categorias(caminho_arquivo, dicionario_categorias):
+    caminho_temporario = f"{caminho_arquivo}.tmp{os.getpid()}_{threading.get_ident()}"
+    with open(caminho_temporario, 'w', encoding='utf-8') as f:
+        json.dump(dicionario_categorias, f, indent=4, ensure_ascii=False)
+    os.replace(caminho_temporario, caminho_arquivo)
+
+def registrar_operacoes_categorias(operacoes, caminho_arquivo=CAMINHO_CATEGORIAS_BASE_JSON):
+    if not operacoes:
+        return True
+    caminho_diario = caminho_diario_categorias(caminho_arquivo)
+    try:
+        with _trava_arquivo_categorias(caminho_arquivo):
+            with open(caminho_diario, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(operacao, ensure_ascii=False) + '\n' for operacao in operacoes))
+                f.flush()
+                os.fsync(f.fileno())
+            compactar = os.path.getsize(caminho_diario) > TAMANHO_MAXIMO_DIARIO_CATEGORIAS
+    except Exception as e:
+        print(f"Erro ao registrar alterações de categorias em {caminho_diario}: {e}")
+        return False
+    if compactar:
+        threading.Thread(target=compactar_diario_categorias, args=(caminho_arquivo,), daemon=True).start()
+    return True
 
-def salvar_categorias_base_para_json(dicionario_categorias, caminho_arquivo=CAMINHO_CATEGORIAS_BASE_JSON):
+def compactar_diario_categorias(caminho_arquivo=CAMINHO_CATEGORIAS_BASE_JSON):
+    caminho_diario = caminho_diario_categorias(caminho_arquivo)
     try:
-        with open(caminho_arquivo, 'w', encoding='utf-8') as f:
-            json.dump(dicionario_categorias, f, indent=4, ensure_ascii=False)
+        with _trava_arquivo_categorias(caminho_arquivo):
+            operacoes = _ler_diario_categorias(caminho_diario)
+            if not operacoes:
+                if os.path.exists(caminho_diario):
+                    os.remove(caminho_diario)
+                return True
+            categorias = aplicar_operacoes_categorias(_ler_snapshot_categorias(caminho_arquivo, estrito=True), operacoes)
+            _gravar_snapshot_categorias(caminho_arquivo, categorias)
+            os.remove(caminho_diario)
         return True
     except Exception as e:
-        print(f"Erro ao salvar categorias base em {caminho_arquivo}: {e}")
+        print(f"Erro ao compactar o diário de categorias {caminho_diario}: {e}")
         return False
 
+_TRAVA_METRICAS_DESEMPENHO = threading.Lock()
+
+def criar_metricas_desempenho():
+    return {'etapas': {}, 'contadores': {}, 'etapa_aberta': None}
+
+def _registrar_etapa(metricas_desempenho, nome_etapa, segundos, linhas=None):
+    with _TRAVA_METRICAS_DESEMPENHO:
+        etapa = metricas_desempenho['etapas'].setdefault(nome_etapa, {'segundos': 0.0, 'chamadas': 0, 'linhas': 0})
+        etapa['segundos'] += segundos
+        etapa['chamadas'] += 1
+        etapa['linhas'] += linhas or 0
+
+@contextmanager
+def medir_etapa(metricas_desempenho, nome_etapa, linhas=None):
+    registro = {'linhas': linhas}
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        if metricas_desempenho is not None:
+            _registrar_etapa(metricas_desempenho, nome_etapa, time.perf_counter() - inicio, registro['linhas'])
+
+def marcar_etapa(metricas_desempenho, nome_etapa):
+    agora = time.perf_counter()
+    if metricas_desempenho['etapa_aberta'] is not None:
+        nome_anterior, inicio_anterior = metricas_desempenho['etapa_aberta']
+        _registrar_etapa(metricas_desempenho, nome_anterior, agora - inicio_anterior)
+    metricas_desempenho['etapa_aberta'] = (nome_etapa, agora) if nome_etapa else None
+
+def contar_evento(metricas_desempenho, nome_contador, quantidade=1):
+    if metricas_desempenho is None:
+        return
+    with _TRAVA_METRICAS_DESEMPENHO:
+        metricas_desempenho['contadores'][nome_contador] = metricas_desempenho['contadores'].get(nome_contador, 0) + int(quantidade)
+
+def exportar_metricas_desempenho(metricas_desempenho):
+    return {
+        'etapas': {
+            nome_etapa: {
+                **etapa,
+                'linhas_por_segundo': etapa['linhas'] / etapa['segundos'] if etapa['linhas'] and etapa['segundos'] else None,
+            }
+            for nome_etapa, etapa in metricas_desempenho['etapas'].items()
+        },
+        'contadores': dict(metricas_desempenho['contadores']),
+    }
+
 def exibir_mensagem_progresso(streamlit_log_area, mensagem, tipo='info'):
     if streamlit_log_area:
         if hasattr(streamlit_log_area, tipo):
@@ -62,119 +264,770 @@ def exibir_mensagem_progresso(streamlit_log_area, mensagem, tipo='info'):
 def normalizar_texto(texto):
     if pd.isna(texto): return ""
     s = str(texto)
-    s = re.sub(r"(?i)(\s*-\s*)?\bparcela\s+\d+/\d+\b", "", s)
-    s = re.sub(r"(?<!\d{2}:\d{2}\s)(?<!\d{2}[-/]\d{2}[-/]\d{4}\s)\b\d+/\d+\b", "", s, flags=re.IGNORECASE)
-    s = s.lower().strip()
-    s = re.sub(r'\s+', ' ', s)
-    return s
+    if '/' in s:
+        s = PADRAO_PARCELA_NO_TITULO.sub("", s)
+        s = PADRAO_FRACAO_NO_TITULO.sub("", s)
+    return ' '.join(s.lower().split())
+
+def normalizar_texto_serie(serie_textos):
+    codigos, textos_unicos = pd.factorize(serie_textos.astype(object))
+    textos = pd.Series(textos_unicos, dtype=object).astype(str)
+    com_barra = textos.str.contains('/', regex=False)
+    if com_barra.any():
+        textos.loc[com_barra] = (
+            textos.loc[com_barra]
+            .str.replace(PADRAO_PARCELA_NO_TITULO, "", regex=True)
+            .str.replace(PADRAO_FRACAO_NO_TITULO, "", regex=True)
+        )
+    normalizados_unicos = np.array([' '.join(texto.split()) for texto in textos.str.lower()] + [""], dtype=object)
+    return pd.Series(normalizados_unicos[codigos], index=serie_textos.index, dtype=object)
 
 def extrair_info_parcela(titulo_original):
     if pd.isna(titulo_original):
         return None, None
-    match_completo = re.search(r"(?i)\bparcela\s+(\d+)/(\d+)\b", str(titulo_original))
+    titulo_original = str(titulo_original)
+    if '/' not in titulo_original:
+        return None, None
+    match_completo = PADRAO_PARCELA_COMPLETA.search(titulo_original)
     if match_completo:
         return int(match_completo.group(1)), int(match_completo.group(2))
-    match_simples = re.search(r"(?<![\w\d/])(\d{1,2})/(\d{1,2})\b(?![\w\d/])", str(titulo_original))
+    match_simples = PADRAO_PARCELA_SIMPLES.search(titulo_original)
     if match_simples:
-        texto_antes = str(titulo_original)[:match_simples.start()].strip()
-        if not re.search(r"\d{2}:\d{2}$|\d{2}-\d{2}-\d{4}$|\b\w+id\b$|\bcod\b$|\bref\b$", texto_antes, re.IGNORECASE):
+        texto_antes = titulo_original[:match_simples.start()].strip()
+        if not PADRAO_CONTEXTO_NAO_PARCELA.search(texto_antes):
             parc_atual, parc_total = int(match_simples.group(1)), int(match_simples.group(2))
             if parc_total > 0 and parc_atual > 0 and parc_atual <= parc_total:
                 return parc_atual, parc_total
     return None, None
 
+def extrair_info_parcela_serie(serie_titulos):
+    codigos, titulos_unicos = pd.factorize(serie_titulos.astype(object))
+    titulos = pd.Series(titulos_unicos, dtype=object).astype(str)
+    parcelas_unicas = pd.DataFrame({COLUNA_PARCELA_ATUAL: np.nan, COLUNA_TOTAL_PARCELAS: np.nan}, index=range(len(titulos) + 1))
+    titulos = titulos[titulos.str.contains('/', regex=False)]
+    if not titulos.empty:
+        match_completo = titulos.str.extract(PADRAO_PARCELA_COMPLETA).apply(pd.to_numeric).dropna(subset=[0])
+        match_simples = titulos.drop(match_completo.index).str.extract(PADRAO_PARCELA_SIMPLES_COM_PREFIXO).dropna(subset=[1])
+        parcela_atual_simples = pd.to_numeric(match_simples[1])
+        parcela_total_simples = pd.to_numeric(match_simples[2])
+        simples_valida = (
+            ~match_simples[0].str.strip().str.contains(PADRAO_CONTEXTO_NAO_PARCELA)
+            & (parcela_total_simples > 0)
+            & (parcela_atual_simples > 0)
+            & (parcela_atual_simples <= parcela_total_simples)
+        )
+        parcelas_unicas.loc[match_completo.index, COLUNA_PARCELA_ATUAL] = match_completo[0]
+        parcelas_unicas.loc[match_completo.index, COLUNA_TOTAL_PARCELAS] = match_completo[1]
+        parcelas_unicas.loc[simples_valida.index[simples_valida], COLUNA_PARCELA_ATUAL] = parcela_atual_simples[simples_valida]
+        parcelas_unicas.loc[simples_valida.index[simples_valida], COLUNA_TOTAL_PARCELAS] = parcela_total_simples[simples_valida]
+    return pd.DataFrame(parcelas_unicas.to_numpy(dtype='float64')[codigos], columns=parcelas_unicas.columns, index=serie_titulos.index)
+
+def construir_automato_palavras_chave(categorias_base_palavras_chave_norm_para_keywords):
+    # Aho-Corasick: cada nó guarda o menor índice de categoria cuja palavra-chave termina nele
+    # (incluindo as alcançáveis pelos links de falha), o que reproduz a regra "primeira categoria vence".
+    categorias = list(categorias_base_palavras_chave_norm_para_keywords.keys())
+    sem_categoria = len(categorias)
+    transicoes = [{}]
+    falhas = [0]
+    prioridades = [sem_categoria]
+    for indice_categoria, palavras_chave_normalizadas in enumerate(categorias_base_palavras_chave_norm_para_keywords.values()):
+        for palavra_chave_norm in palavras_chave_normalizadas:
+            if not palavra_chave_norm:
+                continue
+            no = 0
+            for caractere in palavra_chave_norm:
+                proximo = transicoes[no].get(caractere)
+                if proximo is None:
+                    proximo = len(transicoes)
+                    transicoes[no][caractere] = proximo
+                    transicoes.append({})
+                    falhas.append(0)
+                    prioridades.append(sem_categoria)
+                no = proximo
+            prioridades[no] = min(prioridades[no], indice_categoria)
+    fila = deque(transicoes[0].values())
+    while fila:
+        no = fila.popleft()
+        for caractere, filho in transicoes[no].items():
+            fila.append(filho)
+            falha = falhas[no]
+            while falha and caractere not in transicoes[falha]:
+                falha = falhas[falha]
+            falhas[filho] = transicoes[falha].get(caractere, 0)
+            prioridades[filho] = min(prioridades[filho], prioridades[falhas[filho]])
+    return {
+        'categorias': categorias,
+        'transicoes': transicoes,
+        'falhas': falhas,
+        'prioridades': prioridades,
+    }
+
+@functools.lru_cache(maxsize=8)
+def _automato_para_base(chave_base_palavras_chave):
+    return construir_automato_palavras_chave(dict(chave_base_palavras_chave))
+
+def obter_automato_palavras_chave(categorias_base_palavras_chave_norm_para_keywords):
+    chave_base_palavras_chave = tuple(
+        (cat_orig, tuple(kws_norm))
+        for cat_orig, kws_norm in categorias_base_palavras_chave_norm_para_keywords.items()
+    )
+    return _automato_para_base(chave_base_palavras_chave)
+
+def buscar_categoria_por_palavra_chave(automato_palavras_chave, titulo_fatura_normalizado):
+    transicoes = automato_palavras_chave['transicoes']
+    falhas = automato_palavras_chave['falhas']
+    prioridades = automato_palavras_chave['prioridades']
+    categorias = automato_palavras_chave['categorias']
+    melhor_indice = len(categorias)
+    no = 0
+    for caractere in titulo_fatura_normalizado:
+        while no and caractere not in transicoes[no]:
+            no = falhas[no]
+        no = transicoes[no].get(caractere, 0)
+        if prioridades[no] < melhor_indice:
+            melhor_indice = prioridades[no]
+            if melhor_indice == 0:
+                break
+    return categorias[melhor_indice] if melhor_indice < len(categorias) else None
+
 def _categorizar_transacao_core(titulo_fatura_normalizado,
                                 categorias_base_palavras_chave_norm_para_keywords,
                                 categorias_orig_norm_para_orig_map,
                                 usar_fuzzy_estabelecimentos,
                                 lista_estab_norm_lookup,
                                 mapa_estab_atividade,
-                                threshold):
+                                threshold,
+                                automato_palavras_chave=None,
+                                indice_fuzzy_estabelecimentos=None):
     if titulo_fatura_normalizado in categorias_orig_norm_para_orig_map:
         return categorias_orig_norm_para_orig_map[titulo_fatura_normalizado]
-    for categoria_original, palavras_chave_normalizadas in categorias_base_palavras_chave_norm_para_keywords.items():
-        for palavra_chave_norm in palavras_chave_normalizadas:
-            if palavra_chave_norm and palavra_chave_norm in titulo_fatura_normalizado:
-                return categoria_original
+    if automato_palavras_chave is None:
+        automato_palavras_chave = obter_automato_palavras_chave(categorias_base_palavras_chave_norm_para_keywords)
+    categoria_palavra_chave = buscar_categoria_por_palavra_chave(automato_palavras_chave, titulo_fatura_normalizado)
+    if categoria_palavra_chave is not None:
+        return categoria_palavra_chave
     if usar_fuzzy_estabelecimentos and lista_estab_norm_lookup:
-        if not titulo_fatura_normalizado.strip():
-            return 'Sem Categoria (Título Vazio)'
-        try:
+        return _categorizar_por_estabelecimento_fuzzy(titulo_fatura_normalizado, lista_estab_norm_lookup, mapa_estab_atividade, threshold, indice_fuzzy_estabelecimentos)
+    return 'Sem Categoria/Pix Credito'
+
+def _categorizar_por_estabelecimento_fuzzy(titulo_fatura_normalizado,
+                                           lista_estab_norm_lookup,
+                                           mapa_estab_atividade,
+                                           threshold,
+                                           indice_fuzzy_estabelecimentos=None):
+    if not titulo_fatura_normalizado.strip():
+        return 'Sem Categoria (Título Vazio)'
+    from fuzzywuzzy import fuzz, process
+    try:
+        if indice_fuzzy_estabelecimentos is not None:
+            melhor_match_info = buscar_estabelecimento_fuzzy(indice_fuzzy_estabelecimentos, titulo_fatura_normalizado, threshold)
+        else:
             melhor_match_info = process.extractOne(titulo_fatura_normalizado, lista_estab_norm_lookup, scorer=fuzz.WRatio, score_cutoff=threshold)
-        except Exception:
-            return 'Erro Fuzzy Match'
-        if melhor_match_info:
-            nome_estab_correspondente, pontuacao = melhor_match_info
-            if nome_estab_correspondente in mapa_estab_atividade:
-                return mapa_estab_atividade[nome_estab_correspondente]
+    except Exception:
+        return 'Erro Fuzzy Match'
+    if melhor_match_info:
+        nome_estab_correspondente, pontuacao = melhor_match_info
+        if nome_estab_correspondente in mapa_estab_atividade:
+            return mapa_estab_atividade[nome_estab_correspondente]
+        else:
+            return 'Sem Categoria (Fuzzy - Mapa Principal Vazio)'
+    else:
+        return 'Sem Categoria (Fuzzy - Baixa Similaridade)'
+
+def criar_cache_categorizacao(tamanho_maximo=TAMANHO_MAXIMO_CACHE_CATEGORIZACAO):
+    return {
+        'tamanho_maximo': tamanho_maximo,
+        'titulos': OrderedDict(),
+        'configuracao': None,
+        'ordem_categorias': None,
+        'pares_palavras_chave': None,
+        'nomes_categorias': None,
+    }
+
+def sincronizar_cache_categorizacao(cache_categorizacao,
+                                    categorias_base_palavras_chave_norm_para_keywords,
+                                    categorias_orig_norm_para_orig_map,
+                                    configuracao):
+    titulos_cache = cache_categorizacao['titulos']
+    ordem_categorias = list(categorias_base_palavras_chave_norm_para_keywords.keys())
+    pares_palavras_chave = {
+        (cat_orig, kw_norm)
+        for cat_orig, kws_norm in categorias_base_palavras_chave_norm_para_keywords.items()
+        for kw_norm in kws_norm if kw_norm
+    }
+    nomes_categorias = set(categorias_orig_norm_para_orig_map.items())
+    if cache_categorizacao['configuracao'] != configuracao or cache_categorizacao['ordem_categorias'] is None:
+        titulos_cache.clear()
+    else:
+        categorias_mantidas = set(ordem_categorias) & set(cache_categorizacao['ordem_categorias'])
+        if [c for c in cache_categorizacao['ordem_categorias'] if c in categorias_mantidas] != [c for c in ordem_categorias if c in categorias_mantidas]:
+            titulos_cache.clear()
+        else:
+            palavras_chave_alteradas = {kw_norm for _, kw_norm in pares_palavras_chave ^ cache_categorizacao['pares_palavras_chave']}
+            nomes_alterados = {nome_norm for nome_norm, _ in nomes_categorias ^ cache_categorizacao['nomes_categorias']}
+            if palavras_chave_alteradas or nomes_alterados:
+                automato_alteracoes = construir_automato_palavras_chave({'alteradas': list(palavras_chave_alteradas)})
+                titulos_afetados = [
+                    titulo for titulo in titulos_cache
+                    if titulo in nomes_alterados or buscar_categoria_por_palavra_chave(automato_alteracoes, titulo) is not None
+                ]
+                for titulo in titulos_afetados:
+                    del titulos_cache[titulo]
+    cache_categorizacao['configuracao'] = configuracao
+    cache_categorizacao['ordem_categorias'] = ordem_categorias
+    cache_categorizacao['pares_palavras_chave'] = pares_palavras_chave
+    cache_categorizacao['nomes_categorias'] = nomes_categorias
+
+def categorizar_titulos_em_lote(serie_titulos_normalizados,
+                                categorias_base_palavras_chave_norm_para_keywords,
+                                categorias_orig_norm_para_orig_map,
+                                usar_fuzzy_estabelecimentos,
+                                lista_estab_norm_lookup,
+                                mapa_estab_atividade,
+                                threshold,
+                                automato_palavras_chave=None,
+                                cache_categorizacao=None,
+                                indice_fuzzy_estabelecimentos=None,
+                                metricas_desempenho=None):
+    titulos_unicos = pd.unique(serie_titulos_normalizados)
+    contar_evento(metricas_desempenho, 'titulos_unicos', len(titulos_unicos))
+    mapa_titulo_categoria = {}
+    titulos_sem_cache = titulos_unicos
+    if cache_categorizacao is not None:
+        titulos_cache = cache_categorizacao['titulos']
+        titulos_sem_cache = []
+        for titulo in titulos_unicos:
+            if titulo in titulos_cache:
+                titulos_cache.move_to_end(titulo)
+                mapa_titulo_categoria[titulo] = titulos_cache[titulo]
             else:
-                return 'Sem Categoria (Fuzzy - Mapa Principal Vazio)'
+                titulos_sem_cache.append(titulo)
+        contar_evento(metricas_desempenho, 'titulos_em_cache', len(mapa_titulo_categoria))
+    if len(titulos_sem_cache):
+        categorias_novas = _categorizar_titulos_unicos(
+            pd.Series(titulos_sem_cache, dtype=object),
+            categorias_base_palavras_chave_norm_para_keywords,
+            categorias_orig_norm_para_orig_map,
+            usar_fuzzy_estabelecimentos,
+            lista_estab_norm_lookup,
+            mapa_estab_atividade,
+            threshold,
+            automato_palavras_chave,
+            indice_fuzzy_estabelecimentos,
+            metricas_desempenho
+        )
+        mapa_titulo_categoria.update(zip(titulos_sem_cache, categorias_novas))
+        if cache_categorizacao is not None:
+            for titulo, categoria in zip(titulos_sem_cache, categorias_novas):
+                if categoria != 'Erro Fuzzy Match':
+                    titulos_cache[titulo] = categoria
+            while len(titulos_cache) > cache_categorizacao['tamanho_maximo']:
+                titulos_cache.popitem(last=False)
+    return serie_titulos_normalizados.map(mapa_titulo_categoria)
+
+def propagar_categorias_por_titulo(serie_titulos,
+                                   serie_categorias,
+                                   mapa_titulo_norm_para_categoria,
+                                   categorias_protegidas=()):
+    # Títulos normalizados iguais recebem a nova categoria; títulos que apenas contêm a nova
+    # palavra-chave só são reatribuídos quando ainda estão sem categoria.
+    if not mapa_titulo_norm_para_categoria or serie_titulos.empty:
+        return pd.Series(dtype=object)
+    codigos, titulos_unicos = pd.factorize(normalizar_texto_serie(serie_titulos))
+    titulos_unicos = pd.Series(titulos_unicos, dtype=object)
+    categorias_unicas = titulos_unicos.map(mapa_titulo_norm_para_categoria).astype(object)
+    sem_correspondencia_exata = categorias_unicas.isna()
+
+    categorias_atuais = serie_categorias.astype(object)
+    linhas_sem_categoria = (categorias_atuais.isna() | categorias_atuais.astype(str).str.startswith(PREFIXO_SEM_CATEGORIA)).to_numpy()
+    candidatos_palavra_chave = sem_correspondencia_exata & titulos_unicos.index.isin(np.unique(codigos[linhas_sem_categoria]))
+    if candidatos_palavra_chave.any():
+        palavras_chave_por_categoria = {}
+        for titulo_norm, categoria in mapa_titulo_norm_para_categoria.items():
+            palavras_chave_por_categoria.setdefault(categoria, []).append(titulo_norm)
+        automato_palavras_chave = obter_automato_palavras_chave(palavras_chave_por_categoria)
+        categorias_unicas.loc[candidatos_palavra_chave] = [
+            buscar_categoria_por_palavra_chave(automato_palavras_chave, titulo)
+            for titulo in titulos_unicos[candidatos_palavra_chave]
+        ]
+
+    novas_categorias = pd.Series(categorias_unicas.to_numpy()[codigos], index=serie_titulos.index, dtype=object)
+    por_palavra_chave = sem_correspondencia_exata.to_numpy()[codigos]
+    elegiveis = (
+        novas_categorias.notna()
+        & ~categorias_atuais.isin(categorias_protegidas)
+        & (novas_categorias != categorias_atuais)
+        & (~por_palavra_chave | linhas_sem_categoria)
+    )
+    return novas_categorias[elegiveis]
+
+def _processar_texto_fuzzy(texto):
+    from fuzzywuzzy import utils as fuzzy_utils
+    # Mesmo processamento que extractOne + WRatio aplicam à consulta e a cada escolha.
+    return fuzzy_utils.full_process(fuzzy_utils.full_process(texto), force_ascii=True)
+
+def _codigos_alfabeto_fuzzy(texto):
+    # full_process(force_ascii=True) só remove os pontos de código 128-255; os demais caem no balde "outros".
+    return np.minimum(np.fromiter(map(ord, texto), dtype=np.int64, count=len(texto)), 127)
+
+def construir_indice_fuzzy_estabelecimentos(lista_estab_norm_lookup):
+    processados = [_processar_texto_fuzzy(nome) for nome in lista_estab_norm_lookup]
+    comprimentos = np.fromiter((len(p) for p in processados), dtype=np.int32, count=len(processados))
+    ordem = np.argsort(comprimentos, kind='stable')
+    comprimentos_ordenados = comprimentos[ordem]
+    tabela_alfabeto = np.full(128, len(ALFABETO_FUZZY), dtype=np.uint8)
+    for posicao_alfabeto, caractere in enumerate(ALFABETO_FUZZY):
+        tabela_alfabeto[ord(caractere)] = posicao_alfabeto
+    histogramas = np.zeros((len(processados), len(ALFABETO_FUZZY) + 1), dtype=np.uint8)
+    for inicio in range(0, len(processados), TAMANHO_BLOCO_INDICE_FUZZY):
+        posicoes_bloco = ordem[inicio:inicio + TAMANHO_BLOCO_INDICE_FUZZY]
+        codigos_bloco = _codigos_alfabeto_fuzzy("".join(processados[p] for p in posicoes_bloco))
+        linhas_bloco = np.repeat(np.arange(len(posicoes_bloco)), comprimentos[posicoes_bloco])
+        contagens = np.bincount(
+            linhas_bloco * histogramas.shape[1] + tabela_alfabeto[codigos_bloco],
+            minlength=len(posicoes_bloco) * histogramas.shape[1]
+        ).reshape(len(posicoes_bloco), histogramas.shape[1])
+        histogramas[inicio:inicio + len(posicoes_bloco)] = np.minimum(contagens, 255)
+    postagens_tokens = {}
+    quantidade_tokens = np.zeros(len(processados), dtype=np.int32)
+    for posicao_ordenada, posicao in enumerate(ordem):
+        tokens = set(processados[posicao].split())
+        quantidade_tokens[posicao_ordenada] = len(tokens)
+        for token in tokens:
+            postagens_tokens.setdefault(token, []).append(posicao_ordenada)
+    return {
+        'escolhas': list(lista_estab_norm_lookup),
+        'processados': processados,
+        'ordem': ordem,
+        'comprimentos': comprimentos_ordenados,
+        'histogramas': histogramas,
+        'tabela_alfabeto': tabela_alfabeto,
+        'quantidade_tokens': quantidade_tokens,
+        'postagens_tokens': {token: np.array(posicoes, dtype=np.int32) for token, posicoes in postagens_tokens.items()},
+    }
+
+def _candidatos_indice_fuzzy(indice_fuzzy_estabelecimentos, consulta_processada):
+    # WRatio só chega a 95 com comprimentos a menos de 1.5x um do outro e com ratio >= 94.5
+    # ou um conjunto de tokens contido no outro; o restante pode ser descartado sem pontuar.
+    comprimento_consulta = len(consulta_processada)
+    comprimentos = indice_fuzzy_estabelecimentos['comprimentos']
+    inicio = int(np.searchsorted(comprimentos, int(comprimento_consulta / 1.5), side='left'))
+    fim = int(np.searchsorted(comprimentos, int(comprimento_consulta * 1.5) + 1, side='right'))
+    if inicio >= fim:
+        return np.empty(0, dtype=np.int64)
+    histograma_consulta = np.bincount(
+        indice_fuzzy_estabelecimentos['tabela_alfabeto'][_codigos_alfabeto_fuzzy(consulta_processada)],
+        minlength=indice_fuzzy_estabelecimentos['histogramas'].shape[1]
+    ).astype(np.uint8)
+    caracteres_comuns = np.minimum(indice_fuzzy_estabelecimentos['histogramas'][inicio:fim], histograma_consulta).sum(axis=1, dtype=np.int32)
+    limite_ratio = 200.0 * caracteres_comuns / (comprimentos[inicio:fim] + comprimento_consulta)
+    candidatos = [np.flatnonzero(limite_ratio >= 94) + inicio]
+    tokens_consulta = set(consulta_processada.split())
+    postagens = [indice_fuzzy_estabelecimentos['postagens_tokens'].get(token) for token in tokens_consulta]
+    postagens = [p[(p >= inicio) & (p < fim)] for p in postagens if p is not None]
+    if postagens:
+        posicoes_com_token, acertos = np.unique(np.concatenate(postagens), return_counts=True)
+        contidos = (acertos == len(tokens_consulta)) | (acertos == indice_fuzzy_estabelecimentos['quantidade_tokens'][posicoes_com_token])
+        candidatos.append(posicoes_com_token[contidos])
+    return np.unique(indice_fuzzy_estabelecimentos['ordem'][np.concatenate(candidatos)])
+
+def buscar_estabelecimento_fuzzy(indice_fuzzy_estabelecimentos, titulo_fatura_normalizado, threshold):
+    from fuzzywuzzy import fuzz, process
+    if threshold < 95:
+        return process.extractOne(titulo_fatura_normalizado, indice_fuzzy_estabelecimentos['escolhas'], scorer=fuzz.WRatio, score_cutoff=threshold)
+    consulta_processada = _processar_texto_fuzzy(titulo_fatura_normalizado)
+    if not consulta_processada:
+        return None
+    melhor_match_info = None
+    for posicao in _candidatos_indice_fuzzy(indice_fuzzy_estabelecimentos, consulta_processada):
+        pontuacao = fuzz.WRatio(consulta_processada, indice_fuzzy_estabelecimentos['processados'][posicao], full_process=False)
+        if pontuacao >= threshold and (melhor_match_info is None or pontuacao > melhor_match_info[1]):
+            melhor_match_info = (indice_fuzzy_estabelecimentos['escolhas'][posicao], pontuacao)
+    return melhor_match_info
+
+def caminho_indice_estabelecimentos(caminho_arquivo_estabelecimentos):
+    return f"{caminho_arquivo_estabelecimentos}{SUFIXO_INDICE_ESTABELECIMENTOS}"
+
+def _hash_arquivo(caminho_arquivo):
+    hash_arquivo = hashlib.blake2b(digest_size=16)
+    with open(caminho_arquivo, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            hash_arquivo.update(bloco)
+    return hash_arquivo.hexdigest()
+
+def _blocos_estabelecimentos_pyarrow(caminho_arquivo_estabelecimentos, colunas):
+    from pyarrow import csv as pa_csv
+    import pyarrow as pa
+    leitor = pa_csv.open_csv(
+        caminho_arquivo_estabelecimentos,
+        read_options=pa_csv.ReadOptions(block_size=TAMANHO_BLOCO_BYTES_ESTABELECIMENTOS),
+        parse_options=pa_csv.ParseOptions(delimiter=';', invalid_row_handler=lambda linha_invalida: 'skip'),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=colunas,
+            column_types={coluna: pa.string() for coluna in colunas},
+            strings_can_be_null=True
+        )
+    )
+    for lote in leitor:
+        yield lote.to_pandas()
+
+def _blocos_estabelecimentos_pandas(caminho_arquivo_estabelecimentos, colunas):
+    yield from pd.read_csv(
+        caminho_arquivo_estabelecimentos, sep=';', encoding='utf-8-sig', on_bad_lines='warn',
+        usecols=colunas, dtype=str, chunksize=TAMANHO_BLOCO_LINHAS_ESTABELECIMENTOS
+    )
+
+def _mapear_estabelecimentos_em_blocos(blocos_estabelecimentos, col_estab_principal, col_ativ_principal, streamlit_log_area=None):
+    mapa_nome_atividade = {}
+    total_linhas_lidas = 0
+    for bloco in blocos_estabelecimentos:
+        total_linhas_lidas += len(bloco)
+        bloco = bloco.dropna(subset=[col_estab_principal, col_ativ_principal])
+        nomes_normalizados_bloco = normalizar_texto_serie(bloco[col_estab_principal])
+        mascara_primeira_ocorrencia = ~nomes_normalizados_bloco.duplicated()
+        for nome_normalizado, atividade in zip(
+            nomes_normalizados_bloco[mascara_primeira_ocorrencia].tolist(),
+            bloco[col_ativ_principal][mascara_primeira_ocorrencia].tolist()
+        ):
+            mapa_nome_atividade.setdefault(nome_normalizado, atividade)
+        exibir_mensagem_progresso(streamlit_log_area, f"Estabelecimentos: {total_linhas_lidas} linhas lidas, {len(mapa_nome_atividade)} nomes únicos...", tipo='info')
+    return mapa_nome_atividade
+
+def colunas_estabelecimentos_presentes(caminho_arquivo_estabelecimentos, col_estab_principal, col_ativ_principal):
+    colunas_arquivo = pd.read_csv(caminho_arquivo_estabelecimentos, sep=';', encoding='utf-8-sig', nrows=0).columns
+    return col_estab_principal in colunas_arquivo and col_ativ_principal in colunas_arquivo
+
+def construir_indice_estabelecimentos(caminho_arquivo_estabelecimentos,
+                                      col_estab_principal=COLUNA_ESTAB_PRINCIPAL_DEFAULT,
+                                      col_ativ_principal=COLUNA_ATIVIDADE_PRINCIPAL_DEFAULT,
+                                      streamlit_log_area=None):
+    if not colunas_estabelecimentos_presentes(caminho_arquivo_estabelecimentos, col_estab_principal, col_ativ_principal):
+        exibir_mensagem_progresso(streamlit_log_area, f"AVISO: Colunas '{col_estab_principal}' ou '{col_ativ_principal}' não encontradas no arquivo de estabelecimentos. Categorização por CNPJ desativada.", tipo='warning')
+        return None
+    import pyarrow as pa
+    colunas = [col_estab_principal, col_ativ_principal]
+    try:
+        mapa_nome_atividade = _mapear_estabelecimentos_em_blocos(
+            _blocos_estabelecimentos_pyarrow(caminho_arquivo_estabelecimentos, colunas),
+            col_estab_principal, col_ativ_principal, streamlit_log_area
+        )
+    except (pa.ArrowException, UnicodeDecodeError) as e:
+        exibir_mensagem_progresso(streamlit_log_area, f"AVISO: Leitura rápida da base de estabelecimentos falhou ({e}). Usando leitor alternativo.", tipo='warning')
+        mapa_nome_atividade = _mapear_estabelecimentos_em_blocos(
+            _blocos_estabelecimentos_pandas(caminho_arquivo_estabelecimentos, colunas),
+            col_estab_principal, col_ativ_principal, streamlit_log_area
+        )
+    nomes_normalizados = list(mapa_nome_atividade)
+    exibir_mensagem_progresso(streamlit_log_area, f"Construindo índice de busca para {len(nomes_normalizados)} estabelecimentos...", tipo='info')
+    return {
+        'nomes_normalizados': nomes_normalizados,
+        'mapa_nome_atividade': mapa_nome_atividade,
+        'indice_fuzzy': construir_indice_fuzzy_estabelecimentos(nomes_normalizados),
+    }
+
+def carregar_indice_estabelecimentos(caminho_arquivo_estabelecimentos,
+                                     col_estab_principal=COLUNA_ESTAB_PRINCIPAL_DEFAULT,
+                                     col_ativ_principal=COLUNA_ATIVIDADE_PRINCIPAL_DEFAULT,
+                                     streamlit_log_area=None):
+    stat_arquivo = os.stat(caminho_arquivo_estabelecimentos)
+    caminho_indice = caminho_indice_estabelecimentos(caminho_arquivo_estabelecimentos)
+    chave_indice = (VERSAO_INDICE_ESTABELECIMENTOS, col_estab_principal, col_ativ_principal)
+    hash_atual = None
+    if os.path.exists(caminho_indice):
+        import pickle
+        try:
+            with open(caminho_indice, 'rb') as f:
+                artefato = pickle.load(f)
+            if artefato.get('chave') == chave_indice and artefato.get('tamanho') == stat_arquivo.st_size:
+                if artefato.get('mtime_ns') == stat_arquivo.st_mtime_ns:
+                    return artefato['indice']
+                hash_atual = _hash_arquivo(caminho_arquivo_estabelecimentos)
+                if artefato.get('hash') == hash_atual:
+                    artefato['mtime_ns'] = stat_arquivo.st_mtime_ns
+                    _gravar_artefato_indice(caminho_indice, artefato)
+                    return artefato['indice']
+        except Exception as e:
+            exibir_mensagem_progresso(streamlit_log_area, f"AVISO: Índice de estabelecimentos em cache inválido ({e}). Reconstruindo.", tipo='warning')
+    exibir_mensagem_progresso(streamlit_log_area, "Construindo índice de estabelecimentos (apenas na primeira vez para este arquivo)...", tipo='info')
+    indice = construir_indice_estabelecimentos(caminho_arquivo_estabelecimentos, col_estab_principal, col_ativ_principal, streamlit_log_area)
+    if indice is not None:
+        artefato = {
+            'chave': chave_indice,
+            'tamanho': stat_arquivo.st_size,
+            'mtime_ns': stat_arquivo.st_mtime_ns,
+            'hash': hash_atual or _hash_arquivo(caminho_arquivo_estabelecimentos),
+            'indice': indice,
+        }
+        try:
+            _gravar_artefato_indice(caminho_indice, artefato)
+        except Exception as e:
+            exibir_mensagem_progresso(streamlit_log_area, f"AVISO: Não foi possível salvar o índice de estabelecimentos em {caminho_indice}: {e}", tipo='warning')
+    return indice
+
+def _gravar_artefato_indice(caminho_indice, artefato):
+    import pickle
+    caminho_temporario = f"{caminho_indice}.tmp{os.getpid()}"
+    with open(caminho_temporario, 'wb') as f:
+        pickle.dump(artefato, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(caminho_temporario, caminho_indice)
+
+def _categorizar_titulos_unicos(serie_titulos_normalizados,
+                               categorias_base_palavras_chave_norm_para_keywords,
+                               categorias_orig_norm_para_orig_map,
+                               usar_fuzzy_estabelecimentos,
+                               lista_estab_norm_lookup,
+                               mapa_estab_atividade,
+                               threshold,
+                               automato_palavras_chave=None,
+                               indice_fuzzy_estabelecimentos=None,
+                               metricas_desempenho=None):
+    if automato_palavras_chave is None:
+        automato_palavras_chave = obter_automato_palavras_chave(categorias_base_palavras_chave_norm_para_keywords)
+    with medir_etapa(metricas_desempenho, 'correspondencia_nome_categoria', len(serie_titulos_normalizados)):
+        categorias = serie_titulos_normalizados.map(categorias_orig_norm_para_orig_map).astype(object)
+        pendentes = categorias.isna()
+    if pendentes.any():
+        with medir_etapa(metricas_desempenho, 'palavras_chave', int(pendentes.sum())):
+            categorias.loc[pendentes] = serie_titulos_normalizados.loc[pendentes].map(
+                lambda titulo: buscar_categoria_por_palavra_chave(automato_palavras_chave, titulo)
+            )
+        contar_evento(metricas_desempenho, 'correspondencias_palavra_chave', categorias.loc[pendentes].notna().sum())
+        pendentes = categorias.isna()
+    if pendentes.any():
+        if usar_fuzzy_estabelecimentos and lista_estab_norm_lookup:
+            contar_evento(metricas_desempenho, 'chamadas_fuzzy', pendentes.sum())
+            with medir_etapa(metricas_desempenho, 'fuzzy_estabelecimentos', int(pendentes.sum())):
+                categorias.loc[pendentes] = serie_titulos_normalizados.loc[pendentes].map(
+                    lambda titulo: _categorizar_por_estabelecimento_fuzzy(titulo, lista_estab_norm_lookup, mapa_estab_atividade, threshold, indice_fuzzy_estabelecimentos)
+                )
         else:
-            return 'Sem Categoria (Fuzzy - Baixa Similaridade)'
-    return 'Sem Categoria/Pix Credito'
+            categorias.loc[pendentes] = 'Sem Categoria/Pix Credito'
+    return categorias
+
+def _ler_csv_fatura(uploaded_file_obj):
+    try:
+        return pd.read_csv(uploaded_file_obj, engine='pyarrow').fillna(np.nan)
+    except Exception:
+        if hasattr(uploaded_file_obj, 'seek'):
+            uploaded_file_obj.seek(0)
+        return pd.read_csv(uploaded_file_obj, on_bad_lines='warn')
+
+def ler_arquivo_fatura(uploaded_file_obj, nome_arquivo, metricas_desempenho=None):
+    mensagens = []
+    try:
+        with medir_etapa(metricas_desempenho, 'leitura_csv') as registro_etapa:
+            df_fatura_atual = _ler_csv_fatura(uploaded_file_obj)
+            registro_etapa['linhas'] = len(df_fatura_atual)
+        colunas_obrigatorias = [COLUNA_DATA, COLUNA_TITULO, COLUNA_VALOR]
+        if not all(col in df_fatura_atual.columns for col in colunas_obrigatorias):
+            mensagens.append((f"AVISO: Arquivo {nome_arquivo} não contém colunas esperadas ({', '.join(colunas_obrigatorias)}). Pulando.", 'warning'))
+            return None, mensagens
+        df_fatura_atual[COLUNA_TITULO] = df_fatura_atual[COLUNA_TITULO].astype(str)
+        df_fatura_atual[COLUNA_VALOR] = pd.to_numeric(df_fatura_atual[COLUNA_VALOR], errors='coerce')
+        df_fatura_atual[COLUNA_DATA] = pd.to_datetime(df_fatura_atual[COLUNA_DATA], errors='coerce')
+        df_fatura_atual.dropna(subset=colunas_obrigatorias + [COLUNA_VALOR], inplace=True)
+        if df_fatura_atual.empty:
+            mensagens.append((f"AVISO: Arquivo {nome_arquivo} sem transações válidas após limpeza inicial. Pulando.", 'warning'))
+            return None, mensagens
+        with medir_etapa(metricas_desempenho, 'normalizacao', len(df_fatura_atual)):
+            df_fatura_atual[COLUNA_TITULO_NORMALIZADO] = normalizar_texto_serie(df_fatura_atual[COLUNA_TITULO])
+            df_fatura_atual[[COLUNA_PARCELA_ATUAL, COLUNA_TOTAL_PARCELAS]] = extrair_info_parcela_serie(df_fatura_atual[COLUNA_TITULO])
+        df_fatura_atual[COLUNA_FATURA_ORIGEM] = nome_arquivo
+        if 'category' in df_fatura_atual.columns:
+            df_fatura_atual.rename(columns={'category': COLUNA_CATEGORIA}, inplace=True)
+        if 'id' in df_fatura_atual.columns:
+            df_fatura_atual.rename(columns={'id': COLUNA_ID}, inplace=True)
+        return df_fatura_atual, mensagens
+    except Exception as e:
+        mensagens.append((f"ERRO CRÍTICO ao ler/processar {nome_arquivo}: {e}", 'error'))
+        return None, mensagens
+
+def _menor_tipo_inteiro(valores):
+    valores_validos = valores.dropna()
+    if valores_validos.empty:
+        return 'Int8'
+    minimo, maximo = valores_validos.min(), valores_validos.max()
+    for tipo_inteiro in ('Int8', 'Int16', 'Int32'):
+        limites = np.iinfo(tipo_inteiro.lower())
+        if limites.min <= minimo and maximo <= limites.max:
+            return tipo_inteiro
+    return 'Int64'
+
+def aplicar_schema_faturas(df_faturas):
+    if df_faturas.empty:
+        return df_faturas
+    conversoes = {}
+    for coluna in (COLUNA_CATEGORIA, COLUNA_FATURA_ORIGEM, COLUNA_CATEGORIA_NUBANK_ORIGINAL):
+        if coluna in df_faturas.columns and not isinstance(df_faturas[coluna].dtype, pd.CategoricalDtype):
+            conversoes[coluna] = 'category'
+    for coluna in (COLUNA_TITULO, COLUNA_ID):
+        if coluna in df_faturas.columns and df_faturas[coluna].dtype != 'string[pyarrow]':
+            conversoes[coluna] = 'string[pyarrow]'
+    for coluna in (COLUNA_PARCELA_ATUAL, COLUNA_TOTAL_PARCELAS):
+        if coluna in df_faturas.columns:
+            valores = pd.to_numeric(df_faturas[coluna], errors='coerce')
+            conversoes[coluna] = _menor_tipo_inteiro(valores)
+            df_faturas = df_faturas.assign(**{coluna: valores})
+    if COLUNA_VALOR in df_faturas.columns:
+        conversoes[COLUNA_VALOR] = 'float64'
+    return df_faturas.astype(conversoes)
+
+def anexar_faturas_tipadas(df_existente, df_novas_faturas):
+    df_novas_faturas = aplicar_schema_faturas(df_novas_faturas)
+    if df_existente.empty:
+        return df_novas_faturas
+    if df_novas_faturas.empty:
+        return df_existente
+    for coluna in (COLUNA_CATEGORIA, COLUNA_FATURA_ORIGEM, COLUNA_CATEGORIA_NUBANK_ORIGINAL):
+        if coluna not in df_existente.columns or coluna not in df_novas_faturas.columns:
+            continue
+        if not isinstance(df_existente[coluna].dtype, pd.CategoricalDtype):
+            continue
+        # Alinha as categorias antes do concat para a coluna continuar categórica sem re-tipar as linhas existentes.
+        categorias_faltantes = df_novas_faturas[coluna].cat.categories.difference(df_existente[coluna].cat.categories, sort=False)
+        if len(categorias_faltantes):
+            df_existente[coluna] = df_existente[coluna].cat.add_categories(categorias_faltantes)
+        df_novas_faturas[coluna] = df_novas_faturas[coluna].cat.set_categories(df_existente[coluna].cat.categories)
+    return pd.concat([df_existente, df_novas_faturas])
+
+def chave_configuracao_categorizacao(usar_categorizacao_especifica, caminho_arquivo_estabelecimentos, col_estab_principal, col_ativ_principal):
+    if not usar_categorizacao_especifica:
+        return (False, SIMILARITY_THRESHOLD)
+    mtime_estabelecimentos = os.path.getmtime(caminho_arquivo_estabelecimentos) if caminho_arquivo_estabelecimentos and os.path.exists(caminho_arquivo_estabelecimentos) else None
+    return (True, caminho_arquivo_estabelecimentos, mtime_estabelecimentos, col_estab_principal, col_ativ_principal, SIMILARITY_THRESHOLD)
+
+def normalizar_categorias_base(categorias_base_atuais):
+    categorias_base_palavras_chave_norm_para_keywords = {
+        cat_orig: [normalizar_texto(kw) for kw in kws_orig if kw and isinstance(kw, str)] 
+        for cat_orig, kws_orig in categorias_base_atuais.items() if isinstance(kws_orig, list) 
+    }
+    categorias_orig_norm_para_orig_map = {
+        normalizar_texto(cat_orig): cat_orig
+        for cat_orig in categorias_base_atuais.keys()
+    }
+    return categorias_base_palavras_chave_norm_para_keywords, categorias_orig_norm_para_orig_map
+
+def hash_conteudo_fatura(uploaded_file_obj):
+    if hasattr(uploaded_file_obj, 'getvalue'):
+        return hashlib.blake2b(uploaded_file_obj.getvalue(), digest_size=16).hexdigest()
+    if isinstance(uploaded_file_obj, (str, os.PathLike)):
+        return _hash_arquivo(uploaded_file_obj)
+    hash_conteudo = hashlib.blake2b(digest_size=16)
+    for bloco in iter(lambda: uploaded_file_obj.read(1 << 20), b''):
+        hash_conteudo.update(bloco)
+    uploaded_file_obj.seek(0)
+    return hash_conteudo.hexdigest()
+
+def criar_cache_faturas_lidas(tamanho_maximo=TAMANHO_MAXIMO_CACHE_FATURAS_LIDAS):
+    return {
+        'tamanho_maximo': tamanho_maximo,
+        'faturas': OrderedDict(),
+    }
+
+def _nome_arquivo_fatura(uploaded_file_obj, i):
+    if hasattr(uploaded_file_obj, 'name'):
+        return uploaded_file_obj.name
+    if isinstance(uploaded_file_obj, (str, os.PathLike)):
+        return os.path.basename(uploaded_file_obj)
+    return f"Arquivo_{i+1}"
+
+def ler_faturas(lista_arquivos_faturas, streamlit_log_area=None, cache_faturas_lidas=None, metricas_desempenho=None):
+    nomes_arquivos = [_nome_arquivo_fatura(uploaded_file_obj, i) for i, uploaded_file_obj in enumerate(lista_arquivos_faturas)]
+    resultados_leitura = [None] * len(lista_arquivos_faturas)
+    chaves_cache = [None] * len(lista_arquivos_faturas)
+    if cache_faturas_lidas is not None:
+        faturas_cache = cache_faturas_lidas['faturas']
+        for i, (uploaded_file_obj, nome_arquivo) in enumerate(zip(lista_arquivos_faturas, nomes_arquivos)):
+            chaves_cache[i] = (hash_conteudo_fatura(uploaded_file_obj), nome_arquivo)
+            if chaves_cache[i] in faturas_cache:
+                faturas_cache.move_to_end(chaves_cache[i])
+                resultados_leitura[i] = faturas_cache[chaves_cache[i]]
+        quantidade_reaproveitados = sum(resultado is not None for resultado in resultados_leitura)
+        contar_evento(metricas_desempenho, 'arquivos_reaproveitados_cache', quantidade_reaproveitados)
+        if quantidade_reaproveitados:
+            exibir_mensagem_progresso(streamlit_log_area, f"{quantidade_reaproveitados} arquivo(s) sem alterações reaproveitado(s) do cache.", tipo='info')
+    indices_para_ler = [i for i, resultado in enumerate(resultados_leitura) if resultado is None]
+    if indices_para_ler:
+        contar_evento(metricas_desempenho, 'arquivos_lidos', len(indices_para_ler))
+        exibir_mensagem_progresso(streamlit_log_area, f"Lendo {len(indices_para_ler)} arquivo(s) de fatura...", tipo='info')
+        with ThreadPoolExecutor(max_workers=min(MAX_THREADS_LEITURA_FATURAS, len(indices_para_ler))) as executor:
+            futuros = {
+                executor.submit(ler_arquivo_fatura, lista_arquivos_faturas[i], nomes_arquivos[i], metricas_desempenho): i
+                for i in indices_para_ler
+            }
+            for quantidade_lidos, futuro in enumerate(as_completed(futuros), start=1):
+                i = futuros[futuro]
+                resultados_leitura[i] = futuro.result()
+                exibir_mensagem_progresso(streamlit_log_area, f"Lido arquivo {quantidade_lidos}/{len(indices_para_ler)}: {nomes_arquivos[i]}", tipo='info')
+                for mensagem, tipo in resultados_leitura[i][1]:
+                    exibir_mensagem_progresso(streamlit_log_area, mensagem, tipo=tipo)
+                if cache_faturas_lidas is not None and resultados_leitura[i][0] is not None:
+                    cache_faturas_lidas['faturas'][chaves_cache[i]] = resultados_leitura[i]
+        if cache_faturas_lidas is not None:
+            while len(cache_faturas_lidas['faturas']) > cache_faturas_lidas['tamanho_maximo']:
+                cache_faturas_lidas['faturas'].popitem(last=False)
+    df_todas_faturas_list = [df_fatura_atual for df_fatura_atual, _ in resultados_leitura if df_fatura_atual is not None]
+    if not df_todas_faturas_list:
+        return pd.DataFrame()
+    with medir_etapa(metricas_desempenho, 'consolidacao'):
+        return pd.concat(df_todas_faturas_list, ignore_index=True)
 
 def processar_faturas(lista_arquivos_faturas,
                       usar_categorizacao_especifica,
                       caminho_arquivo_estabelecimentos,
                       streamlit_log_area=None,
                       col_estab_principal=COLUNA_ESTAB_PRINCIPAL_DEFAULT,
-                      col_ativ_principal=COLUNA_ATIVIDADE_PRINCIPAL_DEFAULT):
+                      col_ativ_principal=COLUNA_ATIVIDADE_PRINCIPAL_DEFAULT,
+                      cache_categorizacao=None,
+                      indice_estabelecimentos=None,
+                      cache_faturas_lidas=None,
+                      metricas_desempenho=None):
     exibir_mensagem_progresso(streamlit_log_area, "Iniciando processamento das faturas...", tipo='info')
-    categorias_base_atuais = carregar_categorias_base_do_json()
-    if not categorias_base_atuais:
-        exibir_mensagem_progresso(streamlit_log_area, "AVISO: Arquivo de categorias base (Categorias.json) não encontrado ou inválido. A categorização por palavras-chave não funcionará.", tipo='warning')
-    df_todas_faturas_list = []
-    total_transacoes_lidas_validas = 0
-    for i, uploaded_file_obj in enumerate(lista_arquivos_faturas):
-        nome_arquivo = uploaded_file_obj.name if hasattr(uploaded_file_obj, 'name') else f"Arquivo_{i+1}"
-        exibir_mensagem_progresso(streamlit_log_area, f"Lendo arquivo {i+1}/{len(lista_arquivos_faturas)}: {nome_arquivo}", tipo='info')
-        try:
-            df_fatura_atual = pd.read_csv(uploaded_file_obj, on_bad_lines='warn')
-            colunas_obrigatorias = [COLUNA_DATA, COLUNA_TITULO, COLUNA_VALOR]
-            if not all(col in df_fatura_atual.columns for col in colunas_obrigatorias):
-                exibir_mensagem_progresso(streamlit_log_area, f"AVISO: Arquivo {nome_arquivo} não contém colunas esperadas ({', '.join(colunas_obrigatorias)}). Pulando.", tipo='warning')
-                continue
-            df_fatura_atual[COLUNA_TITULO] = df_fatura_atual[COLUNA_TITULO].astype(str)
-            df_fatura_atual[COLUNA_VALOR] = pd.to_numeric(df_fatura_atual[COLUNA_VALOR], errors='coerce')
-            df_fatura_atual[COLUNA_DATA] = pd.to_datetime(df_fatura_atual[COLUNA_DATA], errors='coerce')
-            df_fatura_atual.dropna(subset=colunas_obrigatorias + [COLUNA_VALOR], inplace=True)
-            if df_fatura_atual.empty:
-                exibir_mensagem_progresso(streamlit_log_area, f"AVISO: Arquivo {nome_arquivo} sem transações válidas após limpeza inicial. Pulando.", tipo='warning')
-                continue
-            total_transacoes_lidas_validas += len(df_fatura_atual)
-            df_fatura_atual[COLUNA_TITULO_NORMALIZADO] = df_fatura_atual[COLUNA_TITULO].apply(normalizar_texto)
-            parcel_info = df_fatura_atual[COLUNA_TITULO].apply(extrair_info_parcela)
-            df_fatura_atual[COLUNA_PARCELA_ATUAL] = parcel_info.apply(lambda x: x[0])
-            df_fatura_atual[COLUNA_TOTAL_PARCELAS] = parcel_info.apply(lambda x: x[1])
-            df_fatura_atual[COLUNA_FATURA_ORIGEM] = nome_arquivo
-            if 'category' in df_fatura_atual.columns:
-                df_fatura_atual.rename(columns={'category': COLUNA_CATEGORIA}, inplace=True)
-            if 'id' in df_fatura_atual.columns:
-                df_fatura_atual.rename(columns={'id': COLUNA_ID}, inplace=True)
-            df_todas_faturas_list.append(df_fatura_atual)
-        except Exception as e:
-            exibir_mensagem_progresso(streamlit_log_area, f"ERRO CRÍTICO ao ler/processar {nome_arquivo}: {e}", tipo='error')
-    if not df_todas_faturas_list:
+    df_faturas_consolidadas = ler_faturas(lista_arquivos_faturas, streamlit_log_area, cache_faturas_lidas, metricas_desempenho)
+    if df_faturas_consolidadas.empty:
         exibir_mensagem_progresso(streamlit_log_area, "Nenhuma fatura processada com sucesso ou nenhuma transação válida encontrada.", tipo='error')
         return pd.DataFrame()
-    df_faturas_consolidadas = pd.concat(df_todas_faturas_list, ignore_index=True)
-    exibir_mensagem_progresso(streamlit_log_area, f"{total_transacoes_lidas_validas} transações consolidadas. Preparando categorização...", tipo='info')
+    exibir_mensagem_progresso(streamlit_log_area, f"{len(df_faturas_consolidadas)} transações consolidadas. Preparando categorização...", tipo='info')
+    return categorizar_faturas(
+        df_faturas_consolidadas,
+        usar_categorizacao_especifica,
+        caminho_arquivo_estabelecimentos,
+        streamlit_log_area,
+        col_estab_principal,
+        col_ativ_principal,
+        cache_categorizacao,
+        indice_estabelecimentos,
+        metricas_desempenho
+    )
+
+def categorizar_faturas(df_faturas_consolidadas,
+                        usar_categorizacao_especifica,
+                        caminho_arquivo_estabelecimentos,
+                        streamlit_log_area=None,
+                        col_estab_principal=COLUNA_ESTAB_PRINCIPAL_DEFAULT,
+                        col_ativ_principal=COLUNA_ATIVIDADE_PRINCIPAL_DEFAULT,
+                        cache_categorizacao=None,
+                        indice_estabelecimentos=None,
+                        metricas_desempenho=None):
+    with medir_etapa(metricas_desempenho, 'carregamento_categorias'):
+        categorias_base_atuais = carregar_categorias_base_do_json()
+    if not categorias_base_atuais:
+        exibir_mensagem_progresso(streamlit_log_area, "AVISO: Arquivo de categorias base (Categorias.json) não encontrado ou inválido. A categorização por palavras-chave não funcionará.", tipo='warning')
     lista_nomes_estab_normalizados_lookup = []
     map_nome_norm_para_atividade_lookup = {}
-    if usar_categorizacao_especifica and caminho_arquivo_estabelecimentos:
-        exibir_mensagem_progresso(streamlit_log_area, f"Carregando dados de estabelecimentos de: {caminho_arquivo_estabelecimentos}", tipo='info')
+    indice_fuzzy_estabelecimentos = None
+    if usar_categorizacao_especifica and (indice_estabelecimentos is not None or caminho_arquivo_estabelecimentos):
         try:
-            df_principal_completo = pd.read_csv(caminho_arquivo_estabelecimentos, sep=';', encoding='utf-8-sig', on_bad_lines='warn', low_memory=False)
-            if col_estab_principal in df_principal_completo.columns and col_ativ_principal in df_principal_completo.columns:
-                df_principal_estab = df_principal_completo[[col_estab_principal, col_ativ_principal]].astype(str).copy()
-                df_principal_estab.dropna(subset=[col_estab_principal, col_ativ_principal], inplace=True)
-                df_principal_estab['nome_estab_normalized_principal'] = df_principal_estab[col_estab_principal].apply(normalizar_texto)
-                df_principal_estab.drop_duplicates(subset=['nome_estab_normalized_principal'], keep='first', inplace=True)
-                lista_nomes_estab_normalizados_lookup = df_principal_estab['nome_estab_normalized_principal'].unique().tolist()
-                map_nome_norm_para_atividade_lookup = pd.Series(df_principal_estab[col_ativ_principal].values, index=df_principal_estab['nome_estab_normalized_principal']).to_dict()
+            if indice_estabelecimentos is None:
+                exibir_mensagem_progresso(streamlit_log_area, f"Carregando dados de estabelecimentos de: {caminho_arquivo_estabelecimentos}", tipo='info')
+                with medir_etapa(metricas_desempenho, 'indice_estabelecimentos'):
+                    indice_estabelecimentos = carregar_indice_estabelecimentos(caminho_arquivo_estabelecimentos, col_estab_principal, col_ativ_principal, streamlit_log_area)
+            if indice_estabelecimentos is not None:
+                lista_nomes_estab_normalizados_lookup = indice_estabelecimentos['nomes_normalizados']
+                map_nome_norm_para_atividade_lookup = indice_estabelecimentos['mapa_nome_atividade']
+                indice_fuzzy_estabelecimentos = indice_estabelecimentos['indice_fuzzy']
                 exibir_mensagem_progresso(streamlit_log_area, f"{len(lista_nomes_estab_normalizados_lookup)} estabelecimentos únicos carregados para lookup.", tipo='info')
             else:
-                exibir_mensagem_progresso(streamlit_log_area, f"AVISO: Colunas '{col_estab_principal}' ou '{col_ativ_principal}' não encontradas no arquivo de estabelecimentos. Categorização por CNPJ desativada.", tipo='warning')
                 usar_categorizacao_especifica = False
         except FileNotFoundError:
             exibir_mensagem_progresso(streamlit_log_area, f"ERRO: Arquivo de estabelecimentos '{caminho_arquivo_estabelecimentos}' não encontrado. Categorização por CNPJ desativada.", tipo='error')
@@ -182,33 +1035,197 @@ def processar_faturas(lista_arquivos_faturas,
         except Exception as e:
             exibir_mensagem_progresso(streamlit_log_area, f"ERRO ao processar arquivo de estabelecimentos: {e}. Categorização por CNPJ desativada.", tipo='error')
             usar_categorizacao_especifica = False
-    categorias_base_palavras_chave_norm_para_keywords = {
-        cat_orig: [normalizar_texto(kw) for kw in kws_orig if kw and isinstance(kw, str)] 
-        for cat_orig, kws_orig in categorias_base_atuais.items() if isinstance(kws_orig, list) 
-    }
-    categorias_orig_norm_para_orig_map = {
-        normalizar_texto(cat_orig): cat_orig
-        for cat_orig in categorias_base_atuais.keys()
-    }
+    with medir_etapa(metricas_desempenho, 'automato_palavras_chave'):
+        categorias_base_palavras_chave_norm_para_keywords, categorias_orig_norm_para_orig_map = normalizar_categorias_base(categorias_base_atuais)
+        automato_palavras_chave = obter_automato_palavras_chave(categorias_base_palavras_chave_norm_para_keywords)
+    if cache_categorizacao is not None:
+        sincronizar_cache_categorizacao(
+            cache_categorizacao,
+            categorias_base_palavras_chave_norm_para_keywords,
+            categorias_orig_norm_para_orig_map,
+            chave_configuracao_categorizacao(usar_categorizacao_especifica, caminho_arquivo_estabelecimentos, col_estab_principal, col_ativ_principal)
+        )
     exibir_mensagem_progresso(streamlit_log_area, "Categorizando transações...", tipo='info')
     if not df_faturas_consolidadas.empty:
-        df_faturas_consolidadas[COLUNA_CATEGORIA] = df_faturas_consolidadas.apply(
-            lambda row: _categorizar_transacao_core(
-                row[COLUNA_TITULO_NORMALIZADO],
+        with medir_etapa(metricas_desempenho, 'categorizacao', len(df_faturas_consolidadas)):
+            df_faturas_consolidadas[COLUNA_CATEGORIA] = categorizar_titulos_em_lote(
+                df_faturas_consolidadas[COLUNA_TITULO_NORMALIZADO],
                 categorias_base_palavras_chave_norm_para_keywords,
                 categorias_orig_norm_para_orig_map,
                 usar_categorizacao_especifica,
                 lista_nomes_estab_normalizados_lookup,
                 map_nome_norm_para_atividade_lookup,
-                SIMILARITY_THRESHOLD
-            ),
-            axis=1
-        )
+                SIMILARITY_THRESHOLD,
+                automato_palavras_chave,
+                cache_categorizacao,
+                indice_fuzzy_estabelecimentos,
+                metricas_desempenho
+            )
     else:
         exibir_mensagem_progresso(streamlit_log_area, "Nenhuma transação para categorizar.", tipo='info')
     if COLUNA_TITULO_NORMALIZADO in df_faturas_consolidadas.columns:
         df_faturas_consolidadas.drop(columns=[COLUNA_TITULO_NORMALIZADO], inplace=True)
+    with medir_etapa(metricas_desempenho, 'schema', len(df_faturas_consolidadas)):
+        df_faturas_consolidadas = aplicar_schema_faturas(df_faturas_consolidadas)
     exibir_mensagem_progresso(streamlit_log_area, "Processamento concluído!", tipo='success')
     return df_faturas_consolidadas
 
-categorias_base_palavras_chave = carregar_categorias_base_do_json()
+_CONTEXTO_PROCESSO_CATEGORIZACAO = {}
+
+def _inicializar_processo_categorizacao(configuracao_categorizacao, indice_estabelecimentos_herdado=None):
+    _CONTEXTO_PROCESSO_CATEGORIZACAO.clear()
+    _CONTEXTO_PROCESSO_CATEGORIZACAO['configuracao'] = configuracao_categorizacao
+    _CONTEXTO_PROCESSO_CATEGORIZACAO['indice_estabelecimentos_herdado'] = indice_estabelecimentos_herdado
+
+def _contexto_processo_categorizacao():
+    if 'automato_palavras_chave' not in _CONTEXTO_PROCESSO_CATEGORIZACAO:
+        usar_categorizacao_especifica, caminho_categorias, caminho_arquivo_estabelecimentos, col_estab_principal, col_ativ_principal = _CONTEXTO_PROCESSO_CATEGORIZACAO['configuracao']
+        palavras_chave_norm, mapa_categorias_norm = normalizar_categorias_base(carregar_categorias_base_do_json(caminho_categorias))
+        indice_estabelecimentos = _CONTEXTO_PROCESSO_CATEGORIZACAO['indice_estabelecimentos_herdado']
+        if usar_categorizacao_especifica and indice_estabelecimentos is None:
+            with redirect_stdout(sys.stderr):
+                indice_estabelecimentos = carregar_indice_estabelecimentos(caminho_arquivo_estabelecimentos, col_estab_principal, col_ativ_principal)
+        _CONTEXTO_PROCESSO_CATEGORIZACAO.update({
+            'palavras_chave_norm': palavras_chave_norm,
+            'mapa_categorias_norm': mapa_categorias_norm,
+            'automato_palavras_chave': obter_automato_palavras_chave(palavras_chave_norm),
+            'indice_estabelecimentos': indice_estabelecimentos,
+        })
+    return _CONTEXTO_PROCESSO_CATEGORIZACAO
+
+def _ler_fatura_linha_de_comando(caminho_fatura):
+    return ler_arquivo_fatura(caminho_fatura, os.path.basename(caminho_fatura))
+
+def _categorizar_bloco_titulos(titulos_normalizados):
+    contexto = _contexto_processo_categorizacao()
+    indice_estabelecimentos = contexto['indice_estabelecimentos']
+    return _categorizar_titulos_unicos(
+        pd.Series(titulos_normalizados, dtype=object),
+        contexto['palavras_chave_norm'],
+        contexto['mapa_categorias_norm'],
+        indice_estabelecimentos is not None,
+        indice_estabelecimentos['nomes_normalizados'] if indice_estabelecimentos is not None else [],
+        indice_estabelecimentos['mapa_nome_atividade'] if indice_estabelecimentos is not None else {},
+        SIMILARITY_THRESHOLD,
+        contexto['automato_palavras_chave'],
+        indice_estabelecimentos['indice_fuzzy'] if indice_estabelecimentos is not None else None
+    ).tolist()
+
+def categorizar_arquivos_em_lote(caminhos_faturas,
+                                 usar_categorizacao_especifica,
+                                 caminho_arquivo_estabelecimentos=None,
+                                 caminho_categorias=CAMINHO_CATEGORIAS_BASE_JSON,
+                                 col_estab_principal=COLUNA_ESTAB_PRINCIPAL_DEFAULT,
+                                 col_ativ_principal=COLUNA_ATIVIDADE_PRINCIPAL_DEFAULT,
+                                 quantidade_processos=None,
+                                 metricas_desempenho=None):
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    quantidade_processos = max(1, quantidade_processos or os.cpu_count() or 1)
+    contexto_processos = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    indice_estabelecimentos = None
+    if usar_categorizacao_especifica:
+        with medir_etapa(metricas_desempenho, 'indice_estabelecimentos'):
+            if contexto_processos is not None:
+                indice_estabelecimentos = carregar_indice_estabelecimentos(caminho_arquivo_estabelecimentos, col_estab_principal, col_ativ_principal)
+                base_estabelecimentos_valida = indice_estabelecimentos is not None
+            else:
+                base_estabelecimentos_valida = colunas_estabelecimentos_presentes(caminho_arquivo_estabelecimentos, col_estab_principal, col_ativ_principal)
+        if not base_estabelecimentos_valida:
+            exibir_mensagem_progresso(None, "ERRO ao carregar a base de estabelecimentos. Categorização por CNPJ desativada.", tipo='error')
+            usar_categorizacao_especifica = False
+    configuracao_categorizacao = (usar_categorizacao_especifica, caminho_categorias, caminho_arquivo_estabelecimentos, col_estab_principal, col_ativ_principal)
+    with ProcessPoolExecutor(max_workers=quantidade_processos, mp_context=contexto_processos, initializer=_inicializar_processo_categorizacao,
+                             initargs=(configuracao_categorizacao, indice_estabelecimentos)) as executor:
+        with medir_etapa(metricas_desempenho, 'leitura') as registro_etapa:
+            df_faturas_list = []
+            for caminho_fatura, (df_fatura_atual, mensagens) in zip(caminhos_faturas, executor.map(_ler_fatura_linha_de_comando, caminhos_faturas)):
+                for mensagem, tipo in mensagens:
+                    exibir_mensagem_progresso(None, mensagem, tipo=tipo)
+                if df_fatura_atual is not None:
+                    df_faturas_list.append(df_fatura_atual)
+            if not df_faturas_list:
+                return pd.DataFrame()
+            df_faturas_consolidadas = pd.concat(df_faturas_list, ignore_index=True)
+            registro_etapa['linhas'] = len(df_faturas_consolidadas)
+        contar_evento(metricas_desempenho, 'arquivos_lidos', len(df_faturas_list))
+        titulos_unicos = pd.unique(df_faturas_consolidadas[COLUNA_TITULO_NORMALIZADO])
+        contar_evento(metricas_desempenho, 'titulos_unicos', len(titulos_unicos))
+        blocos_titulos = [bloco for bloco in np.array_split(titulos_unicos, quantidade_processos * BLOCOS_TITULOS_POR_PROCESSO) if len(bloco)]
+        exibir_mensagem_progresso(None, f"Categorizando {len(titulos_unicos)} títulos únicos em {quantidade_processos} processo(s)...", tipo='info')
+        with medir_etapa(metricas_desempenho, 'categorizacao', len(titulos_unicos)):
+            categorias_titulos = [categoria for categorias_bloco in executor.map(_categorizar_bloco_titulos, blocos_titulos) for categoria in categorias_bloco]
+    df_faturas_consolidadas[COLUNA_CATEGORIA] = df_faturas_consolidadas[COLUNA_TITULO_NORMALIZADO].map(dict(zip(titulos_unicos, categorias_titulos)))
+    df_faturas_consolidadas.drop(columns=[COLUNA_TITULO_NORMALIZADO], inplace=True)
+    with medir_etapa(metricas_desempenho, 'schema', len(df_faturas_consolidadas)):
+        return aplicar_schema_faturas(df_faturas_consolidadas)
+
+def _expandir_entradas_faturas(padroes_entrada):
+    import glob
+    caminhos_faturas = []
+    for padrao in padroes_entrada:
+        caminhos_faturas.extend(sorted(glob.glob(padrao, recursive=True)) or ([padrao] if os.path.isfile(padrao) else []))
+    return [caminho for caminho in dict.fromkeys(caminhos_faturas) if os.path.isfile(caminho)]
+
+def _imprimir_resumo_linha_de_comando(metricas_desempenho, quantidade_transacoes, segundos_totais, quantidade_processos, caminho_saida):
+    metricas_exportadas = exportar_metricas_desempenho(metricas_desempenho)
+    contadores = metricas_exportadas['contadores']
+    print(f"Arquivos: {contadores.get('arquivos_lidos', 0)} | Transações: {quantidade_transacoes:,} | Títulos únicos: {contadores.get('titulos_unicos', 0):,} | Processos: {quantidade_processos}")
+    print(f"{'etapa':<26}{'linhas':>12}{'tempo':>11}{'linhas/s':>14}")
+    for nome_etapa, etapa in metricas_exportadas['etapas'].items():
+        linhas_por_segundo = f"{etapa['linhas_por_segundo']:,.0f}" if etapa['linhas_por_segundo'] else '-'
+        print(f"{nome_etapa:<26}{etapa['linhas']:>12,}{etapa['segundos']:>10.3f}s{linhas_por_segundo:>14}")
+    print(f"Total: {segundos_totais:.3f}s ({quantidade_transacoes / segundos_totais if segundos_totais else 0:,.0f} transações/s) -> {caminho_saida}")
+
+def executar_linha_de_comando(argumentos_linha_de_comando=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m categorizador', description="Categoriza faturas Nubank (CSV) em lote, sem a interface Streamlit.")
+    parser.add_argument('entradas', nargs='+', help="Arquivos CSV de fatura ou padrões glob (ex.: 'faturas/**/*.csv').")
+    parser.add_argument('-o', '--saida', required=True, help="Arquivo de saída .parquet ou .csv.")
+    parser.add_argument('--modo', choices=list(MODOS_CATEGORIZACAO_LINHA_DE_COMANDO), default='generica', help="'especifica' usa também a base de CNPJ (busca fuzzy por estabelecimento).")
+    parser.add_argument('--base-cnpj', help="Base de estabelecimentos (CSV separado por ';') usada no modo específico.")
+    parser.add_argument('--col-estabelecimento', default=COLUNA_ESTAB_PRINCIPAL_DEFAULT)
+    parser.add_argument('--col-atividade', default=COLUNA_ATIVIDADE_PRINCIPAL_DEFAULT)
+    parser.add_argument('--categorias', default=CAMINHO_CATEGORIAS_BASE_JSON, help="Arquivo JSON de categorias e palavras-chave.")
+    parser.add_argument('-j', '--processos', type=int, default=os.cpu_count() or 1, help="Quantidade de processos (padrão: todos os núcleos).")
+    argumentos = parser.parse_args(argumentos_linha_de_comando)
+
+    usar_categorizacao_especifica = MODOS_CATEGORIZACAO_LINHA_DE_COMANDO[argumentos.modo]
+    if usar_categorizacao_especifica and not argumentos.base_cnpj:
+        parser.error("--modo especifica exige --base-cnpj.")
+    if usar_categorizacao_especifica and not os.path.isfile(argumentos.base_cnpj):
+        parser.error(f"base de CNPJ não encontrada: {argumentos.base_cnpj}")
+    formato_saida = FORMATOS_SAIDA_LINHA_DE_COMANDO.get(os.path.splitext(argumentos.saida)[1].lower())
+    if formato_saida is None:
+        parser.error(f"extensão de saída não suportada (use {', '.join(FORMATOS_SAIDA_LINHA_DE_COMANDO)}).")
+    caminhos_faturas = _expandir_entradas_faturas(argumentos.entradas)
+    if not caminhos_faturas:
+        parser.error("nenhum arquivo de fatura encontrado nas entradas informadas.")
+
+    metricas_desempenho = criar_metricas_desempenho()
+    quantidade_processos = max(1, argumentos.processos)
+    inicio = time.perf_counter()
+    with redirect_stdout(sys.stderr):
+        df_faturas = categorizar_arquivos_em_lote(
+            caminhos_faturas,
+            usar_categorizacao_especifica,
+            argumentos.base_cnpj,
+            argumentos.categorias,
+            argumentos.col_estabelecimento,
+            argumentos.col_atividade,
+            quantidade_processos,
+            metricas_desempenho
+        )
+        if df_faturas.empty:
+            exibir_mensagem_progresso(None, "Nenhuma fatura processada com sucesso ou nenhuma transação válida encontrada.", tipo='error')
+            return 1
+        with medir_etapa(metricas_desempenho, 'gravacao', len(df_faturas)):
+            if formato_saida == 'parquet':
+                df_faturas.to_parquet(argumentos.saida, index=False)
+            else:
+                df_faturas.to_csv(argumentos.saida, index=False)
+    _imprimir_resumo_linha_de_comando(metricas_desempenho, len(df_faturas), time.perf_counter() - inicio, quantidade_processos, argumentos.saida)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(executar_linha_de_comando())
@@ -0,0 +1,128 @@
+import re
+import numpy as np
+import pandas as pd
+
+from categorizador import (
+    COLUNA_DATA, COLUNA_TITULO, COLUNA_VALOR, COLUNA_CATEGORIA, COLUNA_FATURA_ORIGEM
+)
+
+CICLO_NAO_DEFINIDO = "Sem Ciclo Definido"
+PADRAO_CICLO_NOME_ARQUIVO = r'(\d{4}-\d{2})'
+
+CATEGORIAS_CREDITO_AJUSTE = [
+    'Pagamento de Fatura', 'Estorno', 'Ajustes Financeiros Nubank',
+    'Ajuste Parcelamento Fatura', 'Encerramento de dívida', 'Crédito Diversos',
+    'Estorno de juros da dívida encerrada'
+]
+CATEGORIAS_ENCARGOS_FINANCEIROS = [
+    'Juros de dívida encerrada', 'IOF de atraso',
+    'Multa de atraso', 'Juros e Taxas Diversas', 'Taxa',
+    'Juros de atraso'
+]
+CATEGORIA_ENCARGOS_PARCELAMENTO_FATURA = "Encargos de Parcelamento Fatura"
+CATEGORIAS_AJUSTE_SALDO_DEVEDOR = [
+    'Saldo em atraso',
+    'Crédito de atraso'
+]
+
+CATEGORIAS_FINANCEIRAS_FIXAS = sorted(list(set(
+    CATEGORIAS_CREDITO_AJUSTE +
+    CATEGORIAS_ENCARGOS_FINANCEIROS +
+    [CATEGORIA_ENCARGOS_PARCELAMENTO_FATURA] +
+    CATEGORIAS_AJUSTE_SALDO_DEVEDOR +
+    ["Taxas"]
+)))
+
+CATEGORIAS_SISTEMA_ERRO_SEM_CATEGORIA = [
+    "Sem Categoria/Pix Credito"
+]
+
+
+CATEGORIAS_ESSENCIAIS_PARA_DROPDOWNS = sorted(list(set(
+    CATEGORIAS_FINANCEIRAS_FIXAS +
+    CATEGORIAS_SISTEMA_ERRO_SEM_CATEGORIA
+)))
+
+def extrair_ciclo_do_nome_arquivo(nome_arquivo: str, registrar_mensagem=None) -> str:
+    if not isinstance(nome_arquivo, str):
+        return CICLO_NAO_DEFINIDO
+    match = re.search(PADRAO_CICLO_NOME_ARQUIVO, nome_arquivo)
+    if match:
+        return match.group(1)
+    if registrar_mensagem:
+        registrar_mensagem(f"Não foi possível extrair o ciclo YYYY-MM do nome: {nome_arquivo}", "warning")
+    return CICLO_NAO_DEFINIDO
+
+def preparar_dataframe_dashboard(df: pd.DataFrame, registrar_mensagem=None) -> pd.DataFrame:
+    df_out = df.copy()
+    if not df_out.empty and COLUNA_DATA in df_out.columns:
+        df_out[COLUNA_DATA] = pd.to_datetime(df_out[COLUNA_DATA], errors='coerce')
+        df_out.dropna(subset=[COLUNA_DATA], inplace=True)
+
+        if not df_out.empty:
+            codigos_datas, datas_unicas = pd.factorize(df_out[COLUNA_DATA])
+            datas_unicas = pd.DatetimeIndex(datas_unicas)
+            
+            df_out['mes_ano'] = datas_unicas.to_period('M').astype(str).to_numpy()[codigos_datas]
+            df_out['ano'] = datas_unicas.year.to_numpy()[codigos_datas]
+            df_out['mes'] = datas_unicas.month.to_numpy()[codigos_datas]
+            df_out['dia_da_semana'] = datas_unicas.day_name().to_numpy()[codigos_datas]
+            df_out['dia_do_mes'] = datas_unicas.day.to_numpy()[codigos_datas]
+
+    if COLUNA_FATURA_ORIGEM in df_out.columns:
+        codigos_origens, origens_unicas = pd.factorize(df_out[COLUNA_FATURA_ORIGEM].astype(object))
+        ciclos_unicos = np.array([extrair_ciclo_do_nome_arquivo(nome, registrar_mensagem) for nome in origens_unicas] + [CICLO_NAO_DEFINIDO], dtype=object)
+        df_out['ciclo_fatura'] = ciclos_unicos[codigos_origens]
+    elif 'ciclo_fatura' not in df_out.columns: 
+        df_out['ciclo_fatura'] = "Sem Origem Definida" 
+        
+    return df_out
+
+COLUNAS_CUBO_CONSUMO_DIA = ['ciclo_fatura', COLUNA_CATEGORIA, 'dia', 'mes_ano', 'dia_da_semana', 'dia_do_mes']
+COLUNAS_CUBO_CONSUMO_TITULO = ['ciclo_fatura', COLUNA_CATEGORIA, COLUNA_TITULO]
+COLUNAS_ENCARGOS_DETALHES = [COLUNA_DATA, 'mes_ano', COLUNA_TITULO, COLUNA_CATEGORIA, COLUNA_VALOR, 'ciclo_fatura']
+
+def construir_cubos_dashboard(df: pd.DataFrame) -> dict:
+    categorias = df[COLUNA_CATEGORIA]
+    mascara_nao_fixas = ~categorias.isin(CATEGORIAS_FINANCEIRAS_FIXAS)
+    mascara_valor_positivo = df[COLUNA_VALOR] > 0
+    mascara_consumo = mascara_nao_fixas & mascara_valor_positivo & df['mes_ano'].notna()
+    mascara_encargos = categorias.isin(CATEGORIAS_ENCARGOS_FINANCEIROS) & mascara_valor_positivo & df['mes_ano'].notna()
+
+    df_consumo = df.loc[mascara_consumo, ['ciclo_fatura', COLUNA_CATEGORIA, COLUNA_TITULO, COLUNA_DATA, 'mes_ano', 'dia_da_semana', 'dia_do_mes', COLUNA_VALOR]]
+    df_consumo = df_consumo.assign(**{
+        'dia': df_consumo[COLUNA_DATA].dt.normalize(),
+        COLUNA_CATEGORIA: df_consumo[COLUNA_CATEGORIA].astype(object),
+    })
+    agregacoes_cubo = {COLUNA_VALOR: (COLUNA_VALOR, 'sum'), 'quantidade': (COLUNA_VALOR, 'size')}
+
+    cubo_consumo_dia = df_consumo.groupby(COLUNAS_CUBO_CONSUMO_DIA, dropna=False, sort=False).agg(**agregacoes_cubo).reset_index()
+    cubo_consumo_titulo = df_consumo.groupby(COLUNAS_CUBO_CONSUMO_TITULO, dropna=False, sort=False).agg(**agregacoes_cubo).reset_index()
+
+    return {
+        'mascara_nao_fixas': mascara_nao_fixas,
+        'consumo_dia': cubo_consumo_dia,
+        'consumo_titulo': cubo_consumo_titulo,
+        'encargos': df.loc[mascara_encargos, COLUNAS_ENCARGOS_DETALHES],
+    }
+
+def atualizar_cubos_dashboard(cubos: dict, linhas_antes: pd.DataFrame, linhas_depois: pd.DataFrame):
+    if linhas_antes.empty:
+        return
+    contribuicao_antes = construir_cubos_dashboard(linhas_antes)
+    contribuicao_depois = construir_cubos_dashboard(linhas_depois)
+
+    for nome_cubo, colunas_cubo in (('consumo_dia', COLUNAS_CUBO_CONSUMO_DIA), ('consumo_titulo', COLUNAS_CUBO_CONSUMO_TITULO)):
+        retirada = contribuicao_antes[nome_cubo]
+        retirada[[COLUNA_VALOR, 'quantidade']] = -retirada[[COLUNA_VALOR, 'quantidade']]
+        partes = [parte for parte in (cubos[nome_cubo], retirada, contribuicao_depois[nome_cubo]) if not parte.empty]
+        if not partes:
+            continue
+        cubo = pd.concat(partes, ignore_index=True).groupby(colunas_cubo, dropna=False, sort=False)[[COLUNA_VALOR, 'quantidade']].sum().reset_index()
+        cubos[nome_cubo] = cubo[cubo['quantidade'] > 0].reset_index(drop=True)
+
+    encargos = cubos['encargos'].drop(index=linhas_antes.index.intersection(cubos['encargos'].index))
+    if not contribuicao_depois['encargos'].empty:
+        encargos = pd.concat([encargos, contribuicao_depois['encargos']])
+    cubos['encargos'] = encargos
+    cubos['mascara_nao_fixas'].loc[linhas_antes.index] = contribuicao_depois['mascara_nao_fixas'].to_numpy()
@@ -0,0 +1,231 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import argparse
+import io
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from categorizador import (
+    CAMINHO_CATEGORIAS_BASE_JSON, COLUNA_ESTAB_PRINCIPAL_DEFAULT, COLUNA_ATIVIDADE_PRINCIPAL_DEFAULT,
+    COLUNA_CATEGORIA, COLUNA_TITULO_NORMALIZADO, SIMILARITY_THRESHOLD,
+    MODOS_CATEGORIZACAO_LINHA_DE_COMANDO,
+    carregar_categorias_base_do_json, caminho_diario_categorias, carregar_indice_estabelecimentos,
+    obter_automato_palavras_chave, criar_cache_categorizacao, sincronizar_cache_categorizacao,
+    categorizar_titulos_em_lote, normalizar_texto_serie, aplicar_schema_faturas,
+    criar_metricas_desempenho, medir_etapa, contar_evento, exportar_metricas_desempenho,
+    exibir_mensagem_progresso, normalizar_categorias_base, chave_configuracao_categorizacao, ler_arquivo_fatura
+)
+
+HOST_SERVIDOR_DEFAULT = "127.0.0.1"
+PORTA_SERVIDOR_DEFAULT = 8765
+TAMANHO_MAXIMO_REQUISICAO = 64 << 20
+TIPOS_CONTEUDO_CSV = ('text/csv', 'application/csv')
+
+
+def _assinatura_arquivos_categorias(caminho_categorias):
+    assinatura = []
+    for caminho_arquivo in (caminho_categorias, caminho_diario_categorias(caminho_categorias)):
+        try:
+            stat_arquivo = os.stat(caminho_arquivo)
+            assinatura.append((stat_arquivo.st_mtime_ns, stat_arquivo.st_size))
+        except FileNotFoundError:
+            assinatura.append(None)
+    return tuple(assinatura)
+
+
+def criar_categorizador_residente(caminho_categorias=CAMINHO_CATEGORIAS_BASE_JSON,
+                                  caminho_arquivo_estabelecimentos=None,
+                                  col_estab_principal=COLUNA_ESTAB_PRINCIPAL_DEFAULT,
+                                  col_ativ_principal=COLUNA_ATIVIDADE_PRINCIPAL_DEFAULT):
+    indice_estabelecimentos = None
+    if caminho_arquivo_estabelecimentos:
+        indice_estabelecimentos = carregar_indice_estabelecimentos(caminho_arquivo_estabelecimentos, col_estab_principal, col_ativ_principal)
+    categorizador_residente = {
+        'trava_recarga': threading.Lock(),
+        'caminho_categorias': caminho_categorias,
+        'caminho_arquivo_estabelecimentos': caminho_arquivo_estabelecimentos,
+        'col_estab_principal': col_estab_principal,
+        'col_ativ_principal': col_ativ_principal,
+        'indice_estabelecimentos': indice_estabelecimentos,
+        'categorias': {'assinatura': None},
+        'modos': {
+            modo: {'trava': threading.Lock(), 'cache_categorizacao': criar_cache_categorizacao(), 'assinatura_categorias': None}
+            for modo in MODOS_CATEGORIZACAO_LINHA_DE_COMANDO
+        },
+        'metricas_desempenho': criar_metricas_desempenho(),
+        'inicio': time.time(),
+    }
+    _atualizar_categorias_residentes(categorizador_residente)
+    return categorizador_residente
+
+
+def _atualizar_categorias_residentes(categorizador_residente):
+    with categorizador_residente['trava_recarga']:
+        assinatura_atual = _assinatura_arquivos_categorias(categorizador_residente['caminho_categorias'])
+        if assinatura_atual == categorizador_residente['categorias']['assinatura']:
+            return
+        palavras_chave_norm, mapa_categorias_norm = normalizar_categorias_base(
+            carregar_categorias_base_do_json(categorizador_residente['caminho_categorias'])
+        )
+        categorizador_residente['categorias'] = {
+            'assinatura': assinatura_atual,
+            'palavras_chave_norm': palavras_chave_norm,
+            'mapa_categorias_norm': mapa_categorias_norm,
+            'automato_palavras_chave': obter_automato_palavras_chave(palavras_chave_norm),
+        }
+    contar_evento(categorizador_residente['metricas_desempenho'], 'recargas_categorias')
+
+
+def _sincronizar_cache_modo(categorizador_residente, modo, categorias):
+    estado_modo = categorizador_residente['modos'][modo]
+    if estado_modo['assinatura_categorias'] == categorias['assinatura']:
+        return
+    sincronizar_cache_categorizacao(
+        estado_modo['cache_categorizacao'], categorias['palavras_chave_norm'], categorias['mapa_categorias_norm'],
+        chave_configuracao_categorizacao(
+            MODOS_CATEGORIZACAO_LINHA_DE_COMANDO[modo], categorizador_residente['caminho_arquivo_estabelecimentos'],
+            categorizador_residente['col_estab_principal'], categorizador_residente['col_ativ_principal']
+        )
+    )
+    estado_modo['assinatura_categorias'] = categorias['assinatura']
+
+
+def modo_padrao_residente(categorizador_residente):
+    return 'especifica' if categorizador_residente['indice_estabelecimentos'] is not None else 'generica'
+
+
+def categorizar_titulos_residente(categorizador_residente, serie_titulos_normalizados, modo):
+    if modo == 'especifica' and categorizador_residente['indice_estabelecimentos'] is None:
+        raise ValueError("modo 'especifica' indisponível: o serviço foi iniciado sem --base-cnpj.")
+    indice_estabelecimentos = categorizador_residente['indice_estabelecimentos'] if modo == 'especifica' else None
+    metricas_desempenho = categorizador_residente['metricas_desempenho']
+    _atualizar_categorias_residentes(categorizador_residente)
+    estado_modo = categorizador_residente['modos'][modo]
+    with estado_modo['trava']:
+        categorias = categorizador_residente['categorias']
+        _sincronizar_cache_modo(categorizador_residente, modo, categorias)
+        with medir_etapa(metricas_desempenho, f"categorizacao_{modo}", len(serie_titulos_normalizados)):
+            return categorizar_titulos_em_lote(
+                serie_titulos_normalizados,
+                categorias['palavras_chave_norm'],
+                categorias['mapa_categorias_norm'],
+                indice_estabelecimentos is not None,
+                indice_estabelecimentos['nomes_normalizados'] if indice_estabelecimentos is not None else [],
+                indice_estabelecimentos['mapa_nome_atividade'] if indice_estabelecimentos is not None else {},
+                SIMILARITY_THRESHOLD,
+                categorias['automato_palavras_chave'],
+                estado_modo['cache_categorizacao'],
+                indice_estabelecimentos['indice_fuzzy'] if indice_estabelecimentos is not None else None,
+                metricas_desempenho
+            )
+
+
+def categorizar_fatura_csv_residente(categorizador_residente, conteudo_csv, nome_arquivo, modo):
+    df_fatura, mensagens = ler_arquivo_fatura(io.BytesIO(conteudo_csv), nome_arquivo)
+    if df_fatura is None:
+        raise ValueError('; '.join(mensagem for mensagem, _ in mensagens) or f"Fatura {nome_arquivo} inválida.")
+    df_fatura[COLUNA_CATEGORIA] = categorizar_titulos_residente(categorizador_residente, df_fatura[COLUNA_TITULO_NORMALIZADO], modo)
+    return aplicar_schema_faturas(df_fatura.drop(columns=[COLUNA_TITULO_NORMALIZADO]))
+
+
+class ManipuladorCategorizacao(BaseHTTPRequestHandler):
+    server_version = "SintagmaCategorizador/1.0"
+
+    def _responder(self, status, corpo, tipo_conteudo='application/json; charset=utf-8', inicio=None):
+        if not isinstance(corpo, bytes):
+            corpo = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', tipo_conteudo)
+        self.send_header('Content-Length', str(len(corpo)))
+        if inicio is not None:
+            self.send_header('X-Tempo-Processamento-ms', f"{(time.perf_counter() - inicio) * 1000:.2f}")
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def do_GET(self):
+        if urlsplit(self.path).path != '/saude':
+            self._responder(404, {'erro': f"Rota não encontrada: {self.path}"})
+            return
+        categorizador_residente = self.server.categorizador_residente
+        indice_estabelecimentos = categorizador_residente['indice_estabelecimentos']
+        self._responder(200, {
+            'status': 'ok',
+            'modo_padrao': modo_padrao_residente(categorizador_residente),
+            'estabelecimentos': len(indice_estabelecimentos['nomes_normalizados']) if indice_estabelecimentos is not None else 0,
+            'categorias': len(categorizador_residente['categorias']['mapa_categorias_norm']),
+            'titulos_em_cache': {modo: len(estado_modo['cache_categorizacao']['titulos']) for modo, estado_modo in categorizador_residente['modos'].items()},
+            'segundos_ativo': round(time.time() - categorizador_residente['inicio'], 1),
+            'metricas': exportar_metricas_desempenho(categorizador_residente['metricas_desempenho']),
+        })
+
+    def do_POST(self):
+        inicio = time.perf_counter()
+        url = urlsplit(self.path)
+        if url.path != '/categorizar':
+            self._responder(404, {'erro': f"Rota não encontrada: {self.path}"})
+            return
+        tamanho_corpo = int(self.headers.get('Content-Length') or 0)
+        if tamanho_corpo > TAMANHO_MAXIMO_REQUISICAO:
+            self._responder(413, {'erro': f"Requisição maior que {TAMANHO_MAXIMO_REQUISICAO} bytes."})
+            return
+        corpo = self.rfile.read(tamanho_corpo)
+        parametros = {chave: valores[-1] for chave, valores in parse_qs(url.query).items()}
+        categorizador_residente = self.server.categorizador_residente
+        try:
+            if self.headers.get('Content-Type', '').split(';')[0].strip().lower() in TIPOS_CONTEUDO_CSV:
+                modo = parametros.get('modo') or modo_padrao_residente(categorizador_residente)
+                self._validar_modo(modo)
+                df_fatura = categorizar_fatura_csv_residente(categorizador_residente, corpo, parametros.get('nome', 'fatura.csv'), modo)
+                contar_evento(categorizador_residente['metricas_desempenho'], 'requisicoes_csv')
+                self._responder(200, df_fatura.to_csv(index=False).encode('utf-8'), 'text/csv; charset=utf-8', inicio)
+                return
+            payload = json.loads(corpo or b'{}')
+            titulos = payload.get('titulos') if isinstance(payload, dict) else None
+            if not isinstance(titulos, list):
+                raise ValueError("Envie um JSON {\"titulos\": [...]} ou uma fatura CSV com Content-Type: text/csv.")
+            modo = payload.get('modo') or parametros.get('modo') or modo_padrao_residente(categorizador_residente)
+            self._validar_modo(modo)
+            categorias = categorizar_titulos_residente(categorizador_residente, normalizar_texto_serie(pd.Series(titulos, dtype=object)), modo)
+            contar_evento(categorizador_residente['metricas_desempenho'], 'requisicoes_json')
+            self._responder(200, {'modo': modo, 'categorias': categorias.tolist()}, inicio=inicio)
+        except ValueError as e:
+            self._responder(400, {'erro': str(e)}, inicio=inicio)
+        except Exception as e:
+            exibir_mensagem_progresso(None, f"ERRO ao categorizar requisição: {e}", tipo='error')
+            self._responder(500, {'erro': str(e)}, inicio=inicio)
+
+    def _validar_modo(self, modo):
+        if modo not in MODOS_CATEGORIZACAO_LINHA_DE_COMANDO:
+            raise ValueError(f"Modo inválido: {modo} (use {', '.join(MODOS_CATEGORIZACAO_LINHA_DE_COMANDO)}).")
+
+
+def criar_servidor_categorizacao(categorizador_residente, host=HOST_SERVIDOR_DEFAULT, porta=PORTA_SERVIDOR_DEFAULT):
+    servidor = ThreadingHTTPServer((host, porta), ManipuladorCategorizacao)
+    servidor.daemon_threads = True
+    servidor.categorizador_residente = categorizador_residente
+    return servidor
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serviço HTTP local de categorização com palavras-chave e índice de estabelecimentos mantidos em memória.")
+    parser.add_argument('--host', default=HOST_SERVIDOR_DEFAULT)
+    parser.add_argument('--porta', type=int, default=PORTA_SERVIDOR_DEFAULT)
+    parser.add_argument('--base-cnpj', help="Base de estabelecimentos (CSV separado por ';'); habilita o modo 'especifica'.")
+    parser.add_argument('--col-estabelecimento', default=COLUNA_ESTAB_PRINCIPAL_DEFAULT)
+    parser.add_argument('--col-atividade', default=COLUNA_ATIVIDADE_PRINCIPAL_DEFAULT)
+    parser.add_argument('--categorias', default=CAMINHO_CATEGORIAS_BASE_JSON, help="Arquivo JSON de categorias e palavras-chave.")
+    argumentos = parser.parse_args()
+
+    categorizador_residente = criar_categorizador_residente(argumentos.categorias, argumentos.base_cnpj, argumentos.col_estabelecimento, argumentos.col_atividade)
+    servidor = criar_servidor_categorizacao(categorizador_residente, argumentos.host, argumentos.porta)
+    exibir_mensagem_progresso(None, f"Serviço de categorização em http://{argumentos.host}:{argumentos.porta} (modo padrão: {modo_padrao_residente(categorizador_residente)}).", tipo='success')
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
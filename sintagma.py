@@ -1,74 +1,74 @@
-from dateutil.relativedelta import relativedelta
-import plotly.graph_objects as go
+from contextlib import closing
 from datetime import datetime, timedelta
-import plotly.express as px
 import streamlit as st
 import pandas as pd
 import numpy as np
-import re
 import json
 import os
 import io
+import zipfile
+import sqlite3
 
 from categorizador import (
     processar_faturas,
+    hash_conteudo_fatura,
+    criar_cache_categorizacao,
+    criar_cache_faturas_lidas,
+    carregar_indice_estabelecimentos,
     carregar_categorias_base_do_json,
-    salvar_categorias_base_para_json,
+    registrar_operacoes_categorias,
     CAMINHO_CATEGORIAS_BASE_JSON,
-    COLUNA_DATA, COLUNA_TITULO, COLUNA_VALOR, COLUNA_CATEGORIA, COLUNA_ID,
+    COLUNA_DATA, COLUNA_TITULO, COLUNA_VALOR, COLUNA_CATEGORIA,
     COLUNA_PARCELA_ATUAL, COLUNA_TOTAL_PARCELAS, COLUNA_FATURA_ORIGEM,
     COLUNA_EDIT_ID, CAMINHO_PRINCIPAL_PROCESSADO_DEFAULT_PREFIXO,
-    normalizar_texto
+    normalizar_texto,
+    normalizar_texto_serie,
+    propagar_categorias_por_titulo,
+    aplicar_schema_faturas,
+    anexar_faturas_tipadas,
+    criar_metricas_desempenho,
+    medir_etapa,
+    marcar_etapa,
+    contar_evento,
+    exportar_metricas_desempenho
+)
+
+from painel import (
+    CATEGORIAS_ENCARGOS_FINANCEIROS,
+    CATEGORIAS_FINANCEIRAS_FIXAS,
+    CATEGORIAS_ESSENCIAIS_PARA_DROPDOWNS,
+    preparar_dataframe_dashboard,
+    construir_cubos_dashboard,
+    atualizar_cubos_dashboard
+)
+
+from armazenamento import (
+    abrir_banco_transacoes,
+    gravar_transacoes,
+    carregar_transacoes,
+    listar_ciclos_transacoes,
+    atualizar_categoria_transacoes,
+    remover_transacoes_por_fatura,
+    agregar_cubos_dashboard,
+    gerar_chaves_transacoes,
+    gerar_hashes_transacoes,
+    CAMINHO_BANCO_TRANSACOES_DEFAULT
 )
 
 st.set_page_config(layout="wide", page_title="Análise de Faturas Pessoal")
 
 NOME_ARQUIVO_IMAGEM = "Logo0.png"
+ARQUIVO_MANIFESTO_SESSAO = "manifest.json"
+ARQUIVO_DADOS_SESSAO = "df_processado.parquet"
+VERSAO_FORMATO_SESSAO = 2
 MAX_LOG_MESSAGES = 20
+LIMITE_LINHAS_PERFIL_EXECUCAO = 40
+LARGURA_MAXIMA_LOGO = 960
+SUFIXO_LOGO_REDUZIDO = ".reduzido.png"
+
+COLUNA_GRADE_EDICAO_CATEGORIA = "Categoria"
+OPCOES_ITENS_POR_PAGINA_EDICAO = [25, 50, 100, 200]
 
-CATEGORIAS_CREDITO_AJUSTE = [
-    'Pagamento de Fatura', 'Estorno', 'Ajustes Financeiros Nubank',
-    'Ajuste Parcelamento Fatura', 'Encerramento de dívida', 'Crédito Diversos',
-    'Estorno de juros da dívida encerrada'
-]
-CATEGORIAS_ENCARGOS_FINANCEIROS = [
-    'Juros de dívida encerrada', 'IOF de atraso',
-    'Multa de atraso', 'Juros e Taxas Diversas', 'Taxa',
-    'Juros de atraso'
-]
-CATEGORIA_ENCARGOS_PARCELAMENTO_FATURA = "Encargos de Parcelamento Fatura"
-CATEGORIAS_AJUSTE_SALDO_DEVEDOR = [
-    'Saldo em atraso',
-    'Crédito de atraso'
-]
-
-CATEGORIAS_FINANCEIRAS_FIXAS = sorted(list(set(
-    CATEGORIAS_CREDITO_AJUSTE +
-    CATEGORIAS_ENCARGOS_FINANCEIROS +
-    [CATEGORIA_ENCARGOS_PARCELAMENTO_FATURA] +
-    CATEGORIAS_AJUSTE_SALDO_DEVEDOR +
-    ["Taxas"]
-)))
-
-CATEGORIAS_SISTEMA_ERRO_SEM_CATEGORIA = [
-    "Sem Categoria/Pix Credito"
-]
-
-
-CATEGORIAS_ESSENCIAIS_PARA_DROPDOWNS = sorted(list(set(
-    CATEGORIAS_FINANCEIRAS_FIXAS +
-    CATEGORIAS_SISTEMA_ERRO_SEM_CATEGORIA
-)))
-
-
-def extrair_ciclo_do_nome_arquivo(nome_arquivo: str) -> str:
-    if not isinstance(nome_arquivo, str):
-        return "Sem Ciclo Definido"
-    match = re.search(r'(\d{4}-\d{2})', nome_arquivo)
-    if match:
-        return match.group(1)
-    log_mensagem_app(f"Não foi possível extrair o ciclo YYYY-MM do nome: {nome_arquivo}", "warning")
-    return "Sem Ciclo Definido"
 
 def log_mensagem_app(mensagem: str, tipo: str = 'info'):
     if 'log_messages' not in st.session_state or st.session_state.log_messages == ["Aqui aparecerão as mensagens de informação do processo."]:
@@ -92,6 +92,7 @@ def _atualizar_lista_categorias_editaveis():
     lista_cats_memoria = list(base_memoria.keys())
     
     st.session_state.categorias_editaveis = sorted(list(set(lista_cats_memoria + CATEGORIAS_ESSENCIAIS_PARA_DROPDOWNS)))
+    st.session_state.opcoes_edicao_cache = None
 
 
 def inicializar_session_state():
@@ -101,14 +102,35 @@ def inicializar_session_state():
         'estado_cnpj_selecionado': "Paraíba",
         'municipio_cnpj_selecionado': "João Pessoa",
         'filtros_sidebar': {'periodos_ciclo_arquivo': ["Todos"], 'categorias_despesa': ["Todos"]},
-        'nomes_arquivos_faturas_ja_processados': set(),
+        'faturas_ja_processadas': set(),
         'arquivo_sessao_uploader_key': 0,
         'log_messages': ["Aqui aparecerão as mensagens de informação do processo."],
         'edit_search_term': "",
         'edit_category_filter': "Todas",
         'edit_current_page': 1,
         'categorias_base_memoria': carregar_categorias_base_do_json(),
-        'ciclos_consulta_selecionados': []
+        'ciclos_consulta_selecionados': [],
+        'cache_categorizacao': criar_cache_categorizacao(),
+        'cache_faturas_lidas': criar_cache_faturas_lidas(),
+        'df_processado_versao': 0,
+        'hashes_transacoes_sessao': set(),
+        'proximo_edit_id': 0,
+        'df_dashboard_cache': None,
+        'cubos_dashboard_cache': None,
+        'visoes_dashboard_cache': None,
+        'cubos_base_local_cache': None,
+        'edicoes_pendentes': {},
+        'edit_aplicar_titulos_iguais': True,
+        'editor_edicao_versao': 0,
+        'opcoes_edicao_cache': None,
+        'edicao_filtro_cache': None,
+        'operacoes_categorias_pendentes': [],
+        'categorias_base_versao': 0,
+        'exportacoes_cache': {},
+        'usar_base_local': False,
+        'metricas_ultimo_processamento': None,
+        'perfilar_execucao': False,
+        'relatorio_perfil_execucao': None
     }
     for key, value in defaults.items():
         st.session_state.setdefault(key, value)
@@ -118,21 +140,252 @@ def inicializar_session_state():
     
     _atualizar_lista_categorias_editaveis() 
 
-def gerar_dados_sessao_para_salvar() -> str:
-    df_para_salvar = st.session_state.df_processado.copy()
+def _publicar_df_processado(df: pd.DataFrame):
+    if not df.empty and COLUNA_EDIT_ID in df.columns:
+        df.index = pd.Index(df[COLUNA_EDIT_ID].to_numpy())
+    st.session_state.df_processado = df
+    st.session_state.proximo_edit_id = int(df.index.max()) + 1 if not df.empty and COLUNA_EDIT_ID in df.columns else 0
+    st.session_state.df_processado_versao += 1
+    st.session_state.edicoes_pendentes = {}
+
+def _definir_df_processado(df: pd.DataFrame, hashes_transacoes=None):
+    if hashes_transacoes is None:
+        hashes_transacoes = set(gerar_hashes_transacoes(df).tolist()) if not df.empty else set()
+    _publicar_df_processado(df)
+    st.session_state.hashes_transacoes_sessao = hashes_transacoes
+
+def _anexar_df_processado(df: pd.DataFrame, hashes_removidas, hashes_adicionadas):
+    _publicar_df_processado(df)
+    hashes_transacoes = st.session_state.hashes_transacoes_sessao
+    hashes_transacoes.difference_update(hashes_removidas)
+    hashes_transacoes.update(hashes_adicionadas)
+
+def _chave_fatura_processada(par_fatura):
+    nome_arquivo, hash_arquivo = par_fatura
+    return (nome_arquivo, hash_arquivo or '')
+
+def _ler_faturas_ja_processadas(estado_carregado):
+    if 'faturas_ja_processadas' in estado_carregado:
+        return {(nome_arquivo, hash_arquivo) for nome_arquivo, hash_arquivo in estado_carregado['faturas_ja_processadas']}
+    if estado_carregado.get('hashes_faturas_ja_processadas'):
+        return set(estado_carregado['hashes_faturas_ja_processadas'].items())
+    return {(nome_arquivo, None) for nome_arquivo in estado_carregado.get('nomes_arquivos_faturas_ja_processados', [])}
+
+def _atribuir_categoria(df: pd.DataFrame, indices, nova_categoria: str):
+    serie_categorias = df[COLUNA_CATEGORIA]
+    if isinstance(serie_categorias.dtype, pd.CategoricalDtype) and nova_categoria not in serie_categorias.cat.categories:
+        df[COLUNA_CATEGORIA] = serie_categorias.cat.add_categories([nova_categoria])
+    df.loc[indices, COLUNA_CATEGORIA] = nova_categoria
+
+def _executar_na_base_local(descricao_operacao: str, operacao):
+    try:
+        with closing(abrir_banco_transacoes()) as conexao:
+            return operacao(conexao)
+    except sqlite3.Error as e:
+        log_mensagem_app(f"Erro na base local ao {descricao_operacao}: {e}", "error")
+        return None
+
+def _sincronizar_base_local():
+    st.session_state.cubos_base_local_cache = None
+    if st.session_state.usar_base_local and not st.session_state.df_processado.empty:
+        _executar_na_base_local(
+            "gravar transações",
+            lambda conexao: gravar_transacoes(conexao, st.session_state.df_processado)
+        )
+
+def _definir_categoria_transacoes(indices, nova_categoria: str):
+    df_processado = st.session_state.df_processado
+    indices = [indice for indice in indices if indice in df_processado.index]
+    if st.session_state.usar_base_local and indices:
+        chaves_transacoes = gerar_chaves_transacoes(df_processado.loc[indices])
+        _executar_na_base_local(
+            "atualizar categorias",
+            lambda conexao: atualizar_categoria_transacoes(conexao, chaves_transacoes, nova_categoria)
+        )
+    versao_atual = st.session_state.df_processado_versao
+    cache_dashboard = st.session_state.df_dashboard_cache
+    cache_cubos = st.session_state.cubos_dashboard_cache
+    cache_dashboard_atual = cache_dashboard is not None and cache_dashboard['versao'] == versao_atual
+    cache_cubos_atual = cache_dashboard_atual and cache_cubos is not None and cache_cubos['versao'] == versao_atual
+
+    _atribuir_categoria(df_processado, indices, nova_categoria)
+    if cache_dashboard_atual:
+        df_dashboard = cache_dashboard['df']
+        indices_dashboard = [indice for indice in indices if indice in df_dashboard.index]
+        linhas_antes = df_dashboard.loc[indices_dashboard]
+        _atribuir_categoria(df_dashboard, indices_dashboard, nova_categoria)
+        if cache_cubos_atual:
+            atualizar_cubos_dashboard(cache_cubos['cubos'], linhas_antes, df_dashboard.loc[indices_dashboard])
+
+    st.session_state.df_processado_versao += 1
+    if cache_dashboard_atual:
+        cache_dashboard['versao'] = st.session_state.df_processado_versao
+    if cache_cubos_atual:
+        cache_cubos['versao'] = st.session_state.df_processado_versao
+
+def _reiniciar_grade_edicao():
+    st.session_state.pop(f"editor_categorias_edicao_{st.session_state.editor_edicao_versao}", None)
+    st.session_state.editor_edicao_versao += 1
+
+def _registrar_edicoes_grade(chave_editor: str, ids_pagina: list, categorias_atuais_pagina: list):
+    linhas_editadas = st.session_state.get(chave_editor, {}).get('edited_rows', {})
+    for posicao, alteracoes in linhas_editadas.items():
+        categoria_escolhida = alteracoes.get(COLUNA_GRADE_EDICAO_CATEGORIA)
+        if categoria_escolhida is None:
+            continue
+        edit_id = ids_pagina[int(posicao)]
+        if categoria_escolhida == categorias_atuais_pagina[int(posicao)]:
+            st.session_state.edicoes_pendentes.pop(edit_id, None)
+        else:
+            st.session_state.edicoes_pendentes[edit_id] = categoria_escolhida
+    _reiniciar_grade_edicao()
+
+def _criar_categoria_edicao(chave_input: str):
+    nome_nova_categoria_strip = st.session_state.get(chave_input, "").strip()
+    if not nome_nova_categoria_strip:
+        st.warning("Nome da nova categoria não pode ser vazio.")
+        return
+    if nome_nova_categoria_strip in CATEGORIAS_FINANCEIRAS_FIXAS:
+        st.error(f"'{nome_nova_categoria_strip}' é uma categoria financeira fixa e não pode ser criada para consumo.")
+        return
+    if nome_nova_categoria_strip in st.session_state.categorias_editaveis:
+        st.warning(f"Categoria '{nome_nova_categoria_strip}' já existe.")
+        return
+    st.session_state.categorias_base_memoria[nome_nova_categoria_strip] = []
+    _registrar_operacao_categorias({'op': 'criar_categoria', 'categoria': nome_nova_categoria_strip})
+    _atualizar_lista_categorias_editaveis()
+    st.session_state[chave_input] = ""
+    if registrar_operacoes_categorias(st.session_state.operacoes_categorias_pendentes):
+        st.session_state.operacoes_categorias_pendentes = []
+        log_mensagem_app(f"Nova categoria '{nome_nova_categoria_strip}' criada, salva na base de categorias e disponível na coluna Categoria.", "success")
+    else:
+        log_mensagem_app(f"ERRO ao salvar a nova categoria '{nome_nova_categoria_strip}' na base de categorias. Ela será salva novamente ao aplicar as alterações.", "error")
+
+def _registrar_operacao_categorias(operacao: dict):
+    st.session_state.operacoes_categorias_pendentes.append(operacao)
+    st.session_state.categorias_base_versao += 1
+
+def _mover_titulo_na_base_categorias(titulo_norm_para_json: str, categoria_antiga, categoria_nova: str):
+    base_memoria = st.session_state.categorias_base_memoria
+    
+    if pd.notna(categoria_antiga) and categoria_antiga in base_memoria:
+        if isinstance(base_memoria[categoria_antiga], list):
+            if titulo_norm_para_json in base_memoria[categoria_antiga]:
+                base_memoria[categoria_antiga].remove(titulo_norm_para_json)
+                _registrar_operacao_categorias({'op': 'remover_palavra_chave', 'categoria': categoria_antiga, 'palavra_chave': titulo_norm_para_json})
+            if not base_memoria[categoria_antiga] and \
+               categoria_antiga not in CATEGORIAS_ESSENCIAIS_PARA_DROPDOWNS:
+                del base_memoria[categoria_antiga]
+                _registrar_operacao_categorias({'op': 'remover_categoria', 'categoria': categoria_antiga})
+    
+    if categoria_nova not in CATEGORIAS_FINANCEIRAS_FIXAS:
+        if not isinstance(base_memoria.get(categoria_nova), list):
+            base_memoria[categoria_nova] = []
+            _registrar_operacao_categorias({'op': 'criar_categoria', 'categoria': categoria_nova})
+        if titulo_norm_para_json not in base_memoria[categoria_nova]:
+            base_memoria[categoria_nova].append(titulo_norm_para_json)
+            _registrar_operacao_categorias({'op': 'adicionar_palavra_chave', 'categoria': categoria_nova, 'palavra_chave': titulo_norm_para_json})
+
+def _aplicar_edicoes_pendentes():
+    edicoes_pendentes = st.session_state.edicoes_pendentes
+    df_processado = st.session_state.df_processado
+    ids_validos = [edit_id for edit_id in edicoes_pendentes if edit_id in df_processado.index]
+    linhas_editadas = df_processado.loc[ids_validos, [COLUNA_TITULO, COLUNA_CATEGORIA]]
+
+    ids_por_nova_categoria = {}
+    mapa_titulo_norm_para_categoria = {}
+    for edit_id, titulo, categoria_atual in zip(linhas_editadas.index, linhas_editadas[COLUNA_TITULO], linhas_editadas[COLUNA_CATEGORIA]):
+        nova_categoria = edicoes_pendentes[edit_id]
+        if nova_categoria == categoria_atual:
+            continue
+        titulo_norm_para_json = normalizar_texto(titulo)
+        ids_por_nova_categoria.setdefault(nova_categoria, []).append(edit_id)
+        mapa_titulo_norm_para_categoria[titulo_norm_para_json] = nova_categoria
+        _mover_titulo_na_base_categorias(titulo_norm_para_json, categoria_atual, nova_categoria)
+
+    for nova_categoria, ids_categoria in ids_por_nova_categoria.items():
+        _definir_categoria_transacoes(ids_categoria, nova_categoria)
+    quantidade_atualizada = sum(len(ids_categoria) for ids_categoria in ids_por_nova_categoria.values())
+
+    quantidade_propagada = 0
+    if st.session_state.edit_aplicar_titulos_iguais and mapa_titulo_norm_para_categoria:
+        df_processado = st.session_state.df_processado
+        categorias_propagadas = propagar_categorias_por_titulo(
+            df_processado[COLUNA_TITULO], df_processado[COLUNA_CATEGORIA],
+            mapa_titulo_norm_para_categoria, CATEGORIAS_FINANCEIRAS_FIXAS
+        )
+        if not categorias_propagadas.empty:
+            linhas_propagadas = pd.DataFrame({
+                'titulo_norm': normalizar_texto_serie(df_processado.loc[categorias_propagadas.index, COLUNA_TITULO]),
+                'categoria_antiga': df_processado.loc[categorias_propagadas.index, COLUNA_CATEGORIA].astype(object),
+                'categoria_nova': categorias_propagadas,
+            })
+            pares_titulo_exato = linhas_propagadas[linhas_propagadas['titulo_norm'].isin(mapa_titulo_norm_para_categoria.keys())]
+            for titulo_norm, categoria_antiga, nova_categoria in pares_titulo_exato.drop_duplicates().itertuples(index=False):
+                _mover_titulo_na_base_categorias(titulo_norm, categoria_antiga, nova_categoria)
+            for nova_categoria, ids_categoria in categorias_propagadas.groupby(categorias_propagadas).groups.items():
+                _definir_categoria_transacoes(ids_categoria, nova_categoria)
+            quantidade_propagada = len(categorias_propagadas)
+
+    st.session_state.edicoes_pendentes = {}
+    _atualizar_lista_categorias_editaveis()
+
+    mensagem_propagacao = f" {quantidade_propagada} outra(s) com o mesmo título também atualizada(s)." if quantidade_propagada else ""
+    if registrar_operacoes_categorias(st.session_state.operacoes_categorias_pendentes):
+        st.session_state.operacoes_categorias_pendentes = []
+        log_mensagem_app(f"{quantidade_atualizada} transação(ões) atualizada(s).{mensagem_propagacao} Base de categorias salva.", "success")
+    else:
+        log_mensagem_app(f"ERRO ao salvar base de categorias após atualizar {quantidade_atualizada} transação(ões).", "error")
+
+def _descartar_edicoes_pendentes():
+    st.session_state.edicoes_pendentes = {}
+    _reiniciar_grade_edicao()
+
+def obter_exportacao(nome_exportacao: str, chave_exportacao, gerar_dados):
+    exportacao = st.session_state.exportacoes_cache.get(nome_exportacao)
+    if exportacao is None or exportacao['chave'] != chave_exportacao:
+        exportacao = {'chave': chave_exportacao, 'dados': gerar_dados()}
+        st.session_state.exportacoes_cache[nome_exportacao] = exportacao
+    return exportacao['dados']
+
+def exportacao_disponivel(nome_exportacao: str, chave_exportacao) -> bool:
+    exportacao = st.session_state.exportacoes_cache.get(nome_exportacao)
+    return exportacao is not None and exportacao['chave'] == chave_exportacao
+
+def _chave_exportacao_sessao():
+    return (
+        st.session_state.df_processado_versao,
+        st.session_state.categorias_base_versao,
+        json.dumps([
+            st.session_state.tipo_categorizacao_selecionada,
+            st.session_state.estado_cnpj_selecionado,
+            st.session_state.municipio_cnpj_selecionado,
+            st.session_state.filtros_sidebar,
+            sorted(st.session_state.faturas_ja_processadas, key=_chave_fatura_processada),
+            st.session_state.edit_search_term,
+            st.session_state.edit_category_filter,
+            st.session_state.edit_current_page,
+            st.session_state.get('ciclos_consulta_selecionados', []),
+        ], default=str),
+    )
+
+def gerar_dados_sessao_para_salvar() -> bytes:
+    df_para_salvar = st.session_state.df_processado
     
     cols_derivadas = ['ciclo_fatura', 'mes_ano', 'ano', 'mes', 'dia_da_semana', 'dia_do_mes']
     cols_to_drop = [col for col in cols_derivadas if col in df_para_salvar.columns]
     if cols_to_drop:
         df_para_salvar = df_para_salvar.drop(columns=cols_to_drop)
         
-    estado_para_salvar = {
-        'df_processado_json': df_para_salvar.to_json(orient='split', date_format='iso') if not df_para_salvar.empty else None,
+    manifesto_sessao = {
+        'versao_formato': VERSAO_FORMATO_SESSAO,
+        'arquivo_dados': ARQUIVO_DADOS_SESSAO if not df_para_salvar.empty else None,
         'tipo_categorizacao_selecionada': st.session_state.tipo_categorizacao_selecionada,
         'estado_cnpj_selecionado': st.session_state.estado_cnpj_selecionado,
         'municipio_cnpj_selecionado': st.session_state.municipio_cnpj_selecionado,
         'filtros_sidebar': st.session_state.filtros_sidebar,
-        'nomes_arquivos_faturas_ja_processados': list(st.session_state.nomes_arquivos_faturas_ja_processados), 
+        'nomes_arquivos_faturas_ja_processados': sorted({nome_arquivo for nome_arquivo, _ in st.session_state.faturas_ja_processadas}), 
+        'faturas_ja_processadas': sorted(st.session_state.faturas_ja_processadas, key=_chave_fatura_processada),
         'edit_search_term': st.session_state.edit_search_term,
         'edit_category_filter': st.session_state.edit_category_filter,
         'edit_current_page': st.session_state.edit_current_page,
@@ -140,22 +393,38 @@ def gerar_dados_sessao_para_salvar() -> str:
         'ciclos_consulta_selecionados': st.session_state.get('ciclos_consulta_selecionados', []),
         'timestamp_salvo': datetime.now().isoformat(),
     }
-    return json.dumps(estado_para_salvar, indent=4, ensure_ascii=False)
-
-def carregar_dados_sessao_do_arquivo(uploaded_file_content: str):
+    buffer_sessao = io.BytesIO()
+    with zipfile.ZipFile(buffer_sessao, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        arquivo_zip.writestr(ARQUIVO_MANIFESTO_SESSAO, json.dumps(manifesto_sessao, indent=4, ensure_ascii=False))
+        if not df_para_salvar.empty:
+            arquivo_zip.writestr(ARQUIVO_DADOS_SESSAO, df_para_salvar.to_parquet(index=False), compress_type=zipfile.ZIP_STORED)
+    return buffer_sessao.getvalue()
+
+def _ler_arquivo_sessao(conteudo_arquivo_sessao: bytes):
+    if zipfile.is_zipfile(io.BytesIO(conteudo_arquivo_sessao)):
+        with zipfile.ZipFile(io.BytesIO(conteudo_arquivo_sessao)) as arquivo_zip:
+            estado_carregado = json.loads(arquivo_zip.read(ARQUIVO_MANIFESTO_SESSAO).decode("utf-8"))
+            arquivo_dados = estado_carregado.get('arquivo_dados')
+            df_carregado = pd.read_parquet(io.BytesIO(arquivo_zip.read(arquivo_dados))) if arquivo_dados else None
+        return estado_carregado, df_carregado
+
+    estado_carregado = json.loads(conteudo_arquivo_sessao.decode("utf-8"))
+    df_json = estado_carregado.get('df_processado_json')
+    df_carregado = pd.read_json(io.StringIO(df_json), orient='split', convert_dates=[COLUNA_DATA]) if df_json else None
+    return estado_carregado, df_carregado
+
+def carregar_dados_sessao_do_arquivo(conteudo_arquivo_sessao: bytes):
     try:
-        estado_carregado = json.loads(uploaded_file_content)
-        df_json = estado_carregado.get('df_processado_json')
-        if df_json:
-            st.session_state.df_processado = pd.read_json(io.StringIO(df_json), orient='split', convert_dates=[COLUNA_DATA])
-            if not st.session_state.df_processado.empty:
-                if COLUNA_DATA in st.session_state.df_processado.columns:
-                    st.session_state.df_processado[COLUNA_DATA] = pd.to_datetime(st.session_state.df_processado[COLUNA_DATA], errors='coerce')
-                if COLUNA_EDIT_ID not in st.session_state.df_processado.columns:
-                    st.session_state.df_processado.reset_index(drop=True, inplace=True)
-                    st.session_state.df_processado[COLUNA_EDIT_ID] = st.session_state.df_processado.index
+        estado_carregado, df_carregado = _ler_arquivo_sessao(conteudo_arquivo_sessao)
+        if df_carregado is not None and not df_carregado.empty:
+            if COLUNA_DATA in df_carregado.columns:
+                df_carregado[COLUNA_DATA] = pd.to_datetime(df_carregado[COLUNA_DATA], errors='coerce')
+            if COLUNA_EDIT_ID not in df_carregado.columns:
+                df_carregado.reset_index(drop=True, inplace=True)
+                df_carregado[COLUNA_EDIT_ID] = df_carregado.index
+            _definir_df_processado(aplicar_schema_faturas(df_carregado))
         else:
-            st.session_state.df_processado = pd.DataFrame()
+            _definir_df_processado(pd.DataFrame())
 
         st.session_state.tipo_categorizacao_selecionada = estado_carregado.get('tipo_categorizacao_selecionada', "Genérica (Base Editável)")
         st.session_state.estado_cnpj_selecionado = estado_carregado.get('estado_cnpj_selecionado', "Paraíba")
@@ -167,7 +436,7 @@ def carregar_dados_sessao_do_arquivo(uploaded_file_content: str):
             'categorias_despesa': filtros_carregados.get('categorias_despesa', ["Todos"])
         }
     
-        st.session_state.nomes_arquivos_faturas_ja_processados = set(estado_carregado.get('nomes_arquivos_faturas_ja_processados', []))
+        st.session_state.faturas_ja_processadas = _ler_faturas_ja_processadas(estado_carregado)
         st.session_state.edit_search_term = estado_carregado.get('edit_search_term', "")
         st.session_state.edit_category_filter = estado_carregado.get('edit_category_filter', "Todas")
         st.session_state.edit_current_page = estado_carregado.get('edit_current_page', 1)
@@ -178,6 +447,8 @@ def carregar_dados_sessao_do_arquivo(uploaded_file_content: str):
             st.session_state.categorias_base_memoria = categorias_base_salvas
         else:
             st.session_state.categorias_base_memoria = carregar_categorias_base_do_json()
+        st.session_state.operacoes_categorias_pendentes = []
+        st.session_state.categorias_base_versao += 1
     
         _atualizar_lista_categorias_editaveis() 
     
@@ -189,34 +460,143 @@ def carregar_dados_sessao_do_arquivo(uploaded_file_content: str):
         st.sidebar.error(f"Erro ao carregar sessão: {e}")
         log_mensagem_app(f"Falha ao carregar sessão: {e}", "error")
 
-def preparar_dataframe_dashboard(df: pd.DataFrame) -> pd.DataFrame:
-    df_out = df.copy()
-    if not df_out.empty and COLUNA_DATA in df_out.columns:
-        df_out[COLUNA_DATA] = pd.to_datetime(df_out[COLUNA_DATA], errors='coerce')
-        df_out.dropna(subset=[COLUNA_DATA], inplace=True)
-
-        if not df_out.empty:
-            date_col_series = df_out[COLUNA_DATA].dt
-            
-            df_out['mes_ano'] = date_col_series.to_period('M').astype(str)
-            df_out['ano'] = date_col_series.year
-            df_out['mes'] = date_col_series.month
-            df_out['dia_da_semana'] = date_col_series.day_name()
-            df_out['dia_do_mes'] = date_col_series.day
-
-    if COLUNA_FATURA_ORIGEM in df_out.columns:
-        df_out['ciclo_fatura'] = df_out[COLUNA_FATURA_ORIGEM].apply(extrair_ciclo_do_nome_arquivo)
-    elif 'ciclo_fatura' not in df_out.columns: 
-        df_out['ciclo_fatura'] = "Sem Origem Definida" 
-        
-    return df_out
+@st.cache_resource(show_spinner=False)
+def obter_logo_reduzido(caminho_imagem: str, mtime_imagem: float) -> bytes:
+    caminho_logo_reduzido = os.path.splitext(caminho_imagem)[0] + SUFIXO_LOGO_REDUZIDO
+    if os.path.exists(caminho_logo_reduzido) and os.path.getmtime(caminho_logo_reduzido) >= mtime_imagem:
+        with open(caminho_logo_reduzido, 'rb') as f:
+            return f.read()
+    from PIL import Image
+    with Image.open(caminho_imagem) as imagem:
+        imagem.thumbnail((LARGURA_MAXIMA_LOGO, LARGURA_MAXIMA_LOGO))
+        buffer_imagem = io.BytesIO()
+        imagem.save(buffer_imagem, format='PNG')
+    try:
+        with open(caminho_logo_reduzido, 'wb') as f:
+            f.write(buffer_imagem.getvalue())
+    except OSError as e:
+        print(f"Não foi possível salvar o logo reduzido em {caminho_logo_reduzido}: {e}")
+    return buffer_imagem.getvalue()
+
+@st.cache_resource(show_spinner="Carregando base de estabelecimentos CNPJ...")
+def obter_indice_estabelecimentos(caminho_arquivo_estabelecimentos: str, tamanho_arquivo: int, mtime_arquivo: float):
+    return carregar_indice_estabelecimentos(caminho_arquivo_estabelecimentos)
+
+def obter_dataframe_dashboard() -> pd.DataFrame:
+    cache_dashboard = st.session_state.df_dashboard_cache
+    if cache_dashboard is None or cache_dashboard['versao'] != st.session_state.df_processado_versao:
+        cache_dashboard = {
+            'versao': st.session_state.df_processado_versao,
+            'df': preparar_dataframe_dashboard(st.session_state.df_processado, log_mensagem_app),
+        }
+        st.session_state.df_dashboard_cache = cache_dashboard
+    return cache_dashboard['df']
+
+def obter_cubos_dashboard(df_dashboard: pd.DataFrame) -> dict:
+    cache_cubos = st.session_state.cubos_dashboard_cache
+    if cache_cubos is None or cache_cubos['versao'] != st.session_state.df_processado_versao:
+        cache_cubos = {
+            'versao': st.session_state.df_processado_versao,
+            'cubos': construir_cubos_dashboard(df_dashboard),
+        }
+        st.session_state.cubos_dashboard_cache = cache_cubos
+        st.session_state.visoes_dashboard_cache = None
+    return cache_cubos['cubos']
+
+def obter_opcoes_edicao(df_dashboard: pd.DataFrame, mascara_consumo: pd.Series) -> dict:
+    cache_opcoes = st.session_state.opcoes_edicao_cache
+    if cache_opcoes is None or cache_opcoes['versao'] != st.session_state.df_processado_versao:
+        categorias_presentes = df_dashboard.loc[mascara_consumo, COLUNA_CATEGORIA].dropna().astype(str).unique().tolist()
+        categorias_base_consumo = [cat for cat in st.session_state.categorias_editaveis if cat not in CATEGORIAS_FINANCEIRAS_FIXAS]
+        cache_opcoes = {
+            'versao': st.session_state.df_processado_versao,
+            'categorias_filtro': ["Todas"] + sorted(categorias_presentes),
+            'categorias_editor': sorted(set(categorias_base_consumo) | set(categorias_presentes)),
+        }
+        st.session_state.opcoes_edicao_cache = cache_opcoes
+    return cache_opcoes
+
+def obter_ids_edicao_filtrados(df_dashboard: pd.DataFrame, mascara_consumo: pd.Series, termo_busca: str, categoria_filtro: str) -> pd.Index:
+    chave_filtro = (st.session_state.df_processado_versao, termo_busca, categoria_filtro)
+    cache_filtro = st.session_state.edicao_filtro_cache
+    if cache_filtro is not None and cache_filtro['chave'] == chave_filtro:
+        return cache_filtro['ids']
+    if (cache_filtro is not None and cache_filtro['chave'][0::2] == chave_filtro[0::2]
+            and cache_filtro['chave'][1] and termo_busca.lower().startswith(cache_filtro['chave'][1].lower())):
+        ids_filtrados = cache_filtro['ids']
+    else:
+        ids_filtrados = df_dashboard.index[mascara_consumo.to_numpy()]
+        if categoria_filtro != "Todas":
+            ids_filtrados = ids_filtrados[(df_dashboard.loc[ids_filtrados, COLUNA_CATEGORIA] == categoria_filtro).to_numpy()]
+    if termo_busca:
+        ids_filtrados = ids_filtrados[df_dashboard.loc[ids_filtrados, COLUNA_TITULO].str.contains(termo_busca, case=False, na=False, regex=False).to_numpy()]
+    st.session_state.edicao_filtro_cache = {'chave': chave_filtro, 'ids': ids_filtrados}
+    return ids_filtrados
+
+def obter_cubos_base_local(ciclos_filtro=None, categorias_filtro=None):
+    cache_base_local = st.session_state.cubos_base_local_cache
+    if cache_base_local is None or cache_base_local['versao'] != st.session_state.df_processado_versao:
+        cache_base_local = {'versao': st.session_state.df_processado_versao, 'cubos': {}}
+        st.session_state.cubos_base_local_cache = cache_base_local
+    chave_filtros = (
+        None if ciclos_filtro is None else tuple(ciclos_filtro),
+        None if categorias_filtro is None else tuple(categorias_filtro),
+    )
+    if chave_filtros not in cache_base_local['cubos']:
+        cache_base_local['cubos'][chave_filtros] = _executar_na_base_local(
+            "agregar transações",
+            lambda conexao: agregar_cubos_dashboard(
+                conexao, CATEGORIAS_FINANCEIRAS_FIXAS, CATEGORIAS_ENCARGOS_FINANCEIROS,
+                ciclos=ciclos_filtro, categorias=categorias_filtro
+            )
+        )
+    return cache_base_local['cubos'][chave_filtros]
+
+def _filtrar_por_valores(df: pd.DataFrame, coluna: str, valores_filtro):
+    if valores_filtro is None:
+        return df
+    return df[df[coluna].isin(valores_filtro)]
+
+def filtrar_cubos_dashboard(cubos: dict, ciclos_filtro, categorias_filtro) -> dict:
+    chave_filtros = (
+        st.session_state.df_processado_versao,
+        None if ciclos_filtro is None else tuple(ciclos_filtro),
+        None if categorias_filtro is None else tuple(categorias_filtro),
+    )
+    cache_visoes = st.session_state.visoes_dashboard_cache
+    if cache_visoes is None or cache_visoes['chave'] != chave_filtros:
+        consumo_dia = _filtrar_por_valores(cubos['consumo_dia'], 'ciclo_fatura', ciclos_filtro)
+        consumo_titulo = _filtrar_por_valores(cubos['consumo_titulo'], 'ciclo_fatura', ciclos_filtro)
+        cache_visoes = {
+            'chave': chave_filtros,
+            'visoes': {
+                'consumo_dia': _filtrar_por_valores(consumo_dia, COLUNA_CATEGORIA, categorias_filtro),
+                'consumo_titulo': _filtrar_por_valores(consumo_titulo, COLUNA_CATEGORIA, categorias_filtro),
+                'encargos': _filtrar_por_valores(cubos['encargos'], 'ciclo_fatura', ciclos_filtro),
+            },
+        }
+        st.session_state.visoes_dashboard_cache = cache_visoes
+    return cache_visoes['visoes']
 
 inicializar_session_state()
 
+perfilador_anterior = st.session_state.pop('perfilador_execucao', None)
+if perfilador_anterior is not None:
+    perfilador_anterior.disable()
+perfilador_execucao = None
+if st.session_state.perfilar_execucao:
+    import cProfile
+    perfilador_execucao = cProfile.Profile()
+    perfilador_execucao.enable()
+    st.session_state.perfilador_execucao = perfilador_execucao
+
+metricas_execucao = criar_metricas_desempenho()
+marcar_etapa(metricas_execucao, "cabeçalho e barra lateral")
+
 try:
     col1_header, col2_header = st.columns([2, 2]) 
     with col1_header:
-        st.image(NOME_ARQUIVO_IMAGEM, use_container_width=True) 
+        st.image(obter_logo_reduzido(NOME_ARQUIVO_IMAGEM, os.path.getmtime(NOME_ARQUIVO_IMAGEM)), use_container_width=True) 
     with col2_header:
         st.title("Syn(tagmᵃ) Visualizador de uso do Cartão de Crédito")
 except FileNotFoundError:
@@ -319,82 +699,137 @@ with log_placeholder.container():
         st.caption(msg)
 
 st.sidebar.subheader("5. Sessão")
-dados_sessao_json_str = gerar_dados_sessao_para_salvar()
-st.sidebar.download_button(
-    label="💾 Baixar Progresso (.json)",
-    data=dados_sessao_json_str,
-    file_name=f"sessao_faturas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-    mime="application/json",
+chave_exportacao_sessao = _chave_exportacao_sessao()
+if st.sidebar.button(
+    "📦 Preparar Progresso para Download",
     use_container_width=True,
     disabled=st.session_state.df_processado.empty,
-    key="download_sessao_btn_v11" 
-)
+    key="preparar_sessao_btn"
+):
+    obter_exportacao('sessao', chave_exportacao_sessao, gerar_dados_sessao_para_salvar)
+if exportacao_disponivel('sessao', chave_exportacao_sessao):
+    st.sidebar.download_button(
+        label="💾 Baixar Progresso (.zip)",
+        data=obter_exportacao('sessao', chave_exportacao_sessao, gerar_dados_sessao_para_salvar),
+        file_name=f"sessao_faturas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+        mime="application/zip",
+        use_container_width=True,
+        key="download_sessao_btn_v11" 
+    )
 arquivo_sessao_carregado = st.sidebar.file_uploader(
-    "📂 Carregar Progresso (.json):",
-    type=["json"],
+    "📂 Carregar Progresso (.zip ou .json):",
+    type=["zip", "json"],
     key=f"file_uploader_sessao_key_{st.session_state.arquivo_sessao_uploader_key}_v11" 
 )
 
+st.sidebar.subheader("6. Base Local")
+st.sidebar.checkbox(
+    "Persistir transações em base local (SQLite)",
+    key="usar_base_local",
+    on_change=_sincronizar_base_local,
+    help=f"Grava as transações processadas e as edições de categoria em `{CAMINHO_BANCO_TRANSACOES_DEFAULT}`, permitindo recarregá-las sem reenviar os arquivos. Com a base ativa, os gráficos são agregados direto no SQLite e cobrem todos os ciclos gravados."
+)
+carregar_base_local_btn_clicked = False
+ciclos_base_local_selecionados = []
+if st.session_state.usar_base_local:
+    ciclos_base_local = _executar_na_base_local("listar ciclos", listar_ciclos_transacoes) or []
+    ciclos_base_local_selecionados = st.sidebar.multiselect(
+        "Ciclos a carregar da base local:",
+        ciclos_base_local,
+        key="ciclos_base_local_multiselect",
+        help="Deixe vazio para carregar todos os ciclos."
+    )
+    carregar_base_local_btn_clicked = st.sidebar.button(
+        "🗄️ Carregar da Base Local",
+        use_container_width=True,
+        disabled=not ciclos_base_local,
+        key="carregar_base_local_btn"
+    )
+
+marcar_etapa(metricas_execucao, "ações da barra lateral")
+
 if arquivo_sessao_carregado is not None:
-    conteudo_arquivo_sessao = arquivo_sessao_carregado.getvalue().decode("utf-8")
-    carregar_dados_sessao_do_arquivo(conteudo_arquivo_sessao)
+    carregar_dados_sessao_do_arquivo(arquivo_sessao_carregado.getvalue())
+
+if carregar_base_local_btn_clicked:
+    df_base_local = _executar_na_base_local(
+        "carregar transações",
+        lambda conexao: carregar_transacoes(conexao, ciclos=ciclos_base_local_selecionados or None)
+    )
+    if df_base_local is not None and not df_base_local.empty:
+        df_base_local[COLUNA_EDIT_ID] = np.arange(len(df_base_local))
+        _definir_df_processado(df_base_local)
+        st.session_state.faturas_ja_processadas = {(nome_arquivo, None) for nome_arquivo in df_base_local[COLUNA_FATURA_ORIGEM].dropna().astype(str).unique()}
+        log_mensagem_app(f"{len(df_base_local)} transações carregadas da base local.", "success")
+        st.rerun()
+    elif df_base_local is not None:
+        log_mensagem_app("Nenhuma transação encontrada na base local para os ciclos selecionados.", "warning")
 
 if limpar_dados_btn_clicked:
-    st.session_state.df_processado = pd.DataFrame()
+    _definir_df_processado(pd.DataFrame())
     st.session_state.filtros_sidebar = {'periodos_ciclo_arquivo': ["Todos"], 'categorias_despesa': ["Todos"]}
-    st.session_state.nomes_arquivos_faturas_ja_processados = set()
+    st.session_state.faturas_ja_processadas = set()
     st.session_state.edit_search_term = ""
     st.session_state.edit_category_filter = "Todas"
     st.session_state.edit_current_page = 1
     st.session_state.arquivo_sessao_uploader_key += 1 
     st.session_state.log_messages = ["Dados e filtros do dashboard limpos."] 
     st.session_state.categorias_base_memoria = carregar_categorias_base_do_json()
+    st.session_state.operacoes_categorias_pendentes = []
+    st.session_state.categorias_base_versao += 1
     st.session_state.ciclos_consulta_selecionados = [] 
     _atualizar_lista_categorias_editaveis()
     st.rerun()
 
 if processar_btn_clicked and uploaded_files:
     log_mensagem_app("Iniciando processamento...", "info")
+    metricas_processamento = criar_metricas_desempenho()
+
+    indice_estabelecimentos = None
+    if usar_cat_especifica_bool and caminho_arquivo_estab_final:
+        try:
+            stat_arquivo_estab = os.stat(caminho_arquivo_estab_final)
+            with medir_etapa(metricas_processamento, 'indice_estabelecimentos'):
+                indice_estabelecimentos = obter_indice_estabelecimentos(caminho_arquivo_estab_final, stat_arquivo_estab.st_size, stat_arquivo_estab.st_mtime)
+        except Exception as e:
+            log_mensagem_app(f"Falha ao carregar índice de estabelecimentos em cache: {e}. Lendo a base diretamente.", "warning")
     
-    novos_nomes_arquivos = {f_up.name for f_up in uploaded_files}
-    arquivos_para_processar_agora = [
-        f_up for f_up in uploaded_files 
-        if f_up.name not in st.session_state.nomes_arquivos_faturas_ja_processados
+    with medir_etapa(metricas_processamento, 'hash_arquivos', len(uploaded_files)):
+        faturas_enviadas = [(f_up, (f_up.name, hash_conteudo_fatura(f_up))) for f_up in uploaded_files]
+    pares_faturas_enviadas = {par_fatura for _, par_fatura in faturas_enviadas}
+    nomes_arquivos_novos = {
+        par_fatura[0] for _, par_fatura in faturas_enviadas
+        if par_fatura not in st.session_state.faturas_ja_processadas
+    }
+    nomes_arquivos_alterados = {
+        nome_arquivo for nome_arquivo, hash_arquivo in st.session_state.faturas_ja_processadas
+        if nome_arquivo in nomes_arquivos_novos and (nome_arquivo, hash_arquivo) not in pares_faturas_enviadas
+    }
+    faturas_para_processar_agora = [
+        (f_up, par_fatura) for f_up, par_fatura in faturas_enviadas
+        if par_fatura not in st.session_state.faturas_ja_processadas or par_fatura[0] in nomes_arquivos_alterados
     ]
+    recategorizar_todos = not faturas_para_processar_agora
 
-    df_novas_faturas = pd.DataFrame()
-    if arquivos_para_processar_agora:
-        log_mensagem_app(f"Processando {len(arquivos_para_processar_agora)} novo(s) arquivo(s)...", "info")
-        df_novas_faturas = processar_faturas(
-            arquivos_para_processar_agora,
-            usar_cat_especifica_bool,
-            caminho_arquivo_estab_final,
-            log_placeholder
-        )
-
-    elif not st.session_state.df_processado.empty and novos_nomes_arquivos.issubset(st.session_state.nomes_arquivos_faturas_ja_processados):
-        log_mensagem_app("Todos os arquivos já processados anteriormente. Recategorizando com configurações atuais...", "info")
-        
-        st.session_state.nomes_arquivos_faturas_ja_processados = set() 
-        df_novas_faturas = processar_faturas(
-            uploaded_files, 
-            usar_cat_especifica_bool,
-            caminho_arquivo_estab_final,
-            log_placeholder
-        )
-        if not df_novas_faturas.empty:
-             st.session_state.df_processado = pd.DataFrame() 
-
-    elif st.session_state.df_processado.empty and not arquivos_para_processar_agora and uploaded_files:
-        log_mensagem_app(f"Arquivos parecem já constar como processados, mas não há dados. Reprocessando todos os {len(uploaded_files)} arquivos selecionados.", "warning")
-        st.session_state.nomes_arquivos_faturas_ja_processados = set()
-        df_novas_faturas = processar_faturas(
-            uploaded_files,
-            usar_cat_especifica_bool,
-            caminho_arquivo_estab_final,
-            log_placeholder
-        )
-
+    if recategorizar_todos:
+        if st.session_state.df_processado.empty:
+            log_mensagem_app(f"Arquivos parecem já constar como processados, mas não há dados. Reprocessando todos os {len(uploaded_files)} arquivos selecionados.", "warning")
+        else:
+            log_mensagem_app("Todos os arquivos já processados anteriormente. Recategorizando com configurações atuais...", "info")
+        faturas_para_processar_agora = faturas_enviadas
+    else:
+        log_mensagem_app(f"Processando {len(faturas_para_processar_agora)} arquivo(s) novo(s) ou alterado(s)...", "info")
+
+    df_novas_faturas = processar_faturas(
+        [f_up for f_up, _ in faturas_para_processar_agora],
+        usar_cat_especifica_bool,
+        caminho_arquivo_estab_final,
+        log_placeholder,
+        cache_categorizacao=st.session_state.cache_categorizacao,
+        indice_estabelecimentos=indice_estabelecimentos,
+        cache_faturas_lidas=st.session_state.cache_faturas_lidas,
+        metricas_desempenho=metricas_processamento
+    )
 
     if not df_novas_faturas.empty:
         df_novas_faturas[COLUNA_DATA] = pd.to_datetime(df_novas_faturas[COLUNA_DATA], errors='coerce')
@@ -403,50 +838,109 @@ if processar_btn_clicked and uploaded_files:
         if COLUNA_FATURA_ORIGEM not in df_novas_faturas.columns:
             log_mensagem_app(f"ALERTA: Coluna '{COLUNA_FATURA_ORIGEM}' não encontrada nos novos dados processados. Isso pode afetar a identificação de duplicatas e o rastreamento da origem.", "error")
         
-        df_existente = st.session_state.df_processado.copy() if not st.session_state.df_processado.empty else pd.DataFrame()
-        
-        if novos_nomes_arquivos.issubset(st.session_state.nomes_arquivos_faturas_ja_processados) and not arquivos_para_processar_agora:
-             df_combinado = df_novas_faturas.copy()
-        else:
-            df_combinado = pd.concat([df_existente, df_novas_faturas], ignore_index=True)
-        
-        subset_duplicatas = [COLUNA_TITULO, COLUNA_DATA, COLUNA_VALOR]
-        if COLUNA_ID in df_combinado.columns: 
-            subset_duplicatas = [COLUNA_ID]
-            if df_combinado[COLUNA_ID].isnull().any():
-                 log_mensagem_app("Usando ID Nubank para remover duplicatas. IDs ausentes (NaN) podem não ser tratados idealmente.", "warning")
-        elif COLUNA_FATURA_ORIGEM in df_combinado.columns:
-            subset_duplicatas.append(COLUNA_FATURA_ORIGEM)
-        
-        subset_duplicatas_existentes = [col for col in subset_duplicatas if col in df_combinado.columns]
-        if subset_duplicatas_existentes:
-             df_combinado.drop_duplicates(subset=subset_duplicatas_existentes, keep='first', inplace=True)
-
-        df_combinado.reset_index(drop=True, inplace=True)
-        df_combinado[COLUNA_EDIT_ID] = df_combinado.index 
-        
-        st.session_state.df_processado = df_combinado.copy()
-        
         nomes_faturas_processadas_novas = set()
         if COLUNA_FATURA_ORIGEM in df_novas_faturas.columns:
              nomes_faturas_processadas_novas = set(df_novas_faturas[COLUNA_FATURA_ORIGEM].unique())
+
+        marcar_etapa(metricas_processamento, 'deduplicacao_e_mesclagem')
+        df_existente = pd.DataFrame() if recategorizar_todos else st.session_state.df_processado
+        hashes_transacoes = set() if recategorizar_todos else st.session_state.hashes_transacoes_sessao
+        hashes_removidas = set()
+        proximo_edit_id = 0 if recategorizar_todos else st.session_state.proximo_edit_id
+        if nomes_arquivos_alterados and not df_existente.empty and COLUNA_FATURA_ORIGEM in df_existente.columns:
+            mascara_substituidas = df_existente[COLUNA_FATURA_ORIGEM].astype(object).isin(nomes_arquivos_alterados).to_numpy()
+            hashes_removidas = set(gerar_hashes_transacoes(df_existente[mascara_substituidas]).tolist())
+            df_existente = df_existente.take(np.flatnonzero(~mascara_substituidas))
+            log_mensagem_app(f"{len(nomes_arquivos_alterados)} arquivo(s) com conteúdo alterado substituído(s): {', '.join(sorted(nomes_arquivos_alterados))}.", "info")
+
+        hashes_novas_faturas = gerar_hashes_transacoes(df_novas_faturas)
+        mascara_ineditas = np.fromiter(
+            (hash_transacao not in hashes_transacoes or hash_transacao in hashes_removidas for hash_transacao in hashes_novas_faturas.tolist()),
+            dtype=bool, count=len(hashes_novas_faturas)
+        ) & ~pd.Series(hashes_novas_faturas).duplicated().to_numpy()
+        quantidade_duplicadas = len(mascara_ineditas) - int(mascara_ineditas.sum())
+        contar_evento(metricas_processamento, 'transacoes_duplicadas', quantidade_duplicadas)
+        if quantidade_duplicadas:
+            log_mensagem_app(f"{quantidade_duplicadas} transação(ões) já existente(s) ignorada(s).", "info")
+        df_novas_faturas = df_novas_faturas[mascara_ineditas].copy()
+        df_novas_faturas[COLUNA_EDIT_ID] = np.arange(proximo_edit_id, proximo_edit_id + len(df_novas_faturas))
+        hashes_adicionadas = hashes_novas_faturas[mascara_ineditas].tolist()
+
+        if df_existente.empty:
+            _definir_df_processado(aplicar_schema_faturas(df_novas_faturas), set(hashes_adicionadas))
+        elif not df_novas_faturas.empty or nomes_arquivos_alterados:
+            _anexar_df_processado(anexar_faturas_tipadas(df_existente, df_novas_faturas), hashes_removidas, hashes_adicionadas)
+
+        if st.session_state.usar_base_local:
+            marcar_etapa(metricas_processamento, 'gravacao_base_local')
+            if nomes_arquivos_alterados:
+                quantidade_removida = _executar_na_base_local(
+                    "remover transações substituídas",
+                    lambda conexao: remover_transacoes_por_fatura(conexao, nomes_arquivos_alterados)
+                )
+                if quantidade_removida:
+                    log_mensagem_app(f"{quantidade_removida} transações antigas removidas da base local.", "info")
+            quantidade_gravada = _executar_na_base_local(
+                "gravar transações",
+                lambda conexao: gravar_transacoes(conexao, df_novas_faturas)
+            )
+            if quantidade_gravada is not None:
+                log_mensagem_app(f"{quantidade_gravada} transações gravadas na base local.", "info")
         
-        if not arquivos_para_processar_agora and uploaded_files:
-            for f_up in uploaded_files:
-                 st.session_state.nomes_arquivos_faturas_ja_processados.add(f_up.name)
-        else: 
-            for f_proc_obj in arquivos_para_processar_agora:
-                if f_proc_obj.name in nomes_faturas_processadas_novas or not nomes_faturas_processadas_novas:
-                    st.session_state.nomes_arquivos_faturas_ja_processados.add(f_proc_obj.name)
+        st.session_state.faturas_ja_processadas = set() if recategorizar_todos else {
+            par_fatura for par_fatura in st.session_state.faturas_ja_processadas
+            if par_fatura[0] not in nomes_arquivos_alterados
+        }
+        for f_proc_obj, par_fatura in faturas_para_processar_agora:
+            if f_proc_obj.name in nomes_faturas_processadas_novas or not nomes_faturas_processadas_novas:
+                st.session_state.faturas_ja_processadas.add(par_fatura)
+        marcar_etapa(metricas_processamento, None)
+        st.session_state.metricas_ultimo_processamento = exportar_metricas_desempenho(metricas_processamento)
         st.rerun()
-    elif uploaded_files and df_novas_faturas.empty and arquivos_para_processar_agora:
+    elif uploaded_files and df_novas_faturas.empty and not recategorizar_todos:
         log_mensagem_app("Processamento dos novos arquivos resultou em dados vazios. Verifique o formato dos CSVs ou as mensagens de erro anteriores.", "error")
+    st.session_state.metricas_ultimo_processamento = exportar_metricas_desempenho(metricas_processamento)
 
 
 if not st.session_state.df_processado.empty:
-    df_dashboard_master = preparar_dataframe_dashboard(st.session_state.df_processado)
-
+    marcar_etapa(metricas_execucao, "painel: dados e cubos")
+    df_dashboard_master = obter_dataframe_dashboard()
+    cubos_dashboard = obter_cubos_dashboard(df_dashboard_master)
+    cubos_historico = cubos_dashboard
+    if st.session_state.usar_base_local:
+        cubos_historico = obter_cubos_base_local() or cubos_dashboard
+
+    marcar_etapa(metricas_execucao, "painel: edição de categorias")
     with st.expander("✏️ Revisar e Editar Categorias de Consumo", expanded=False):
+        quantidade_edicoes_pendentes = len(st.session_state.edicoes_pendentes)
+        col_aplicar_edicoes, col_descartar_edicoes, _ = st.columns([0.3, 0.3, 0.4])
+        col_aplicar_edicoes.button(
+            f"Aplicar alterações pendentes ({quantidade_edicoes_pendentes})",
+            key="btn_aplicar_edicoes_pendentes", type="primary",
+            disabled=quantidade_edicoes_pendentes == 0,
+            on_click=_aplicar_edicoes_pendentes
+        )
+        col_descartar_edicoes.button(
+            "Descartar alterações",
+            key="btn_descartar_edicoes_pendentes",
+            disabled=quantidade_edicoes_pendentes == 0,
+            on_click=_descartar_edicoes_pendentes
+        )
+        st.checkbox(
+            "Aplicar também às demais transações com o mesmo título",
+            key="edit_aplicar_titulos_iguais",
+            help="Reatribui, em uma única operação, todas as transações cujo título normalizado é igual ao editado, além das ainda sem categoria que passam a conter o título como palavra-chave."
+        )
+        col_nova_categoria, col_btn_nova_categoria = st.columns([0.7, 0.3], vertical_alignment="bottom")
+        col_nova_categoria.text_input(
+            "Nova categoria de consumo:",
+            key="input_nova_categoria_edicao",
+            placeholder="Ex: Padaria ABC"
+        )
+        col_btn_nova_categoria.button(
+            "Criar categoria", key="btn_criar_categoria_edicao",
+            on_click=_criar_categoria_edicao, args=("input_nova_categoria_edicao",)
+        )
         col_edit_filt1, col_edit_filt2 = st.columns(2)
         st.session_state.edit_search_term = col_edit_filt1.text_input(
             "Buscar Título (edição de consumo):",
@@ -454,12 +948,9 @@ if not st.session_state.df_processado.empty:
             key="search_edit_v16" 
         )
         
-        df_para_edicao_consumo = df_dashboard_master[
-            ~df_dashboard_master[COLUNA_CATEGORIA].isin(CATEGORIAS_FINANCEIRAS_FIXAS)
-        ].copy()
-
-        current_unique_cats_para_edicao = sorted(df_para_edicao_consumo[COLUNA_CATEGORIA].dropna().unique().tolist())
-        categorias_disponiveis_filtro_edicao = ["Todas"] + current_unique_cats_para_edicao
+        mascara_consumo_edicao = cubos_dashboard['mascara_nao_fixas']
+        opcoes_edicao = obter_opcoes_edicao(df_dashboard_master, mascara_consumo_edicao)
+        categorias_disponiveis_filtro_edicao = opcoes_edicao['categorias_filtro']
         
         if st.session_state.edit_category_filter not in categorias_disponiveis_filtro_edicao:
             st.session_state.edit_category_filter = "Todas"
@@ -471,147 +962,77 @@ if not st.session_state.df_processado.empty:
             key="cat_filt_edit_v16"
         )
         
-        df_edit_display = df_para_edicao_consumo.copy()
-        if st.session_state.edit_search_term:
-            df_edit_display = df_edit_display[df_edit_display[COLUNA_TITULO].str.contains(st.session_state.edit_search_term, case=False, na=False)]
-        if st.session_state.edit_category_filter != "Todas":
-            df_edit_display = df_edit_display[df_edit_display[COLUNA_CATEGORIA] == st.session_state.edit_category_filter]
+        ids_edicao_filtrados = obter_ids_edicao_filtrados(
+            df_dashboard_master, mascara_consumo_edicao,
+            st.session_state.edit_search_term, st.session_state.edit_category_filter
+        )
         
-        items_per_page_edit = st.slider("Itens p/ página (edição):", 5, 50, 10, key="items_edit_v16")
+        items_per_page_edit = st.select_slider("Itens p/ página (edição):", options=OPCOES_ITENS_POR_PAGINA_EDICAO, value=50, key="items_edit_v17")
         
-        if not df_edit_display.empty:
-            total_pages_edit = max(1, (len(df_edit_display) - 1) // items_per_page_edit + 1)
+        if len(ids_edicao_filtrados):
+            total_pages_edit = max(1, (len(ids_edicao_filtrados) - 1) // items_per_page_edit + 1)
             if st.session_state.edit_current_page > total_pages_edit:
                 st.session_state.edit_current_page = total_pages_edit
                 
             st.session_state.edit_current_page = st.number_input(
-                "Página (edição):",
+                f"Página (edição) de {total_pages_edit} — {len(ids_edicao_filtrados)} transação(ões):",
                 min_value=1, max_value=total_pages_edit,
                 value=st.session_state.edit_current_page, step=1,
                 key="page_edit_v16"
             )
             start_idx_edit = (st.session_state.edit_current_page - 1) * items_per_page_edit
-            end_idx_edit = start_idx_edit + items_per_page_edit
-            df_page_edit = df_edit_display.iloc[start_idx_edit:end_idx_edit]
+            ids_pagina_edicao = ids_edicao_filtrados[start_idx_edit:start_idx_edit + items_per_page_edit]
+            df_page_edit = df_dashboard_master.loc[ids_pagina_edicao]
+            categorias_atuais_pagina = df_page_edit[COLUNA_CATEGORIA].astype(object)
+            edicoes_pendentes = st.session_state.edicoes_pendentes
             
-            cat_options_edit_consumo_base = [
-                cat for cat in st.session_state.categorias_editaveis 
-                if cat not in CATEGORIAS_FINANCEIRAS_FIXAS
-            ]
-            OPCAO_CRIAR_NOVA = " < Criar Nova Categoria > "
-
-            for _, row_to_edit in df_page_edit.iterrows():
-                edit_id = row_to_edit[COLUNA_EDIT_ID]
-                current_cat = row_to_edit[COLUNA_CATEGORIA]
-                titulo_original_transacao = row_to_edit[COLUNA_TITULO]
-                
-                cols_display_edit = st.columns([0.4, 0.15, 0.15, 0.3])
-                data_formatada = pd.to_datetime(row_to_edit[COLUNA_DATA]).strftime('%d/%m/%y') if pd.notna(row_to_edit[COLUNA_DATA]) else "Data Inválida"
-                cols_display_edit[0].markdown(f"**{data_formatada}** - {row_to_edit[COLUNA_TITULO]}")
-                cols_display_edit[1].markdown(f"R$ {row_to_edit[COLUNA_VALOR]:.2f}")
-                cols_display_edit[2].markdown(f"*Orig: {row_to_edit.get(COLUNA_FATURA_ORIGEM, 'N/A')}*")
-                
-                temp_cat_options_edit_para_linha = cat_options_edit_consumo_base[:]
-                if pd.notna(current_cat) and current_cat not in temp_cat_options_edit_para_linha:
-                    temp_cat_options_edit_para_linha.append(current_cat)
-                    temp_cat_options_edit_para_linha.sort()
-                
-                opcoes_finais_selectbox = temp_cat_options_edit_para_linha + [OPCAO_CRIAR_NOVA]
-                
-                default_index_cat_edit = 0
-                if pd.notna(current_cat) and current_cat in opcoes_finais_selectbox:
-                    default_index_cat_edit = opcoes_finais_selectbox.index(current_cat)
-                elif "Sem Categoria/Pix Credito" in opcoes_finais_selectbox: 
-                    default_index_cat_edit = opcoes_finais_selectbox.index("Sem Categoria/Pix Credito")
-
-                selectbox_key = f"sel_cat_edit_v_new_feat_{edit_id}"
-                categoria_escolhida_no_selectbox = cols_display_edit[3].selectbox(
-                    "Categoria:", opcoes_finais_selectbox,
-                    index=default_index_cat_edit, key=selectbox_key,
-                    label_visibility="collapsed"
-                )
-
-                nova_categoria_a_aplicar = None
-
-                if categoria_escolhida_no_selectbox == OPCAO_CRIAR_NOVA:
-                    input_nova_categoria_key = f"input_new_cat_v_new_feat_{edit_id}"
-                    btn_salvar_nova_cat_key = f"btn_save_new_cat_v_new_feat_{edit_id}"
-                    
-                    with cols_display_edit[3].container():
-                        nome_nova_categoria_input = st.text_input(
-                            "Nome da Nova Categoria:",
-                            key=input_nova_categoria_key,
-                            placeholder="Ex: Padaria ABC"
-                        )
-                        if st.button("Salvar Nova", key=btn_salvar_nova_cat_key, type="primary"):
-                            nome_nova_categoria_strip = nome_nova_categoria_input.strip()
-                            if nome_nova_categoria_strip:
-                                if nome_nova_categoria_strip in CATEGORIAS_FINANCEIRAS_FIXAS:
-                                    st.error(f"'{nome_nova_categoria_strip}' é uma categoria financeira fixa e não pode ser criada para consumo.")
-                                elif nome_nova_categoria_strip in st.session_state.categorias_editaveis:
-                                    st.warning(f"Categoria '{nome_nova_categoria_strip}' já existe. Será aplicada à transação.")
-                                    nova_categoria_a_aplicar = nome_nova_categoria_strip
-                                else:
-                                    st.session_state.categorias_base_memoria[nome_nova_categoria_strip] = []
-                                    _atualizar_lista_categorias_editaveis()
-                                    
-                                    if salvar_categorias_base_para_json(st.session_state.categorias_base_memoria):
-                                        log_mensagem_app(f"Nova categoria '{nome_nova_categoria_strip}' criada e salva no JSON.", "success")
-                                        nova_categoria_a_aplicar = nome_nova_categoria_strip
-                                    else:
-                                        log_mensagem_app(f"ERRO ao salvar nova categoria '{nome_nova_categoria_strip}' no JSON.", "error")
-                            else:
-                                st.warning("Nome da nova categoria não pode ser vazio.")
-                else:
-                    nova_categoria_a_aplicar = categoria_escolhida_no_selectbox
-
-                if nova_categoria_a_aplicar and nova_categoria_a_aplicar != current_cat:
-                    idx_global_df = st.session_state.df_processado[st.session_state.df_processado[COLUNA_EDIT_ID] == edit_id].index
-                    if not idx_global_df.empty:
-                        st.session_state.df_processado.loc[idx_global_df[0], COLUNA_CATEGORIA] = nova_categoria_a_aplicar
-                        
-                        titulo_norm_para_json = normalizar_texto(titulo_original_transacao)
-                        
-                        if pd.notna(current_cat) and current_cat in st.session_state.categorias_base_memoria:
-                            if isinstance(st.session_state.categorias_base_memoria[current_cat], list):
-                                if titulo_norm_para_json in st.session_state.categorias_base_memoria[current_cat]:
-                                    st.session_state.categorias_base_memoria[current_cat].remove(titulo_norm_para_json)
-                                if not st.session_state.categorias_base_memoria[current_cat] and \
-                                   current_cat not in CATEGORIAS_ESSENCIAIS_PARA_DROPDOWNS:
-                                    del st.session_state.categorias_base_memoria[current_cat]
-                        
-                        if nova_categoria_a_aplicar not in CATEGORIAS_FINANCEIRAS_FIXAS:
-                            if nova_categoria_a_aplicar not in st.session_state.categorias_base_memoria:
-                                st.session_state.categorias_base_memoria[nova_categoria_a_aplicar] = []
-                            
-                            if not isinstance(st.session_state.categorias_base_memoria.get(nova_categoria_a_aplicar), list):
-                                st.session_state.categorias_base_memoria[nova_categoria_a_aplicar] = []
-
-                            if titulo_norm_para_json not in st.session_state.categorias_base_memoria[nova_categoria_a_aplicar]:
-                                st.session_state.categorias_base_memoria[nova_categoria_a_aplicar].append(titulo_norm_para_json)
-                        
-                        _atualizar_lista_categorias_editaveis()
-                        
-                        if salvar_categorias_base_para_json(st.session_state.categorias_base_memoria):
-                            log_mensagem_app(f"Transação '{str(titulo_original_transacao)[:30]}...' atualizada para '{nova_categoria_a_aplicar}'. Base de categorias salva.", "success")
-                        else:
-                            log_mensagem_app(f"ERRO ao salvar base de categorias após atualizar '{str(titulo_original_transacao)[:30]}...'.", "error")
-                        st.rerun()
-                st.markdown("---")
+            df_grade_edicao = pd.DataFrame({
+                'Data': df_page_edit[COLUNA_DATA],
+                'Título': df_page_edit[COLUNA_TITULO].astype(object),
+                'Valor': df_page_edit[COLUNA_VALOR],
+                'Fatura': df_page_edit[COLUNA_FATURA_ORIGEM].astype(object) if COLUNA_FATURA_ORIGEM in df_page_edit.columns else 'N/A',
+                COLUNA_GRADE_EDICAO_CATEGORIA: [edicoes_pendentes.get(edit_id, categoria) for edit_id, categoria in zip(ids_pagina_edicao, categorias_atuais_pagina)],
+                'Pendente': [edit_id in edicoes_pendentes for edit_id in ids_pagina_edicao],
+            })
+            
+            chave_editor_edicao = f"editor_categorias_edicao_{st.session_state.editor_edicao_versao}"
+            st.data_editor(
+                df_grade_edicao,
+                key=chave_editor_edicao,
+                column_config={
+                    'Data': st.column_config.DateColumn("Data", format="DD/MM/YY"),
+                    'Título': st.column_config.TextColumn("Título", width="large"),
+                    'Valor': st.column_config.NumberColumn("Valor", format="R$ %.2f"),
+                    'Fatura': st.column_config.TextColumn("Orig."),
+                    COLUNA_GRADE_EDICAO_CATEGORIA: st.column_config.SelectboxColumn(
+                        COLUNA_GRADE_EDICAO_CATEGORIA, options=opcoes_edicao['categorias_editor'], required=True, width="medium"
+                    ),
+                    'Pendente': st.column_config.CheckboxColumn("✏️", help="Alteração pendente (use 'Aplicar alterações pendentes')."),
+                },
+                disabled=[coluna for coluna in df_grade_edicao.columns if coluna != COLUNA_GRADE_EDICAO_CATEGORIA],
+                hide_index=True,
+                use_container_width=True,
+                num_rows="fixed",
+                on_change=_registrar_edicoes_grade,
+                args=(chave_editor_edicao, ids_pagina_edicao.tolist(), categorias_atuais_pagina.tolist())
+            )
         else:
-            if df_dashboard_master[~df_dashboard_master[COLUNA_CATEGORIA].isin(CATEGORIAS_FINANCEIRAS_FIXAS)].empty:
+            if not mascara_consumo_edicao.any():
                  st.info("Não há transações de consumo para editar. Todas as transações atuais pertencem a categorias financeiras/fixas.")
             else:
                  st.info("Nenhum item de consumo corresponde aos filtros de edição atuais.")
 
-    df_para_relatorios = df_dashboard_master.copy()
-    
+    marcar_etapa(metricas_execucao, "painel: filtros")
     st.sidebar.subheader("Filtros do Dashboard")
     
-    if 'ciclo_fatura' not in df_para_relatorios.columns or df_para_relatorios['ciclo_fatura'].isnull().all():
+    ciclos_filtro = None
+    if 'ciclo_fatura' not in df_dashboard_master.columns or df_dashboard_master['ciclo_fatura'].isnull().all():
         st.sidebar.warning("Coluna 'ciclo_fatura' não disponível para filtro.")
     else:
-        all_periodos_options = sorted(df_para_relatorios['ciclo_fatura'].dropna().unique(), reverse=True)
+        ciclos_disponiveis = set(df_dashboard_master['ciclo_fatura'].dropna().unique())
+        if cubos_historico is not cubos_dashboard:
+            ciclos_disponiveis.update(cubos_historico['consumo_dia']['ciclo_fatura'], cubos_historico['encargos']['ciclo_fatura'])
+        all_periodos_options = sorted(ciclos_disponiveis, reverse=True)
         all_periodos_for_multiselect = ["Todos"] + all_periodos_options
         
         current_selection_periodos = st.session_state.filtros_sidebar['periodos_ciclo_arquivo']
@@ -627,17 +1048,11 @@ if not st.session_state.df_processado.empty:
         )
         st.session_state.filtros_sidebar['periodos_ciclo_arquivo'] = selected_periodos
 
-        if selected_periodos and "Todos" not in selected_periodos:
-            df_para_relatorios = df_para_relatorios[df_para_relatorios['ciclo_fatura'].isin(selected_periodos)]
-        elif not selected_periodos and "Todos" not in selected_periodos :
-             df_para_relatorios = pd.DataFrame(columns=df_dashboard_master.columns)
-
-    df_despesas_pre_cat_filter = df_para_relatorios[
-        ~df_para_relatorios[COLUNA_CATEGORIA].isin(CATEGORIAS_FINANCEIRAS_FIXAS) &
-        (df_para_relatorios[COLUNA_VALOR] > 0)
-    ].copy()
+        if "Todos" not in selected_periodos:
+            ciclos_filtro = selected_periodos
 
-    unique_cats_despesa_options = sorted(df_despesas_pre_cat_filter[COLUNA_CATEGORIA].astype(str).dropna().unique().tolist())
+    consumo_dia_por_ciclo = _filtrar_por_valores(cubos_historico['consumo_dia'], 'ciclo_fatura', ciclos_filtro)
+    unique_cats_despesa_options = sorted(consumo_dia_por_ciclo[COLUNA_CATEGORIA].astype(str).dropna().unique().tolist())
     all_cat_despesa_for_multiselect = ["Todos"] + [cat for cat in unique_cats_despesa_options if cat != 'nan']
 
     current_selection_categorias = st.session_state.filtros_sidebar['categorias_despesa']
@@ -653,29 +1068,26 @@ if not st.session_state.df_processado.empty:
     )
     st.session_state.filtros_sidebar['categorias_despesa'] = selected_cats_despesa
 
-    df_despesas_relatorio = df_despesas_pre_cat_filter.copy()
-    if selected_cats_despesa and "Todos" not in selected_cats_despesa:
-        df_despesas_relatorio = df_despesas_relatorio[df_despesas_relatorio[COLUNA_CATEGORIA].isin(selected_cats_despesa)]
-    elif not selected_cats_despesa and "Todos" not in selected_cats_despesa:
-        df_despesas_relatorio = pd.DataFrame(columns=df_despesas_pre_cat_filter.columns)
-
-    df_encargos_kpi = df_para_relatorios[
-        df_para_relatorios[COLUNA_CATEGORIA].isin(CATEGORIAS_ENCARGOS_FINANCEIROS) &
-        (df_para_relatorios[COLUNA_VALOR] > 0)
-    ]
+    categorias_filtro = None if "Todos" in selected_cats_despesa else selected_cats_despesa
+    visoes_dashboard = None
+    if cubos_historico is not cubos_dashboard:
+        visoes_dashboard = obter_cubos_base_local(ciclos_filtro, categorias_filtro)
+    if visoes_dashboard is None:
+        visoes_dashboard = filtrar_cubos_dashboard(cubos_dashboard, ciclos_filtro, categorias_filtro)
+    cubo_consumo_relatorio = visoes_dashboard['consumo_dia']
+    cubo_titulos_relatorio = visoes_dashboard['consumo_titulo']
 
+    marcar_etapa(metricas_execucao, "painel: resumo financeiro")
     st.header("Resumo Financeiro")
     total_gasto_consumo_kpi = 0.0
     media_diaria_consumo_kpi = 0.0
-    if not df_despesas_relatorio.empty:
-        total_gasto_consumo_kpi = df_despesas_relatorio[COLUNA_VALOR].sum()
-        if COLUNA_DATA in df_despesas_relatorio.columns and not df_despesas_relatorio[COLUNA_DATA].isnull().all():
-            num_dias_com_gastos = df_despesas_relatorio[COLUNA_DATA].dt.date.nunique()
-            if num_dias_com_gastos > 0:
-                soma_diaria_df = df_despesas_relatorio.groupby(df_despesas_relatorio[COLUNA_DATA].dt.date)[COLUNA_VALOR].sum()
-                media_diaria_consumo_kpi = soma_diaria_df.mean()
+    if not cubo_consumo_relatorio.empty:
+        total_gasto_consumo_kpi = cubo_consumo_relatorio[COLUNA_VALOR].sum()
+        soma_diaria_df = cubo_consumo_relatorio.groupby('dia')[COLUNA_VALOR].sum()
+        if not soma_diaria_df.empty:
+            media_diaria_consumo_kpi = soma_diaria_df.mean()
 
-    total_encargos_kpi = df_encargos_kpi[COLUNA_VALOR].sum() if not df_encargos_kpi.empty else 0.0
+    total_encargos_kpi = visoes_dashboard['encargos'][COLUNA_VALOR].sum() if not visoes_dashboard['encargos'].empty else 0.0
 
     kpi_col1, kpi_col2, kpi_col3 = st.columns(3)
     kpi_col1.metric("Total Gasto (Consumo)", f"R$ {total_gasto_consumo_kpi:,.2f}")
@@ -683,14 +1095,12 @@ if not st.session_state.df_processado.empty:
     kpi_col3.metric("Total Encargos Financeiros", f"R$ {total_encargos_kpi:,.2f}", help=f"Juros, multas, IOF, etc. ({', '.join(CATEGORIAS_ENCARGOS_FINANCEIROS)})")
     st.markdown("---")
 
-    df_historico_consumo_plot = df_dashboard_master[
-        ~df_dashboard_master[COLUNA_CATEGORIA].isin(CATEGORIAS_FINANCEIRAS_FIXAS) &
-        (df_dashboard_master[COLUNA_VALOR] > 0) &
-        pd.notna(df_dashboard_master['mes_ano'])
-    ].copy()
+    marcar_etapa(metricas_execucao, "painel: gráficos históricos")
+    import plotly.express as px
+    cubo_consumo_historico = cubos_historico['consumo_dia']
 
-    if not df_historico_consumo_plot.empty:
-        gastos_mensais_evolucao = df_historico_consumo_plot.groupby('mes_ano')[COLUNA_VALOR].sum().reset_index().sort_values('mes_ano')
+    if not cubo_consumo_historico.empty:
+        gastos_mensais_evolucao = cubo_consumo_historico.groupby('mes_ano')[COLUNA_VALOR].sum().reset_index().sort_values('mes_ano')
         if not gastos_mensais_evolucao.empty:
             fig_evolucao_consumo = px.line(
                 gastos_mensais_evolucao, x='mes_ano', y=COLUNA_VALOR,
@@ -701,41 +1111,35 @@ if not st.session_state.df_processado.empty:
 
     plot_col_freq_uso, plot_col_custos_fin = st.columns(2)
 
-    if not df_historico_consumo_plot.empty and 'mes_ano' in df_historico_consumo_plot.columns and COLUNA_DATA in df_historico_consumo_plot.columns:
-        df_freq_calc = df_historico_consumo_plot.copy()
-        if not df_freq_calc.empty and not df_freq_calc[COLUNA_DATA].isnull().all():
-            dias_com_gastos_por_mes = df_freq_calc.groupby('mes_ano')[COLUNA_DATA].nunique().reset_index()
-            dias_com_gastos_por_mes.rename(columns={COLUNA_DATA: 'dias_com_transacao'}, inplace=True)
+    if not cubo_consumo_historico.empty:
+        dias_com_gastos_por_mes = cubo_consumo_historico.groupby('mes_ano')['dia'].nunique().reset_index()
+        dias_com_gastos_por_mes.rename(columns={'dia': 'dias_com_transacao'}, inplace=True)
+        
+        if not dias_com_gastos_por_mes.empty:
+            dias_com_gastos_por_mes['temp_date_for_daysinmonth'] = pd.to_datetime(dias_com_gastos_por_mes['mes_ano'].astype(str) + '-01', errors='coerce')
+            dias_com_gastos_por_mes.dropna(subset=['temp_date_for_daysinmonth'], inplace=True)
             
             if not dias_com_gastos_por_mes.empty:
-                dias_com_gastos_por_mes['temp_date_for_daysinmonth'] = pd.to_datetime(dias_com_gastos_por_mes['mes_ano'].astype(str) + '-01', errors='coerce')
-                dias_com_gastos_por_mes.dropna(subset=['temp_date_for_daysinmonth'], inplace=True)
+                dias_com_gastos_por_mes['total_dias_no_mes'] = dias_com_gastos_por_mes['temp_date_for_daysinmonth'].dt.days_in_month
+                dias_com_gastos_por_mes['frequencia_uso_percent'] = np.where(
+                    dias_com_gastos_por_mes['total_dias_no_mes'] > 0,
+                    (dias_com_gastos_por_mes['dias_com_transacao'] / dias_com_gastos_por_mes['total_dias_no_mes']) * 100, 0
+                )
+                dias_com_gastos_por_mes.sort_values('mes_ano', inplace=True)
                 
-                if not dias_com_gastos_por_mes.empty:
-                    dias_com_gastos_por_mes['total_dias_no_mes'] = dias_com_gastos_por_mes['temp_date_for_daysinmonth'].dt.days_in_month
-                    dias_com_gastos_por_mes['frequencia_uso_percent'] = np.where(
-                        dias_com_gastos_por_mes['total_dias_no_mes'] > 0,
-                        (dias_com_gastos_por_mes['dias_com_transacao'] / dias_com_gastos_por_mes['total_dias_no_mes']) * 100, 0
+                if not dias_com_gastos_por_mes.empty and 'frequencia_uso_percent' in dias_com_gastos_por_mes.columns:
+                    fig_freq_uso = px.bar(
+                        dias_com_gastos_por_mes, x='mes_ano', y='frequencia_uso_percent',
+                        title="Frequência de Uso Mensal (Consumo - Histórico Completo)",
+                        labels={'frequencia_uso_percent': "Frequência de Uso (%)", 'mes_ano': "Mês/Ano"},
+                        text_auto=".1f"
                     )
-                    dias_com_gastos_por_mes.sort_values('mes_ano', inplace=True)
-                    
-                    if not dias_com_gastos_por_mes.empty and 'frequencia_uso_percent' in dias_com_gastos_por_mes.columns:
-                        fig_freq_uso = px.bar(
-                            dias_com_gastos_por_mes, x='mes_ano', y='frequencia_uso_percent',
-                            title="Frequência de Uso Mensal (Consumo - Histórico Completo)",
-                            labels={'frequencia_uso_percent': "Frequência de Uso (%)", 'mes_ano': "Mês/Ano"},
-                            text_auto=".1f"
-                        )
-                        fig_freq_uso.update_yaxes(ticksuffix="%")
-                        plot_col_freq_uso.plotly_chart(fig_freq_uso, use_container_width=True)
-
-    df_encargos_historico_detalhes = df_dashboard_master[
-        df_dashboard_master[COLUNA_CATEGORIA].isin(CATEGORIAS_ENCARGOS_FINANCEIROS) &
-        (df_dashboard_master[COLUNA_VALOR] > 0) &
-        pd.notna(df_dashboard_master['mes_ano'])
-    ].copy()
-
-    if not df_encargos_historico_detalhes.empty and 'mes_ano' in df_encargos_historico_detalhes.columns:
+                    fig_freq_uso.update_yaxes(ticksuffix="%")
+                    plot_col_freq_uso.plotly_chart(fig_freq_uso, use_container_width=True)
+
+    df_encargos_historico_detalhes = cubos_historico['encargos']
+
+    if not df_encargos_historico_detalhes.empty:
         encargos_mensais_plot_agg = df_encargos_historico_detalhes.groupby('mes_ano')[COLUNA_VALOR].sum().reset_index()
         if not encargos_mensais_plot_agg.empty:
             encargos_mensais_plot_agg.sort_values('mes_ano', inplace=True)
@@ -749,27 +1153,25 @@ if not st.session_state.df_processado.empty:
             plot_col_custos_fin.plotly_chart(fig_custos_fin_mensais, use_container_width=True)
 
             with plot_col_custos_fin.expander("Ver Detalhes dos Custos Financeiros (Histórico Completo)"):
-                if not df_encargos_historico_detalhes.empty:
-                    df_tabela_detalhes_encargos = df_encargos_historico_detalhes[
-                        [COLUNA_DATA, 'mes_ano', COLUNA_TITULO, COLUNA_CATEGORIA, COLUNA_VALOR]
-                    ].copy()
-                    
-                    df_tabela_detalhes_encargos.sort_values(by=['mes_ano', COLUNA_DATA], inplace=True)
-                    df_tabela_detalhes_encargos['Data Formatada'] = df_tabela_detalhes_encargos[COLUNA_DATA].dt.strftime('%d/%m/%Y')
-                    df_tabela_detalhes_encargos_display = df_tabela_detalhes_encargos[
-                        ['Data Formatada', 'mes_ano', COLUNA_TITULO, COLUNA_CATEGORIA, COLUNA_VALOR]
-                    ].rename(columns={
-                        'Data Formatada': 'Data Transação', 'mes_ano': 'Mês/Ano (Referência)',
-                        COLUNA_TITULO: 'Descrição', COLUNA_CATEGORIA: 'Categoria', COLUNA_VALOR: 'Valor (R$)'
-                    })
-                    st.dataframe(
-                        df_tabela_detalhes_encargos_display.style.format({'Valor (R$)': "R$ {:,.2f}"}),
-                        use_container_width=True, hide_index=True
-                    )
+                df_tabela_detalhes_encargos = df_encargos_historico_detalhes[
+                    [COLUNA_DATA, 'mes_ano', COLUNA_TITULO, COLUNA_CATEGORIA, COLUNA_VALOR]
+                ].sort_values(by=['mes_ano', COLUNA_DATA])
+                df_tabela_detalhes_encargos['Data Formatada'] = df_tabela_detalhes_encargos[COLUNA_DATA].dt.strftime('%d/%m/%Y')
+                df_tabela_detalhes_encargos_display = df_tabela_detalhes_encargos[
+                    ['Data Formatada', 'mes_ano', COLUNA_TITULO, COLUNA_CATEGORIA, COLUNA_VALOR]
+                ].rename(columns={
+                    'Data Formatada': 'Data Transação', 'mes_ano': 'Mês/Ano (Referência)',
+                    COLUNA_TITULO: 'Descrição', COLUNA_CATEGORIA: 'Categoria', COLUNA_VALOR: 'Valor (R$)'
+                })
+                st.dataframe(
+                    df_tabela_detalhes_encargos_display.style.format({'Valor (R$)': "R$ {:,.2f}"}),
+                    use_container_width=True, hide_index=True
+                )
 
-    if not df_despesas_relatorio.empty:
+    marcar_etapa(metricas_execucao, "painel: gráficos do período")
+    if not cubo_consumo_relatorio.empty:
         top_n_cat_consumo = st.slider("Top N Categorias de Consumo (Período Filtrado):", 3, 20, 10, key="slider_top_n_cat_g2_v7")
-        gastos_por_categoria_plot = df_despesas_relatorio.groupby(COLUNA_CATEGORIA)[COLUNA_VALOR].sum().reset_index().sort_values(by=COLUNA_VALOR, ascending=False).head(top_n_cat_consumo)
+        gastos_por_categoria_plot = cubo_consumo_relatorio.groupby(COLUNA_CATEGORIA, observed=True)[COLUNA_VALOR].sum().reset_index().sort_values(by=COLUNA_VALOR, ascending=False).head(top_n_cat_consumo)
         if not gastos_por_categoria_plot.empty:
             fig_dist_categoria_consumo = px.bar(
                 gastos_por_categoria_plot, x=COLUNA_CATEGORIA, y=COLUNA_VALOR,
@@ -779,38 +1181,36 @@ if not st.session_state.df_processado.empty:
             fig_dist_categoria_consumo.update_layout(xaxis_tickangle=-45)
             st.plotly_chart(fig_dist_categoria_consumo, use_container_width=True)
 
-    if not df_despesas_relatorio.empty:
+    if not cubo_consumo_relatorio.empty:
         plot_col_dia_semana, plot_col_dia_mes = st.columns(2)
         mapa_dias_pt = {"Monday":"Seg", "Tuesday":"Ter", "Wednesday":"Qua", "Thursday":"Qui", "Friday":"Sex", "Saturday":"Sáb", "Sunday":"Dom"}
         ordem_dias_plot = list(mapa_dias_pt.values())
         
-        if 'dia_da_semana' in df_despesas_relatorio.columns and not df_despesas_relatorio['dia_da_semana'].isnull().all():
-            df_dia_semana_plot = df_despesas_relatorio.copy()
-            df_dia_semana_plot['dia_da_semana_pt'] = df_dia_semana_plot['dia_da_semana'].map(mapa_dias_pt)
-            df_dia_semana_plot = df_dia_semana_plot.groupby('dia_da_semana_pt')[COLUNA_VALOR].sum().reindex(ordem_dias_plot).reset_index().dropna(subset=[COLUNA_VALOR])
-            if not df_dia_semana_plot.empty:
-                fig_dia_semana_plot = px.bar(
-                    df_dia_semana_plot, x='dia_da_semana_pt', y=COLUNA_VALOR,
-                    title="Gastos de Consumo por Dia da Semana (Período Filtrado)",
-                    labels={COLUNA_VALOR: "Gasto Consumo (R$)", 'dia_da_semana_pt':"Dia da Semana"}
-                )
-                plot_col_dia_semana.plotly_chart(fig_dia_semana_plot, use_container_width=True)
-
-        if 'dia_do_mes' in df_despesas_relatorio.columns and not df_despesas_relatorio['dia_do_mes'].isnull().all():
-            df_dia_mes_plot = df_despesas_relatorio.groupby('dia_do_mes')[COLUNA_VALOR].sum().reset_index().dropna(subset=[COLUNA_VALOR])
-            if not df_dia_mes_plot.empty:
-                fig_dia_mes_plot = px.bar(
-                    df_dia_mes_plot, x='dia_do_mes', y=COLUNA_VALOR,
-                    title="Gastos de Consumo por Dia do Mês (Período Filtrado)",
-                    labels={COLUNA_VALOR: "Gasto Consumo (R$)", 'dia_do_mes':"Dia do Mês"},
-                    text_auto=".2f"
-                )
-                fig_dia_mes_plot.update_layout(xaxis=dict(type='category'))
-                plot_col_dia_mes.plotly_chart(fig_dia_mes_plot, use_container_width=True)
+        df_dia_semana_plot = cubo_consumo_relatorio.groupby('dia_da_semana')[COLUNA_VALOR].sum()
+        df_dia_semana_plot.index = df_dia_semana_plot.index.map(mapa_dias_pt)
+        df_dia_semana_plot = df_dia_semana_plot.reindex(ordem_dias_plot).rename_axis('dia_da_semana_pt').reset_index().dropna(subset=[COLUNA_VALOR])
+        if not df_dia_semana_plot.empty:
+            fig_dia_semana_plot = px.bar(
+                df_dia_semana_plot, x='dia_da_semana_pt', y=COLUNA_VALOR,
+                title="Gastos de Consumo por Dia da Semana (Período Filtrado)",
+                labels={COLUNA_VALOR: "Gasto Consumo (R$)", 'dia_da_semana_pt':"Dia da Semana"}
+            )
+            plot_col_dia_semana.plotly_chart(fig_dia_semana_plot, use_container_width=True)
+
+        df_dia_mes_plot = cubo_consumo_relatorio.groupby('dia_do_mes')[COLUNA_VALOR].sum().reset_index().dropna(subset=[COLUNA_VALOR])
+        if not df_dia_mes_plot.empty:
+            fig_dia_mes_plot = px.bar(
+                df_dia_mes_plot, x='dia_do_mes', y=COLUNA_VALOR,
+                title="Gastos de Consumo por Dia do Mês (Período Filtrado)",
+                labels={COLUNA_VALOR: "Gasto Consumo (R$)", 'dia_do_mes':"Dia do Mês"},
+                text_auto=".2f"
+            )
+            fig_dia_mes_plot.update_layout(xaxis=dict(type='category'))
+            plot_col_dia_mes.plotly_chart(fig_dia_mes_plot, use_container_width=True)
 
-    if not df_despesas_relatorio.empty:
+    if not cubo_titulos_relatorio.empty:
         top_n_estabelecimentos = st.slider("Top N Estabelecimentos (Consumo - Período Filtrado):", 5, 50, 15, key="slider_top_estab_g4_v7")
-        gastos_estabelecimentos_plot = df_despesas_relatorio.groupby(COLUNA_TITULO)[COLUNA_VALOR].sum().reset_index().sort_values(by=COLUNA_VALOR, ascending=False).head(top_n_estabelecimentos)
+        gastos_estabelecimentos_plot = cubo_titulos_relatorio.groupby(COLUNA_TITULO)[COLUNA_VALOR].sum().reset_index().sort_values(by=COLUNA_VALOR, ascending=False).head(top_n_estabelecimentos)
         if not gastos_estabelecimentos_plot.empty:
             fig_estabelecimentos_plot = px.bar(
                 gastos_estabelecimentos_plot, x=COLUNA_TITULO, y=COLUNA_VALOR,
@@ -820,21 +1220,22 @@ if not st.session_state.df_processado.empty:
             fig_estabelecimentos_plot.update_layout(xaxis_tickangle=-60, height=500)
             st.plotly_chart(fig_estabelecimentos_plot, use_container_width=True)
 
-    if not df_historico_consumo_plot.empty: 
+    marcar_etapa(metricas_execucao, "painel: médias mensais")
+    if not cubo_consumo_historico.empty: 
         top_n_media_cat_consumo = st.slider("Top N Categorias por Média Mensal (Consumo - Histórico Completo):", 3, 20, 10, key="slider_top_n_media_cat_g5_v7")
-        if 'mes_ano' in df_historico_consumo_plot.columns and COLUNA_CATEGORIA in df_historico_consumo_plot.columns:
-            media_cat_mes_historico_plot = df_historico_consumo_plot.groupby(['mes_ano', COLUNA_CATEGORIA])[COLUNA_VALOR].sum().unstack(fill_value=0).mean(axis=0).reset_index()
-            media_cat_mes_historico_plot.columns = [COLUNA_CATEGORIA, 'media_mensal_gasto']
-            media_cat_mes_historico_plot = media_cat_mes_historico_plot.sort_values(by='media_mensal_gasto', ascending=False).head(top_n_media_cat_consumo)
-            if not media_cat_mes_historico_plot.empty:
-                fig_media_cat_plot = px.bar(
-                    media_cat_mes_historico_plot, x=COLUNA_CATEGORIA, y='media_mensal_gasto',
-                    title=f"Top {top_n_media_cat_consumo} Categorias por Média Mensal de Gasto (Consumo - Histórico)",
-                    text_auto=".2f", labels={'media_mensal_gasto':"Média Mensal Consumo (R$)", COLUNA_CATEGORIA: "Categoria"}
-                )
-                fig_media_cat_plot.update_layout(xaxis_tickangle=-45)
-                st.plotly_chart(fig_media_cat_plot, use_container_width=True)
+        media_cat_mes_historico_plot = cubo_consumo_historico.groupby(['mes_ano', COLUNA_CATEGORIA], observed=True)[COLUNA_VALOR].sum().unstack(fill_value=0).mean(axis=0).reset_index()
+        media_cat_mes_historico_plot.columns = [COLUNA_CATEGORIA, 'media_mensal_gasto']
+        media_cat_mes_historico_plot = media_cat_mes_historico_plot.sort_values(by='media_mensal_gasto', ascending=False).head(top_n_media_cat_consumo)
+        if not media_cat_mes_historico_plot.empty:
+            fig_media_cat_plot = px.bar(
+                media_cat_mes_historico_plot, x=COLUNA_CATEGORIA, y='media_mensal_gasto',
+                title=f"Top {top_n_media_cat_consumo} Categorias por Média Mensal de Gasto (Consumo - Histórico)",
+                text_auto=".2f", labels={'media_mensal_gasto':"Média Mensal Consumo (R$)", COLUNA_CATEGORIA: "Categoria"}
+            )
+            fig_media_cat_plot.update_layout(xaxis_tickangle=-45)
+            st.plotly_chart(fig_media_cat_plot, use_container_width=True)
 
+    marcar_etapa(metricas_execucao, "painel: consulta detalhada")
     st.markdown("---")
     st.header("Consulta Detalhada por Fatura")
 
@@ -897,12 +1298,17 @@ if not st.session_state.df_processado.empty:
     else:
         st.info("Não há dados de ciclos de fatura disponíveis para consulta. Processe arquivos de fatura primeiro.")
 
+    marcar_etapa(metricas_execucao, "painel: contribuição")
     st.markdown("---")
     st.header("🤝 Contribua para Melhorar a Categorização")
     st.markdown("""A categorização automática pode não ser perfeita para todos os estabelecimentos. Suas edições manuais são salvas localmente no arquivo `Categorias.json` e ajudam a refinar o sistema para você.
     Se desejar, você pode compartilhar seu arquivo de categorias para ajudar a aprimorar a base de conhecimento geral do categorizador para todos os usuários!""")
     if st.button("Quero Contribuir com Minhas Categorizações!", key="btn_contribuir_v7"):
-        categorias_base_para_contribuir_str = json.dumps(st.session_state.categorias_base_memoria, indent=4, ensure_ascii=False)
+        categorias_base_para_contribuir_str = obter_exportacao(
+            'categorias_contribuicao',
+            st.session_state.categorias_base_versao,
+            lambda: json.dumps(st.session_state.categorias_base_memoria, indent=4, ensure_ascii=False)
+        )
         st.download_button(
             label="1. Baixar meu Arquivo de Categorias (.json)",
             data=categorias_base_para_contribuir_str,
@@ -920,4 +1326,58 @@ else:
         if 'log_messages' not in st.session_state or st.session_state.log_messages == ["Aqui aparecerão as mensagens de informação do processo."]:
              st.info("⬆️ FAÇA O UPLOAD DAS FATURAS EM CSV na barra lateral para iniciar a análise.")
     elif uploaded_files :
-        st.info("📂 Arquivos selecionados. Clique em '🚀 Processar' na barra lateral para visualizar os dados.")
\ No newline at end of file
+        st.info("📂 Arquivos selecionados. Clique em '🚀 Processar' na barra lateral para visualizar os dados.")
+
+marcar_etapa(metricas_execucao, None)
+if perfilador_execucao is not None:
+    perfilador_execucao.disable()
+    st.session_state.pop('perfilador_execucao', None)
+    import pstats
+    saida_perfil = io.StringIO()
+    pstats.Stats(perfilador_execucao, stream=saida_perfil).sort_stats('cumulative').print_stats(LIMITE_LINHAS_PERFIL_EXECUCAO)
+    st.session_state.relatorio_perfil_execucao = saida_perfil.getvalue()
+
+with st.sidebar.expander("⏱️ Performance", expanded=False):
+    metricas_ultima_execucao = exportar_metricas_desempenho(metricas_execucao)
+    for titulo_metricas, metricas_exibidas in (
+        ("Última execução do painel", metricas_ultima_execucao),
+        ("Último processamento", st.session_state.metricas_ultimo_processamento),
+    ):
+        st.caption(titulo_metricas)
+        if not metricas_exibidas or not metricas_exibidas['etapas']:
+            st.caption("Sem medições ainda.")
+            continue
+        df_etapas = pd.DataFrame.from_dict(metricas_exibidas['etapas'], orient='index')
+        st.dataframe(
+            df_etapas[['segundos', 'linhas', 'linhas_por_segundo']].sort_values('segundos', ascending=False).rename(columns={
+                'segundos': 'Tempo (s)', 'linhas': 'Linhas', 'linhas_por_segundo': 'Linhas/s'
+            }).style.format({'Tempo (s)': "{:.3f}", 'Linhas': "{:,.0f}", 'Linhas/s': "{:,.0f}"}, na_rep='-'),
+            use_container_width=True
+        )
+        for nome_contador, valor_contador in metricas_exibidas['contadores'].items():
+            st.caption(f"{nome_contador}: {valor_contador:,}")
+    st.download_button(
+        "📊 Exportar Métricas (.json)",
+        data=json.dumps({
+            'ultima_execucao': metricas_ultima_execucao,
+            'ultimo_processamento': st.session_state.metricas_ultimo_processamento,
+        }, indent=4, ensure_ascii=False),
+        file_name=f"metricas_desempenho_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+        mime="application/json",
+        use_container_width=True,
+        key="download_metricas_desempenho"
+    )
+    st.checkbox(
+        "Perfilar execuções com cProfile",
+        key="perfilar_execucao",
+        help="Gera um relatório do cProfile a cada execução do painel (tem custo adicional de desempenho)."
+    )
+    if st.session_state.relatorio_perfil_execucao:
+        st.download_button(
+            "🧾 Baixar Relatório do cProfile (.txt)",
+            data=st.session_state.relatorio_perfil_execucao,
+            file_name=f"perfil_execucao_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+            mime="text/plain",
+            use_container_width=True,
+            key="download_perfil_execucao"
+        )
\ No newline at end of file